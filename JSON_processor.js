@@ -404,6 +404,73 @@ function appendToSpreadsheet(sheet, rowData) {
   }
 }
 
+// ===== 一括取り込み（Pythonの sheet_export.py が出力したCSV） =====
+
+// 更新時に既存の値を残す列（登録日時と手動入力の列）
+const PRESERVED_COLUMNS = [0, 1, 5, 9, 12, 13, 14, 15, 16, 17];
+
+// 行のキー（元ファイル名、U列）
+const KEY_COLUMN = 20;
+
+/**
+ * _sheet_export.csv を読み込み、新規行は setValues で一括追加、既存行はまとめて上書き
+ * （appendRow を1行ずつ呼ばないので、数千行でも実行時間の上限に掛からない）
+ * 取り込んだCSVはゴミ箱に移す（Python側は次のバッチで新しいCSVを作る）
+ */
+function importSheetExport() {
+  console.log('🚀 CSV一括取り込み開始');
+
+  const spreadsheet = getOrCreateSpreadsheet();
+  const sheet = getOrCreateMainSheet(spreadsheet);
+
+  const files = DriveApp.getFilesByName('_sheet_export.csv');
+  while (files.hasNext()) {
+    const file = files.next();
+    try {
+      const rows = Utilities.parseCsv(file.getBlob().getDataAsString('UTF-8')).slice(1);
+      if (rows.length === 0) {
+        file.setTrashed(true);
+        continue;
+      }
+
+      // 既存行の元ファイル名 → 行番号
+      const lastRow = sheet.getLastRow();
+      const existing = lastRow > 1 ? sheet.getRange(2, 1, lastRow - 1, rows[0].length).getValues() : [];
+      const rowIndex = {};
+      existing.forEach((row, index) => { rowIndex[row[KEY_COLUMN]] = index; });
+
+      const appended = [];
+      let updated = 0;
+      rows.forEach(row => {
+        const index = rowIndex[row[KEY_COLUMN]];
+        if (index === undefined) {
+          appended.push(row);
+          return;
+        }
+        // 登録日時・手動入力の列は既存の値を残す（書き込みは最後にまとめて1回）
+        existing[index] = row.map((value, column) =>
+          PRESERVED_COLUMNS.includes(column) ? existing[index][column] : value);
+        updated++;
+      });
+
+      if (updated > 0) {
+        sheet.getRange(2, 1, existing.length, existing[0].length).setValues(existing);
+      }
+      if (appended.length > 0) {
+        sheet.getRange(sheet.getLastRow() + 1, 1, appended.length, appended[0].length).setValues(appended);
+      }
+
+      file.setTrashed(true);
+      console.log(`✅ ${file.getName()}: 追加 ${appended.length}件 / 更新 ${updated}件`);
+
+    } catch (error) {
+      console.error(`❌ CSV取り込みエラー [${file.getName()}]:`, error);
+    }
+  }
+
+  console.log(`📊 スプレッドシート: ${spreadsheet.getUrl()}`);
+}
+
 /**
  * テスト用：サンプルJSONで動作確認
  */
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+バッチ処理のファイル入出力（低速な共有フォルダ向けの先読み・ステージング）
+SMB等の共有フォルダ上で.pptxを直接開き、出力を隣に書き戻すと、
+細かいランダムアクセスの待ち時間が処理時間の大半になる。
+
+- 先読み: 次のK件の.pptxをスレッドでローカルのステージフォルダにコピーしておき、
+  抽出（CPU処理）の間に次のファイルの転送を進める。処理後はコピーを削除
+- 出力先: 出力を.pptxの隣ではなく、指定したフォルダ（相対パスを保って）に書き込む
+- 出力のステージング: 出力をローカルに書き込み、一定件数ごとにまとめて出力先へ反映する。
+  反映前に中断した分は、同じステージフォルダで次回起動したときに反映する
+  （ジャーナルには反映前に成功として記録されるため、ステージフォルダの指定が必要）
+
+オプションを指定しなければ従来どおり（.pptxを直接開き、隣に出力する）
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional, Tuple
+
+
+# ステージフォルダ内の、出力を置くサブフォルダ
+OUTPUT_STAGE = 'outputs'
+
+# 先読みしたデッキを置くサブフォルダ
+DECK_STAGE = 'decks'
+
+
+def _copy_atomic(src: Path, dst: Path):
+    """一時ファイル経由でコピー（途中で中断しても壊れたファイルを残さない）"""
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = dst.with_name(f".{dst.name}.{os.getpid()}.tmp")
+    shutil.copy2(src, temp_path)
+    os.replace(temp_path, dst)
+
+
+class BatchIO:
+    """バッチ処理のファイル入出力"""
+
+    def __init__(self, folder_path: str, output_root: Optional[str] = None, prefetch: int = 0,
+                 stage_dir: Optional[str] = None, stage_outputs: bool = False, flush_every: int = 50):
+        """
+        初期化
+
+        Args:
+            folder_path: 処理対象フォルダ
+            output_root: 出力先フォルダ（省略時は.pptxと同じ場所）
+            prefetch: 先読みする件数（0なら先読みしない）
+            stage_dir: ステージフォルダ（先読みのみなら省略可: 一時フォルダを作成し、終了時に削除）
+            stage_outputs: 出力をステージフォルダに書き込み、まとめて出力先に反映する
+                           （stage_dir が必要: 中断時に残った出力を次回反映するため）
+            flush_every: 出力を反映する件数
+        """
+        if stage_outputs and not stage_dir:
+            raise ValueError("stage_outputs requires stage_dir")
+
+        self.folder_path = Path(folder_path)
+        self.output_root = Path(output_root) if output_root else None
+        self.prefetch = max(0, prefetch)
+        self.stage_outputs = stage_outputs
+        self.flush_every = max(1, flush_every)
+
+        self._temporary_stage = None
+        if self.prefetch and not stage_dir:
+            self._temporary_stage = tempfile.mkdtemp(prefix='pptx_stage_')
+            stage_dir = self._temporary_stage
+        self.stage_dir = Path(stage_dir) if stage_dir else None
+
+        self._pending = {}  # ステージの出力 → 出力先
+        self.stats = {'prefetched': 0, 'flushed': 0}
+
+        # 前回反映できなかった出力（中断・クラッシュ）を反映
+        if self.stage_outputs:
+            self._recover()
+
+    @property
+    def output_folder(self) -> Path:
+        """出力先のフォルダ（類似案件検索インデックス等の対象）"""
+        return self.output_root or self.folder_path
+
+    def _relative(self, pptx_file: Path) -> Path:
+        return Path(pptx_file).relative_to(self.folder_path)
+
+    # ---- 入力（先読み） ----
+
+    def _stage_deck(self, pptx_file: Path) -> Path:
+        """デッキをステージフォルダにコピー（ファイル名は変えない）"""
+        local_path = self.stage_dir / DECK_STAGE / self._relative(pptx_file)
+        _copy_atomic(pptx_file, local_path)
+        return local_path
+
+    def decks(self, pptx_files: List[Path],
+              claim: Optional[Callable[[Path], bool]] = None) -> Iterator[Tuple[Path, Path]]:
+        """
+        処理順にデッキを返す（先読み時は次のK件をコピーしながら）
+
+        Args:
+            claim: 処理するか判定する関数（分散処理の割り当て）。先読みの前に判定するため、
+                   他ノードの担当・処理中のデッキはコピーしない
+
+        Yields:
+            (元のパス, 読み込むパス)。先読みしない・コピーに失敗した場合は両方とも元のパス
+        """
+        claimed = (pptx_file for pptx_file in pptx_files if claim is None or claim(pptx_file))
+        if not self.prefetch:
+            for pptx_file in claimed:
+                yield pptx_file, pptx_file
+            return
+
+        executor = ThreadPoolExecutor(max_workers=self.prefetch, thread_name_prefix='pptx-prefetch')
+        queue = deque()
+        futures = {}
+
+        def fill():
+            # 現在のファイルと次のK件のコピーを開始
+            while len(queue) < self.prefetch + 1:
+                pptx_file = next(claimed, None)
+                if pptx_file is None:
+                    return
+                queue.append(pptx_file)
+                futures[pptx_file] = executor.submit(self._stage_deck, pptx_file)
+
+        try:
+            fill()
+            while queue:
+                pptx_file = queue.popleft()
+                fill()
+
+                try:
+                    local_path = futures.pop(pptx_file).result()
+                    self.stats['prefetched'] += 1
+                except OSError as e:
+                    print(f"  WARNING: prefetch failed, reading from source: {e}")
+                    local_path = None
+
+                try:
+                    yield pptx_file, local_path or pptx_file
+                finally:
+                    if local_path:
+                        local_path.unlink(missing_ok=True)
+        finally:
+            # 中断時は未開始のコピーを取り消し、コピー済みのものを削除
+            for future in futures.values():
+                future.cancel()
+            executor.shutdown(wait=True)
+            for future in futures.values():
+                if future.done() and not future.cancelled() and future.exception() is None:
+                    future.result().unlink(missing_ok=True)
+
+    # ---- 出力 ----
+
+    def final_path(self, pptx_file: Path, suffix: str) -> Path:
+        """出力の最終的なパス"""
+        if self.output_root:
+            return (self.output_root / self._relative(pptx_file)).with_suffix(suffix)
+        return Path(pptx_file).with_suffix(suffix)
+
+    def output_path(self, pptx_file: Path, suffix: str = '.json') -> Path:
+        """
+        出力を書き込むパス（前回の出力の読み込みにも使う）
+
+        ステージング時はローカルのパスを返し、出力先に前回の出力があればコピーしておく
+        （変更の無いスライドの再利用・決定的モードの比較に使うため）
+        """
+        final = self.final_path(pptx_file, suffix)
+        if not self.stage_outputs:
+            final.parent.mkdir(parents=True, exist_ok=True)
+            return final
+
+        staged = (self.stage_dir / OUTPUT_STAGE / self._relative(pptx_file)).with_suffix(suffix)
+        if staged not in self._pending and not staged.exists():
+            if final.exists():
+                _copy_atomic(final, staged)
+            else:
+                staged.parent.mkdir(parents=True, exist_ok=True)
+        return staged
+
+    def written(self, *paths: Path):
+        """出力を書き込んだことを記録（ステージング時は一定件数ごとに出力先へ反映）"""
+        if not self.stage_outputs:
+            return
+        for path in paths:
+            staged = Path(path)
+            self._pending[staged] = self._final_for_staged(staged)
+        if len(self._pending) >= self.flush_every:
+            self.flush()
+
+    def _final_for_staged(self, staged: Path) -> Path:
+        relative = staged.relative_to(self.stage_dir / OUTPUT_STAGE)
+        return (self.output_root or self.folder_path) / relative
+
+    def flush(self):
+        """ステージの出力をまとめて出力先へ反映（反映したものはステージから削除）"""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+
+        def publish(item):
+            staged, final = item
+            _copy_atomic(staged, final)
+            return staged
+
+        with ThreadPoolExecutor(max_workers=min(8, len(pending))) as executor:
+            for staged in executor.map(publish, pending.items()):
+                staged.unlink(missing_ok=True)
+                self.stats['flushed'] += 1
+
+    def _recover(self):
+        """前回のステージに残った出力を反映"""
+        stage = self.stage_dir / OUTPUT_STAGE
+        if not stage.exists():
+            return
+        leftovers = [path for path in stage.rglob('*') if path.is_file() and not path.name.startswith('.')]
+        if leftovers:
+            print(f"Flushing {len(leftovers)} staged outputs left from the previous run")
+            for staged in leftovers:
+                self._pending[staged] = self._final_for_staged(staged)
+            self.flush()
+
+    def close(self):
+        """未反映の出力を反映し、一時ステージフォルダを削除"""
+        self.flush()
+        if self._temporary_stage:
+            shutil.rmtree(self._temporary_stage, ignore_errors=True)
+        if self.prefetch or self.stage_outputs:
+            print(f"Staging: {self.stats['prefetched']} decks prefetched, {self.stats['flushed']} outputs flushed")
+
+
+def add_io_arguments(parser):
+    """バッチ処理のCLIに入出力のオプションを追加"""
+    parser.add_argument('--output-root', metavar='DIR',
+                        help="出力を.pptxの隣ではなくこのフォルダに書き込む（相対パスを保つ）")
+    parser.add_argument('--prefetch', type=int, default=0, metavar='K',
+                        help="次のK件の.pptxをローカルに先読みコピーしてから処理する（低速な共有フォルダ向け）")
+    parser.add_argument('--stage-dir', metavar='DIR',
+                        help="先読み・出力のステージフォルダ（ローカルSSD推奨、先読みのみなら省略時は一時フォルダ）")
+    parser.add_argument('--stage-outputs', action='store_true',
+                        help="出力を --stage-dir に書き込み、--flush-every 件ごとにまとめて出力先へ反映する"
+                             "（中断時に残った出力は次回の起動時に反映）")
+    parser.add_argument('--flush-every', type=int, default=50,
+                        help="ステージングした出力を反映する件数（既定: 50）")
+
+
+def io_from_args(folder_path: str, args) -> BatchIO:
+    """CLI引数から入出力を作成"""
+    if args.stage_outputs and not args.stage_dir:
+        # 一時フォルダでは中断時に未反映の出力が失われ、ジャーナルの成功記録と食い違う
+        print("ERROR: --stage-outputs requires --stage-dir")
+        sys.exit(1)
+    return BatchIO(folder_path, output_root=args.output_root, prefetch=args.prefetch,
+                   stage_dir=args.stage_dir, stage_outputs=args.stage_outputs,
+                   flush_every=args.flush_every)
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+バッチ処理のジャーナル（追記専用・fsync付き）
+1ファイル処理するごとに結果を1行のJSONとして追記し、ディスクに同期する。
+途中でクラッシュ・中断しても処理済みファイルの記録は残り、
+サマリーはいつでもジャーナルから再計算できる（--resume で続きから再開）
+
+決定的モードでは同期フォルダ外（一時フォルダ）の作業ファイルに追記し、
+終了時に内容が変わった場合だけ本来のジャーナルに書き込む（同期クライアントの再アップロードを防ぐ）
+"""
+
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Any, Optional
+
+from output_writer import dumps, write_text_if_changed
+from records import BatchEntry
+
+
+# 処理済みとして再開時に飛ばす状態（エラー・ガード判定は再開時に再試行する）
+COMPLETED_STATUSES = ('success', 'alias')
+
+
+class BatchJournal:
+    """ファイル単位の処理結果ジャーナル"""
+
+    def __init__(self, path, resume: bool = False, node_id: Optional[str] = None,
+                 deterministic: bool = False):
+        """
+        初期化
+
+        Args:
+            path: ジャーナルファイル（.jsonl）のパス
+            resume: Trueなら既存の記録を引き継ぐ（Falseなら新規に開始）
+            node_id: 分散処理時のノード名（各記録に付与）
+            deterministic: 記録日時を付けず、作業ファイルに追記して終了時に内容が変わった場合だけ書き込む
+        """
+        self.path = Path(path)
+        self.node_id = node_id
+        self.deterministic = deterministic
+        self._lock = threading.Lock()
+
+        # 追記するファイル（決定的モードでは一時フォルダの作業ファイル）
+        self.work_path = self._work_path(self.path) if deterministic else self.path
+
+        if resume:
+            # 決定的モードで前回クラッシュした場合は作業ファイルの方が新しい
+            source = self.work_path if self.work_path.exists() else self.path
+            if source.exists():
+                self._truncate_torn_tail(source)
+                self.entries = self.load(source)
+            else:
+                self.entries = []
+            if source != self.work_path:
+                self.work_path.write_text(''.join(dumps(entry, deterministic=False, indent=False) + "\n"
+                                                  for entry in self.entries), encoding='utf-8')
+        else:
+            self.work_path.write_text('', encoding='utf-8')
+            self.entries = []
+        self._statuses = {entry['path']: entry.get('status') for entry in self.entries}
+
+        self._file = open(self.work_path, 'a', encoding='utf-8')
+
+    @staticmethod
+    def _work_path(path: Path) -> Path:
+        """決定的モードの作業ファイル（ジャーナルごとに固定の名前、--resume で引き継ぐ）"""
+        digest = hashlib.sha1(str(path.resolve()).encode('utf-8')).hexdigest()[:16]
+        return Path(tempfile.gettempdir()) / f"pptx_journal_{digest}.jsonl"
+
+    @staticmethod
+    def load(path) -> List[BatchEntry]:
+        """ジャーナルを読み込み（書き込み途中で途切れた行は無視）"""
+        entries = []
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if isinstance(entry, dict) and 'path' in entry:
+                    entries.append(BatchEntry.from_dict(entry))
+        return entries
+
+    @staticmethod
+    def _truncate_torn_tail(path: Path):
+        """クラッシュで途切れた最終行を切り詰め、次の追記が壊れないようにする"""
+        data = path.read_bytes()
+        if data and not data.endswith(b'\n'):
+            with open(path, 'r+b') as f:
+                f.truncate(data.rfind(b'\n') + 1)
+
+    def completed(self) -> set:
+        """処理を終えた（最新の結果が成功・別名の）ファイルの相対パス"""
+        return completed_paths(self.results())
+
+    def is_completed(self, rel_path: str) -> bool:
+        """ファイルの最新の結果が成功・別名か（エラー・ガード判定は他ノード・再開時に再試行する）"""
+        return self._statuses.get(rel_path) in COMPLETED_STATUSES
+
+    def append(self, entry: Dict[str, Any]):
+        """結果を1件追記してディスクに同期"""
+        if not self.deterministic:
+            entry = dict(entry, recorded_at=datetime.now().isoformat())
+        entry = BatchEntry.from_dict(entry)
+        if self.node_id:
+            entry.node = self.node_id
+        line = dumps(entry, deterministic=False, indent=False) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self.entries.append(entry)
+            self._statuses[entry['path']] = entry.get('status')
+
+    def results(self) -> List[BatchEntry]:
+        """ファイルごとの最新の結果（記録順）"""
+        return latest_results(self.entries)
+
+    def close(self):
+        """ジャーナルを閉じる（決定的モードでは内容が変わった場合だけ書き込み、作業ファイルを削除）"""
+        self._file.close()
+        if self.work_path != self.path:
+            write_text_if_changed(self.path, self.work_path.read_text(encoding='utf-8'))
+            self.work_path.unlink()
+
+
+def latest_results(entries: List[BatchEntry]) -> List[BatchEntry]:
+    """同じファイルの記録が複数ある場合は最新のものだけを残す"""
+    latest = {}
+    for entry in entries:
+        latest.pop(entry['path'], None)
+        latest[entry['path']] = entry
+    return list(latest.values())
+
+
+def completed_paths(results: List[Dict[str, Any]]) -> set:
+    """最新の結果が成功・別名のファイルの相対パス（エラーで終わったファイルは含めない）"""
+    return {result['path'] for result in results if result.get('status') in COMPLETED_STATUSES}
+
+
+def summarize(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """結果一覧から件数を集計（ガード判定はエラーにも含める）"""
+    summary = {'success': 0, 'unchanged': 0, 'errors': 0, 'aliases': 0, 'guard': {}}
+    for result in results:
+        status = result.get('status')
+        if status == 'success':
+            summary['success'] += 1
+            # 決定的モードで出力ファイルを書き換えなかったもの
+            summary['unchanged'] += bool(result.get('unchanged'))
+        elif status == 'alias':
+            summary['aliases'] += 1
+        else:
+            summary['errors'] += 1
+            if status != 'error':
+                summary['guard'][status] = summary['guard'].get(status, 0) + 1
+    return summary
+
+
+def main():
+    """ジャーナルから現時点のサマリーを表示"""
+    if len(sys.argv) > 1:
+        journal_path = sys.argv[1]
+    else:
+        journal_path = input("Enter journal path: ").strip()
+
+    if not Path(journal_path).exists():
+        print(f"ERROR: Journal not found: {journal_path}")
+        sys.exit(1)
+
+    results = latest_results(BatchJournal.load(journal_path))
+    summary = summarize(results)
+
+    print(f"Recorded files: {len(results)}")
+    print(f"Success: {summary['success']}")
+    if summary['unchanged']:
+        print(f"  - unchanged (not rewritten): {summary['unchanged']}")
+    print(f"Errors: {summary['errors']}")
+    for status, count in summary['guard'].items():
+        print(f"  - {status}: {count}")
+    if summary['aliases']:
+        print(f"Aliases: {summary['aliases']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,15 +5,29 @@ NotebookLM用バッチMarkdown生成スクリプト
 フォルダ内の全PowerPointファイルを一括でMarkdown変換
 """
 
+import argparse
 import os
 import sys
 from pathlib import Path
 from markdown_generator import process_powerpoint_to_markdown
+from pptx_guard import PptxGuard
+from deck_dedup import cluster_decks
+from llm_backends import BACKENDS
+from batch_journal import summarize
+from batch_sharding import open_journal, final_results, add_sharding_arguments
+from deck_catalog import select_files, add_catalog_arguments, select_options
+from text_store import add_store_arguments, store_from_args
+from batch_io import BatchIO, add_io_arguments, io_from_args
+from batch_planner import plan_folder, add_plan_arguments
 import time
 
 
-def batch_generate_markdown(folder_path: str, api_key: str):
-    """フォルダ内の全PowerPointファイルをMarkdownに変換"""
+def batch_generate_markdown(folder_path: str, api_key: str, processor_options: dict = None,
+                            dedup: bool = False, resume: bool = False, node: str = None,
+                            shard: str = None, leases: bool = False, deterministic: bool = False,
+                            catalog_filters: dict = None, batch_io: BatchIO = None):
+    """フォルダ内の全PowerPointファイルをMarkdownに変換（batch_io: 先読み・出力先・ステージング）"""
+    batch_io = batch_io or BatchIO(folder_path)
 
     print(f"\n{'='*60}")
     print(f"NotebookLM用バッチMarkdown生成")
@@ -26,48 +40,158 @@ def batch_generate_markdown(folder_path: str, api_key: str):
         print(f"❌ No .pptx files found in: {folder_path}")
         return
 
+    # 文書プロパティのカタログで絞り込み・新しい順に並べ替え（スライドは解析しない）
+    copies = {}
+    if catalog_filters is not None:
+        pptx_files, copies = select_files(folder_path, pptx_files, catalog_filters)
+
     print(f"📁 Found {len(pptx_files)} PowerPoint files\n")
 
-    success_count = 0
-    error_count = 0
-    results = []
+    # 1ファイルごとに結果をジャーナルへ追記（--resume 時・分散処理時は記録済みのファイルを飛ばす）
+    journal, claimer, done = open_journal(folder_path, "_batch_journal_markdown", resume, node, shard, leases,
+                                          deterministic)
+
+    # 完全なコピーは代表ファイルの別名として記録
+    for canonical, members in copies.items():
+        for copy in members:
+            if str(copy.relative_to(folder_path)) not in done:
+                journal.append({
+                    'path': str(copy.relative_to(folder_path)),
+                    'file': copy.name,
+                    'status': 'alias',
+                    'canonical': canonical.name
+                })
+
+    # 巨大ファイル対策: メモリ・時間制限付きワーカーで抽出
+    guard = PptxGuard()
+
+    # バージョン違いのデッキは最新版だけを変換し、他は別名として記録
+    aliases = {}
+    if dedup:
+        print("🔍 Clustering near-duplicate decks...")
+        aliases = cluster_decks(pptx_files, guard=guard, store=(processor_options or {}).get('store'))
+        total_files = len(pptx_files)
+        pptx_files = list(aliases)
+        for canonical, members in aliases.items():
+            for alias in members:
+                if str(alias.relative_to(folder_path)) in done:
+                    continue
+                journal.append({
+                    'path': str(alias.relative_to(folder_path)),
+                    'file': alias.name,
+                    'status': 'alias',
+                    'canonical': canonical.name
+                })
+        print(f"   {total_files} files -> {len(pptx_files)} unique decks\n")
+
+    pptx_files = [p for p in pptx_files if str(p.relative_to(folder_path)) not in done]
+    if resume:
+        print(f"⏩ Resuming: {len(done)} files already recorded\n")
+
+    # 分散処理時は他ノードの担当・処理中のファイルを飛ばす
+    claim = (lambda p: claimer.claim(str(p.relative_to(folder_path)))) if claimer else None
+
+    # 共有フォルダ上のデッキは次のK件をローカルに先読み（指定時、割り当て済みのもののみ）
+    for i, (pptx_file, source_path) in enumerate(batch_io.decks(pptx_files, claim), 1):
+        rel_path = str(pptx_file.relative_to(folder_path))
 
-    for i, pptx_file in enumerate(pptx_files, 1):
         print(f"\n[{i}/{len(pptx_files)}] {pptx_file.name}")
         print("-" * 60)
 
         try:
             # Markdown生成
-            process_powerpoint_to_markdown(str(pptx_file), api_key)
+            json_path = batch_io.output_path(pptx_file, '.json')
+            md_path = batch_io.output_path(pptx_file, '.md')
+            result = process_powerpoint_to_markdown(
+                str(source_path), api_key, guard=guard, processor_options=processor_options,
+                aliases=[alias.name for alias in aliases.get(pptx_file, [])],
+                deterministic=deterministic,
+                json_path=str(json_path), md_path=str(md_path), source_path=str(pptx_file)
+            )
+
+            # 無料枠超過の場合は処理を停止（記録しないので --resume で続きから再開できる）
+            if result and result.get('error') == 'FREE_TIER_LIMIT_EXCEEDED':
+                print(f"\n⚠️  バッチ処理を停止します（無料枠超過）")
+                print(f"   未処理: {len(pptx_files) - i + 1}ファイル")
+                break
+
+            if result is None or 'error' in result:
+                entry = {
+                    'path': rel_path,
+                    'file': pptx_file.name,
+                    'status': 'error',
+                    'error': result['error'] if result else 'initialization failed'
+                }
+                # サイズ超過・タイムアウト等はガード判定として記録
+                if result and result.get('guard_status'):
+                    entry['status'] = result['guard_status']
+                journal.append(entry)
+                continue
 
-            success_count += 1
-            results.append({
+            if not result['unchanged']:
+                batch_io.written(json_path, md_path)
+
+            journal.append({
+                'path': rel_path,
                 'file': pptx_file.name,
                 'status': 'success',
-                'markdown': pptx_file.with_suffix('.md').name
+                'markdown': md_path.name,
+                'unchanged': result['unchanged']
             })
 
-            # APIレート制限を考慮して待機
-            if i < len(pptx_files):
+            # APIレート制限を考慮して待機（前回の分析の再利用・表のみで解決した場合は不要）
+            llm_called = not (result['file_info'].get('reused_analysis')
+                              or result['gemini_analysis'].get('llm_backend') == 'local_tables')
+            if i < len(pptx_files) and llm_called:
                 time.sleep(2)
 
+        except KeyboardInterrupt:
+            # 記録済みの分はジャーナルに残っているので --resume で再開できる
+            print("\n⏸️ 中断しました（--resume で再開できます）")
+            break
+
         except Exception as e:
             print(f"❌ ERROR: {str(e)}")
-            error_count += 1
-            results.append({
+            journal.append({
+                'path': rel_path,
                 'file': pptx_file.name,
                 'status': 'error',
                 'error': str(e)
             })
 
+        finally:
+            if claimer:
+                claimer.release(rel_path, done=journal.is_completed(rel_path))
+
+    # ステージングした出力を反映してから集計
+    batch_io.close()
+
+    # サマリーはジャーナルから集計（再開前の記録・他ノードの記録も含む）
+    results = final_results(folder_path, "_batch_journal_markdown", journal, claimer)
+    counts = summarize(results)
+    converted = counts['success'] + counts['errors']
+
     # サマリー出力
     print(f"\n{'='*60}")
     print(f"バッチ処理完了")
     print(f"{'='*60}")
-    print(f"✅ 成功: {success_count}/{len(pptx_files)}")
-    print(f"❌ エラー: {error_count}/{len(pptx_files)}")
+    print(f"✅ 成功: {counts['success']}/{converted}")
+    if counts['unchanged']:
+        print(f"   変更なし（書き換え省略）: {counts['unchanged']}")
+    print(f"❌ エラー: {counts['errors']}/{converted}")
+    for status, count in counts['guard'].items():
+        print(f"   - {status}: {count}")
+    ocr_engine = (processor_options or {}).get('ocr')
+    if ocr_engine:
+        ocr_engine.close()
+        ocr_engine.print_report()
+    store = (processor_options or {}).get('store')
+    if store:
+        store.print_report()
+    if counts['aliases']:
+        print(f"🗂️ 別バージョン（変換省略）: {counts['aliases']}")
 
-    if success_count > 0:
+    if counts['success'] > 0:
         print(f"\n📝 生成されたMarkdownファイル:")
         for result in results:
             if result['status'] == 'success':
@@ -84,13 +208,46 @@ def batch_generate_markdown(folder_path: str, api_key: str):
 
 def main():
     """メイン処理"""
+    parser = argparse.ArgumentParser(description="NotebookLM用バッチMarkdown生成ツール")
+    parser.add_argument('folder', nargs='?', help="処理対象フォルダ")
+    parser.add_argument('--chunked', action='store_true',
+                        help="長いデッキをスライド範囲ごとに分割して分析・統合する")
+    parser.add_argument('--max-chunks', type=int, default=4,
+                        help="分割モードで1デッキに使う最大リクエスト数（既定: 4）")
+    parser.add_argument('--dedup', action='store_true',
+                        help="バージョン違いのデッキをまとめ、最新版だけを変換する")
+    parser.add_argument('--update-index', action='store_true',
+                        help="処理後に類似案件検索インデックスを差分更新する（numpyが必要）")
+    parser.add_argument('--sheet-export', action='store_true',
+                        help="処理後に新規・変更のあった行をスプレッドシート取り込み用のCSV（_sheet_export.csv）に書き出す")
+    parser.add_argument('--resume', action='store_true',
+                        help="前回のジャーナルを引き継ぎ、記録済みのファイルを飛ばして再開する")
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default='gemini',
+                        help="分析に使うLLMバックエンド（既定: gemini）")
+    parser.add_argument('--overflow', choices=sorted(BACKENDS),
+                        help="Geminiの無料枠超過後に切り替えるバックエンド（例: local）")
+    parser.add_argument('--ocr', action='store_true',
+                        help="スライド画像をTesseractでOCRし、テキストに追加する（画像ハッシュでキャッシュ）")
+    parser.add_argument('--table-first', action='store_true',
+                        help="表から単価・数量・金額・納期が全て読み取れたデッキはLLMを呼ばずに処理する")
+    parser.add_argument('--deterministic', action='store_true',
+                        help="内容が変わっていない出力ファイルは書き換えない（キー順固定、同期の再アップロード防止）")
+    parser.add_argument('--entities', action='store_true',
+                        help="クライアント名・協力会社名を名寄せインデックス（_entity_index.jsonl）の正規IDに解決する")
+    add_plan_arguments(parser)
+    add_catalog_arguments(parser)
+    add_store_arguments(parser)
+    add_io_arguments(parser)
+    add_sharding_arguments(parser)
+    args = parser.parse_args()
+
     print("="*60)
     print("NotebookLM用バッチMarkdown生成ツール")
     print("="*60)
 
-    # APIキーの確認
+    # APIキーの確認（Geminiを使う場合のみ、見積もりでは不要）
     api_key = os.environ.get('GEMINI_API_KEY')
-    if not api_key:
+    if not api_key and 'gemini' in (args.backend, args.overflow) and not args.plan:
         print("\nGemini API key not found in environment variable.")
         api_key = input("Enter your Gemini API key: ").strip()
         if not api_key:
@@ -98,8 +255,8 @@ def main():
             return
 
     # フォルダパスを取得
-    if len(sys.argv) > 1:
-        folder = sys.argv[1]
+    if args.folder:
+        folder = args.folder
     else:
         folder = input("\nEnter folder path to process: ").strip()
 
@@ -108,7 +265,58 @@ def main():
         sys.exit(1)
 
     # バッチ処理実行
-    batch_generate_markdown(folder, api_key)
+    processor_options = {
+        'chunk_mode': args.chunked,
+        'max_chunks_per_deck': args.max_chunks,
+        'backend': args.backend,
+        'overflow_backend': args.overflow,
+        'table_first': args.table_first,
+    }
+    if args.ocr and args.plan != 'metadata':
+        # 画像内のテキスト（貼り付けられた価格表等）はOCRで取得
+        from slide_ocr import SlideOCR
+        try:
+            processor_options['ocr'] = SlideOCR()
+        except Exception as e:
+            print(f"ERROR: Failed to initialize OCR: {e}")
+            sys.exit(1)
+    if args.text_store is not None:
+        # 抽出結果はストアに保存・再利用（プロンプト変更後の再実行で.pptxを開き直さない）
+        processor_options['store'] = store_from_args(args)
+    if args.entities and not args.plan:
+        # クライアント名・協力会社名はフォルダの名寄せインデックスで正規IDに解決
+        from entity_index import open_index
+        processor_options['entities'] = open_index(folder)
+
+    # 見積もりのみ（ローカルで抽出し、LLMは呼ばない。前回の出力は --output-root から読む）
+    if args.plan:
+        planned_options = {key: value for key, value in processor_options.items()
+                           if key not in ('backend', 'overflow_backend')}
+        plan_folder(folder, planned_options, mode=args.plan, backend=args.backend,
+                    overflow_backend=args.overflow, dedup=args.dedup,
+                    catalog_filters=select_options(args), batch_io=BatchIO(folder, output_root=args.output_root),
+                    pause_seconds=2.0)
+        return
+
+    batch_io = io_from_args(folder, args)
+    batch_generate_markdown(folder, api_key, processor_options, dedup=args.dedup, resume=args.resume,
+                            node=args.node, shard=args.shard, leases=args.leases,
+                            deterministic=args.deterministic, catalog_filters=select_options(args),
+                            batch_io=batch_io)
+
+    # 類似案件検索インデックスの差分更新
+    if args.update_index:
+        from similarity_index import update_folder_index
+        stats = update_folder_index(str(batch_io.output_folder))
+        print(f"Similarity index updated: {stats['documents']} documents "
+              f"(+{stats['added']} / ~{stats['updated']} / -{stats['removed']})")
+
+    # スプレッドシート取り込み用のCSV（新規・変更のあった行のみ）
+    if args.sheet_export:
+        from sheet_export import export_folder
+        stats = export_folder(str(batch_io.output_folder))
+        print(f"Sheet export: {stats['rows']} new/changed rows "
+              f"({stats['pending']} rows waiting for import) -> {stats['path']}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+バッチ処理の事前見積もり（--plan、LLMは一度も呼ばない）
+Geminiでのバッチ処理を始める前に、新規・変更のあるファイル数、リクエスト数、推定トークン数、
+無料枠で何日かかるか、RPM上限での所要時間を見積もる。
+
+- extract: ローカルで抽出し、実際の処理と同じ判定（前回の分析の再利用・表のみで解決・分割数）で
+  デッキごとのリクエスト数を数え、実際のプロンプトからトークン数を概算する
+  （--text-store 指定時はストアを使うので、2回目以降は.pptxを開き直さない）
+- metadata: .pptxを開かず、出力JSONの有無・更新日時で新規・変更を判定し、
+  リクエスト数・トークン数は過去の記録の平均で概算する
+
+過去のリクエストの記録（.gemini_usage.calls.jsonl）から、実トークン数と概算の比・
+再リクエスト（repair）の割合・出力トークン数・レイテンシを補正に使う
+"""
+
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Any, Optional
+
+import pptx_extraction
+from batch_io import BatchIO
+from deck_catalog import select_files
+from deck_dedup import cluster_decks
+from llm_backends import BACKENDS, StubBackend, estimate_tokens
+from powerpoint_processor_gemini import GeminiPowerPointProcessor
+from pptx_guard import PptxGuard, PptxGuardError
+from table_resolver import resolve_tables, fully_resolved
+from usage_report import load_calls, forecast_quota, GEMINI_PRICE_PER_M_TOKENS
+
+PLAN_MODES = ['extract', 'metadata']
+
+# 過去の記録が無い場合の既定値
+DEFAULT_LATENCY_MS = 2000
+DEFAULT_OUTPUT_TOKENS = 300
+
+# デッキの判定（requests > 0 になるのは new / changed）
+STATUS_LABELS = {
+    'new': '新規（前回の出力なし・エラー）',
+    'changed': '変更あり（再分析）',
+    'reused': '軽微な変更（前回の分析を再利用）',
+    'unchanged': '変更なし',
+    'tables': '表のみで解決（LLMなし）',
+    'unreadable': '読み込み不可（ガード・破損）',
+}
+
+
+def history_profile(calls: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """過去のGeminiリクエストから見積もりの補正値を集計"""
+    gemini_calls = [c for c in calls if c.get('backend', 'gemini') == 'gemini']
+    requests = [c for c in gemini_calls if c.get('section') != 'repair']
+    repairs = [c for c in gemini_calls if c.get('section') == 'repair']
+    decks = {(c.get('folder'), c.get('file')) for c in requests}
+
+    # 概算（estimate_tokens）に対する実トークン数の比
+    calibrated = [c for c in gemini_calls if c.get('prompt_tokens') and c.get('estimated_prompt_tokens')]
+    token_ratio = (sum(c['prompt_tokens'] for c in calibrated)
+                   / sum(c['estimated_prompt_tokens'] for c in calibrated)) if calibrated else 1.0
+
+    def mean_prompt_tokens(group):
+        tokens = [c.get('prompt_tokens') or c.get('estimated_prompt_tokens') for c in group]
+        tokens = [t for t in tokens if t]
+        return sum(tokens) / len(tokens) if tokens else None
+
+    outputs = [c['output_tokens'] for c in gemini_calls if c.get('output_tokens')]
+    latencies = sorted(c['latency_ms'] for c in gemini_calls
+                       if c.get('latency_ms') and c.get('outcome') != 'error')
+
+    return {
+        'requests': len(requests),
+        'requests_per_deck': len(requests) / len(decks) if decks else 1.0,
+        'repair_rate': len(repairs) / len(requests) if requests else 0.0,
+        'token_ratio': token_ratio,
+        'prompt_tokens': mean_prompt_tokens(requests),
+        'repair_prompt_tokens': mean_prompt_tokens(repairs),
+        'output_tokens': sum(outputs) / len(outputs) if outputs else DEFAULT_OUTPUT_TOKENS,
+        'latency_ms': latencies[len(latencies) // 2] if latencies else DEFAULT_LATENCY_MS,
+    }
+
+
+def plan_deck(processor: GeminiPowerPointProcessor, pptx_file: Path, json_path: Path) -> Dict[str, Any]:
+    """
+    1デッキをローカルで抽出し、実際の処理と同じ判定でリクエスト数とプロンプトのトークン数を数える
+
+    Returns:
+        {'file', 'status', 'requests', 'prompt_tokens', 'extract_seconds'}
+    """
+    entry = {'file': pptx_file.name, 'status': 'new', 'requests': 0, 'prompt_tokens': 0}
+    started = time.monotonic()
+    previous = pptx_extraction.load_previous_result(json_path)
+    try:
+        contents = pptx_extraction.read_slide_content(str(pptx_file), processor.guard, processor.ocr,
+                                                      processor.store)
+    except PptxGuardError as e:
+        entry.update(status='unreadable', detail=e.status)
+        contents = None
+    except Exception as e:
+        entry.update(status='unreadable', detail=str(e))
+        contents = None
+    entry['extract_seconds'] = time.monotonic() - started
+    if contents is None:
+        return entry
+
+    slides = [content['texts'] for content in contents]
+    if previous is not None:
+        if not processor._has_material_changes(slides, previous):
+            hashes = [pptx_extraction.slide_hash(texts) for texts in slides]
+            entry['status'] = 'unchanged' if hashes == previous.get('slide_hashes') else 'reused'
+            return entry
+        entry['status'] = 'changed'
+
+    table_fields = resolve_tables([table for content in contents for table in content['tables']])
+    if processor.table_first and fully_resolved(table_fields):
+        entry['status'] = 'tables'
+        return entry
+
+    # process_powerpoint と同じ分岐でプロンプトを組み立てる
+    all_slide_texts = [text for texts in slides for text in texts]
+    if processor.chunk_mode and len("\n\n".join(all_slide_texts)) > processor.PROMPT_CHAR_LIMIT:
+        blocks = [texts for _, _, texts in processor._split_into_chunks(slides)]
+        char_limit = processor.chunk_budget(slides)
+    else:
+        blocks = [all_slide_texts]
+        char_limit = None
+    prompts = [processor.build_prompt("\n\n".join(texts), pptx_file.name, char_limit) for texts in blocks]
+
+    entry['requests'] = len(prompts)
+    entry['prompt_tokens'] = sum(estimate_tokens(prompt) for prompt in prompts)
+    return entry
+
+
+def plan_deck_metadata(processor: GeminiPowerPointProcessor, pptx_file: Path, json_path: Path,
+                       profile: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    .pptxを開かずに見積もる（出力JSONより新しい.pptxは変更ありとみなす）
+
+    軽微な変更による再利用・表のみでの解決はスライドを読まないと判定できないため、
+    変更ありのデッキは全てリクエストが必要とみなす（上限の見積もり）
+    """
+    entry = {'file': pptx_file.name, 'status': 'new', 'requests': 0, 'prompt_tokens': 0,
+             'extract_seconds': 0.0}
+    previous = pptx_extraction.load_previous_result(json_path)
+    if previous is not None:
+        if json_path.stat().st_mtime >= pptx_file.stat().st_mtime:
+            entry['status'] = 'unchanged'
+            return entry
+        entry['status'] = 'changed'
+
+    # 過去の記録が無ければ上限いっぱいのプロンプトとみなす
+    prompt_tokens = profile['prompt_tokens']
+    if prompt_tokens is None:
+        prompt_tokens = estimate_tokens(processor.build_prompt('', pptx_file.name)) + processor.PROMPT_CHAR_LIMIT
+
+    entry['requests'] = profile['requests_per_deck']
+    entry['prompt_tokens'] = profile['requests_per_deck'] * prompt_tokens / profile['token_ratio']
+    return entry
+
+
+def forecast(decks: List[Dict[str, Any]], profile: Dict[str, Any], usage_data: Dict[str, Any],
+             metered: bool = True, pause_seconds: float = 1.0) -> Dict[str, Any]:
+    """デッキごとの見積もりを集計し、無料枠の日数・所要時間・参考費用を見積もる"""
+    statuses = {}
+    for deck in decks:
+        statuses[deck['status']] = statuses.get(deck['status'], 0) + 1
+
+    llm_decks = [deck for deck in decks if deck['requests']]
+    requests = math.ceil(sum(deck['requests'] for deck in llm_decks))
+    repairs = round(requests * profile['repair_rate'])
+    total = requests + repairs
+
+    prompt_tokens = sum(deck['prompt_tokens'] for deck in llm_decks) * profile['token_ratio']
+    prompt_tokens += repairs * (profile['repair_prompt_tokens'] or profile['prompt_tokens'] or 0)
+    output_tokens = total * profile['output_tokens']
+
+    # 1デッキずつ順に処理（分割したチャンクは並列）し、従量バックエンドはRPM上限で待機する
+    latency = profile['latency_ms'] / 1000
+    sequential = (sum(deck['extract_seconds'] for deck in decks)
+                  + len(llm_decks) * (latency * (1 + profile['repair_rate']) + pause_seconds))
+    rpm_bound = total / GeminiPowerPointProcessor.FREE_TIER_LIMITS['rpm'] * 60 if metered else 0
+
+    plan = {
+        'decks': len(decks),
+        'statuses': statuses,
+        'llm_decks': len(llm_decks),
+        'requests': requests,
+        'expected_repairs': repairs,
+        'total_requests': total,
+        'prompt_tokens': round(prompt_tokens),
+        'output_tokens': round(output_tokens),
+        'cost_usd': round((prompt_tokens * GEMINI_PRICE_PER_M_TOKENS['input']
+                           + output_tokens * GEMINI_PRICE_PER_M_TOKENS['output']) / 1000000, 4),
+        'latency_ms': profile['latency_ms'],
+        'wall_seconds': max(sequential, rpm_bound),
+        'wall_hours': round(max(sequential, rpm_bound) / 3600, 2),
+        'metered': metered,
+    }
+    if metered:
+        plan.update(forecast_quota(total, usage_data))
+    return plan
+
+
+def plan_folder(folder_path: str, processor_options: Optional[Dict[str, Any]] = None, mode: str = 'extract',
+                backend: str = 'gemini', overflow_backend: Optional[str] = None, dedup: bool = False,
+                catalog_filters: Optional[Dict[str, Any]] = None, batch_io: Optional[BatchIO] = None,
+                pause_seconds: float = 1.0, usage_log_path: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    フォルダのバッチ処理を見積もって表示（LLMは呼ばず、出力も書き込まない）
+
+    Args:
+        processor_options: GeminiPowerPointProcessor への追加オプション（chunk_mode / max_chunks_per_deck /
+                           table_first / ocr / store）
+        mode: extract（ローカルで抽出）/ metadata（.pptxを開かない）
+        backend: 実際の処理で使うLLMバックエンド（従量のものだけ無料枠を見積もる）
+        overflow_backend: 無料枠超過後に切り替えるバックエンド
+        dedup: バージョン違いのデッキをまとめ、最新版だけを数える
+        catalog_filters: 文書プロパティのカタログによる絞り込み
+        batch_io: 出力先（前回の出力の場所）
+        pause_seconds: 実際の処理でデッキごとに入れる待機時間
+    """
+    batch_io = batch_io or BatchIO(folder_path)
+    options = dict(processor_options or {})
+    options.setdefault('guard', PptxGuard())
+
+    # 分割・プロンプト・変更判定だけに使う（スタブなのでリクエストは送らない）
+    processor = GeminiPowerPointProcessor(backend=StubBackend(), usage_log_path=usage_log_path, **options)
+    profile = history_profile(load_calls(processor.calls_log_path))
+
+    pptx_files = list(Path(folder_path).rglob("*.pptx"))
+    if not pptx_files:
+        print(f"No .pptx files found in: {folder_path}")
+        return None
+
+    if catalog_filters is not None:
+        pptx_files, _ = select_files(folder_path, pptx_files, catalog_filters)
+    if dedup:
+        print("Clustering near-duplicate decks...")
+        pptx_files = list(cluster_decks(pptx_files, guard=processor.guard, store=processor.store))
+
+    print(f"\nPlanning {len(pptx_files)} PowerPoint files ({mode}, no API calls)")
+    print("=" * 60)
+
+    def plan(pptx_file):
+        json_path = batch_io.final_path(pptx_file, '.json')
+        if mode == 'metadata':
+            return plan_deck_metadata(processor, pptx_file, json_path, profile)
+        return plan_deck(processor, pptx_file, json_path)
+
+    decks = []
+    with ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1)) as executor:
+        for deck in executor.map(plan, pptx_files):
+            decks.append(deck)
+            if deck['requests']:
+                print(f"  [{deck['status']}] {deck['file']}: {deck['requests']:g} req, "
+                      f"~{round(deck['prompt_tokens'] * profile['token_ratio']):,} tokens")
+
+    result = forecast(decks, profile, processor.usage_data, BACKENDS[backend].metered, pause_seconds)
+    print_plan(result, profile, overflow_backend)
+
+    ocr_engine = options.get('ocr')
+    if ocr_engine:
+        ocr_engine.close()
+    if processor.store:
+        processor.store.print_report()
+    return result
+
+
+def _duration(seconds: float) -> str:
+    """所要時間の表示（1時間未満は分に切り上げ。丸めた時間から換算すると短い処理が0分になる）"""
+    if seconds >= 3600:
+        return f"{round(seconds / 3600, 2)}時間"
+    return f"{math.ceil(seconds / 60)}分"
+
+
+def print_plan(plan: Dict[str, Any], profile: Dict[str, Any], overflow_backend: Optional[str] = None):
+    """見積もりを表示"""
+    print("\n" + "=" * 60)
+    print("BATCH PLAN (no API calls)")
+    print("=" * 60)
+    print(f"Decks: {plan['decks']}")
+    for status, label in STATUS_LABELS.items():
+        if plan['statuses'].get(status):
+            print(f"  - {label}: {plan['statuses'][status]}")
+
+    print(f"\nRequests: {plan['requests']} for {plan['llm_decks']} decks "
+          f"(+{plan['expected_repairs']} expected repairs = {plan['total_requests']})")
+    print(f"Tokens: in ~{plan['prompt_tokens']:,} / out ~{plan['output_tokens']:,} "
+          f"(参考 ${plan['cost_usd']:.4f})")
+    if profile['requests']:
+        print(f"  calibrated on {profile['requests']} past requests "
+              f"(token ratio {profile['token_ratio']:.2f}, repair rate {profile['repair_rate']:.1%}, "
+              f"p50 latency {profile['latency_ms']}ms)")
+    else:
+        print(f"  no past requests recorded, using defaults (latency {DEFAULT_LATENCY_MS}ms)")
+
+    if plan['metered']:
+        print(f"\n今日の残り: {plan['today_remaining']} / 今月の残り: {plan['month_remaining']}")
+        print(f"所要日数: {plan['days_needed']}日（処理時間 約{_duration(plan['wall_seconds'])}、"
+              f"RPM上限で{plan['hours_at_rpm']}時間、枠の回復待ちは含まない）")
+        if overflow_backend and plan['total_requests'] > plan['today_remaining']:
+            print(f"  今日の残りを超える {plan['total_requests'] - plan['today_remaining']} requests "
+                  f"は {overflow_backend} で処理されます")
+        elif plan['exceeds_month']:
+            print(f"  ⚠️  今月の無料枠を超えます（--overflow local の利用を検討してください）")
+    else:
+        print(f"\n処理時間: 約{_duration(plan['wall_seconds'])}（従量制でないバックエンドのため無料枠は消費しない）")
+
+
+def add_plan_arguments(parser):
+    """バッチ処理のCLIに見積もりのオプションを追加"""
+    parser.add_argument('--plan', nargs='?', const='extract', choices=PLAN_MODES,
+                        help="処理せずに、新規・変更ファイル数・リクエスト数・トークン数・無料枠の日数・所要時間を"
+                             "見積もる（LLMは呼ばない。metadata: .pptxを開かず出力JSONの日時と過去の記録で概算）")
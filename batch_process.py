@@ -5,15 +5,45 @@ PowerPointファイルのバッチ処理スクリプト
 指定フォルダ内のすべての.pptxファイルを処理してJSONに変換
 """
 
-import os
+import argparse
 import sys
 from pathlib import Path
 from powerpoint_processor import PowerPointProcessor
-import json
+from pptx_guard import PptxGuard
+from batch_journal import summarize
+from batch_sharding import open_journal, final_results, add_sharding_arguments
+from output_writer import write_json_output, write_summary
+from entity_index import open_index
+from deck_catalog import select_files, add_catalog_arguments, select_options
+from text_store import add_store_arguments, store_from_args
+from batch_io import BatchIO, add_io_arguments, io_from_args
+import pptx_extraction
+
+def batch_process_folder(folder_path: str, resume: bool = False, node: str = None,
+                         shard: str = None, leases: bool = False, ocr: bool = False,
+                         deterministic: bool = False, entities: bool = False,
+                         catalog_filters: dict = None, store=None, batch_io: BatchIO = None):
+    """
+    フォルダ内の全PowerPointファイルを処理
+
+    store: 抽出結果の TextStore / batch_io: 先読み・出力先・ステージングの BatchIO
+    """
+    batch_io = batch_io or BatchIO(folder_path)
+    # 画像内のテキスト（貼り付けられた価格表等）はOCRで取得
+    ocr_engine = None
+    if ocr:
+        from slide_ocr import SlideOCR
+        try:
+            ocr_engine = SlideOCR()
+        except Exception as e:
+            print(f"ERROR: Failed to initialize OCR: {e}")
+            return
 
-def batch_process_folder(folder_path: str):
-    """フォルダ内の全PowerPointファイルを処理"""
-    processor = PowerPointProcessor()
+    # 巨大ファイル対策: メモリ・時間制限付きワーカーで抽出
+    # 会社名・クライアント名はフォルダの名寄せインデックスで正規IDに解決
+    processor = PowerPointProcessor(guard=PptxGuard(), ocr=ocr_engine,
+                                    entities=open_index(folder_path) if entities else None,
+                                    store=store)
 
     # .pptxファイルを再帰的に検索
     pptx_files = list(Path(folder_path).rglob("*.pptx"))
@@ -22,77 +52,165 @@ def batch_process_folder(folder_path: str):
         print(f"No .pptx files found in: {folder_path}")
         return
 
+    # 文書プロパティのカタログで絞り込み・新しい順に並べ替え（スライドは解析しない）
+    copies = {}
+    if catalog_filters is not None:
+        pptx_files, copies = select_files(folder_path, pptx_files, catalog_filters)
+
     print(f"Found {len(pptx_files)} PowerPoint files")
     print("=" * 60)
 
-    success_count = 0
-    error_count = 0
-    results = []
+    # 1ファイルごとに結果をジャーナルへ追記（--resume 時・分散処理時は記録済みのファイルを飛ばす）
+    journal, claimer, done = open_journal(folder_path, "_batch_journal", resume, node, shard, leases,
+                                          deterministic)
+    total_files = len(pptx_files) + sum(len(members) for members in copies.values())
+
+    # 完全なコピーは代表ファイルの別名として記録
+    for canonical, members in copies.items():
+        for copy in members:
+            if str(copy.relative_to(folder_path)) not in done:
+                journal.append({
+                    'path': str(copy.relative_to(folder_path)),
+                    'file': copy.name,
+                    'status': 'alias',
+                    'canonical': canonical.name
+                })
+
+    pptx_files = [p for p in pptx_files if str(p.relative_to(folder_path)) not in done]
+    if resume:
+        print(f"Resuming: {len(done)} files already recorded")
+
+    # 分散処理時は他ノードの担当・処理中のファイルを飛ばす
+    claim = (lambda p: claimer.claim(str(p.relative_to(folder_path)))) if claimer else None
+
+    # 共有フォルダ上のデッキは次のK件をローカルに先読み（指定時、割り当て済みのもののみ）
+    for i, (pptx_file, source_path) in enumerate(batch_io.decks(pptx_files, claim), 1):
+        rel_path = str(pptx_file.relative_to(folder_path))
 
-    for i, pptx_file in enumerate(pptx_files, 1):
         print(f"\n[{i}/{len(pptx_files)}] Processing: {pptx_file.name}")
 
         try:
             # 絶対パスを使用
-            abs_path = str(pptx_file.absolute())
-            result = processor.process_powerpoint(abs_path)
+            abs_path = str(source_path.absolute())
+            output_path = batch_io.output_path(pptx_file, '.json')
+
+            # 前回の出力があれば変更の無いスライドの解析結果を再利用
+            previous = pptx_extraction.load_previous_result(output_path)
+            result = processor.process_powerpoint(abs_path, previous=previous)
 
             if 'error' in result:
                 print(f"  ERROR: {result['error']}")
-                error_count += 1
+                entry = {
+                    'path': rel_path,
+                    'file': pptx_file.name,
+                    'status': 'error',
+                    'error': result['error']
+                }
+                # サイズ超過・タイムアウト等はガード判定として記録
+                if result.get('guard_status'):
+                    entry['status'] = result['guard_status']
+                journal.append(entry)
                 continue
 
-            # JSON出力
-            output_path = pptx_file.with_suffix('.json')
-            with open(output_path, 'w', encoding='utf-8') as f:
-                json.dump(result, f, ensure_ascii=False, indent=2)
+            # JSON出力（決定的モードでは内容が同じなら書き込まない）
+            result, written = write_json_output(output_path, result, deterministic)
+            if written:
+                batch_io.written(output_path)
 
-            print(f"  SUCCESS: {output_path.name}")
-            print(f"    - Slides: {result['file_info']['slide_count']}")
+            print(f"  SUCCESS: {output_path.name}" + ("" if written else " (unchanged)"))
+            print(f"    - Slides: {result['file_info']['slide_count']}"
+                  f" (reused: {result['file_info']['reused_slides']})")
             print(f"    - Prices: {len(result['summary']['all_prices'])}")
             print(f"    - Companies: {len(result['summary']['all_companies'])}")
             print(f"    - Keywords: {len(result['summary']['all_keywords'])}")
 
-            success_count += 1
-            results.append({
+            journal.append({
+                'path': rel_path,
                 'file': pptx_file.name,
                 'output': output_path.name,
                 'slides': result['file_info']['slide_count'],
+                'unchanged': not written,
                 'status': 'success'
             })
 
+        except KeyboardInterrupt:
+            # 記録済みの分はジャーナルに残っているので --resume で再開できる
+            print("\n  INTERRUPTED: resume later with --resume")
+            break
+
         except Exception as e:
             print(f"  ERROR: {str(e)}")
-            error_count += 1
-            results.append({
+            journal.append({
+                'path': rel_path,
                 'file': pptx_file.name,
                 'status': 'error',
                 'error': str(e)
             })
 
+        finally:
+            if claimer:
+                claimer.release(rel_path, done=journal.is_completed(rel_path))
+
+    # ステージングした出力を反映してから集計
+    batch_io.close()
+
+    # サマリーはジャーナルから集計（再開前の記録・他ノードの記録も含む）
+    results = final_results(folder_path, "_batch_journal", journal, claimer)
+    counts = summarize(results)
+
     # サマリー出力
     print("\n" + "=" * 60)
     print("BATCH PROCESSING SUMMARY")
     print("=" * 60)
-    print(f"Total files: {len(pptx_files)}")
-    print(f"Success: {success_count}")
-    print(f"Errors: {error_count}")
+    print(f"Total files: {total_files}")
+    if counts['aliases']:
+        print(f"Aliases (exact copies): {counts['aliases']}")
+    print(f"Success: {counts['success']}")
+    if counts['unchanged']:
+        print(f"  - unchanged (not rewritten): {counts['unchanged']}")
+    print(f"Errors: {counts['errors']}")
+    for status, count in counts['guard'].items():
+        print(f"  - {status}: {count}")
+    if ocr_engine:
+        ocr_engine.close()
+        ocr_engine.print_report()
+    if store:
+        store.print_report()
 
     # サマリーJSONを保存
     summary_path = Path(folder_path) / "_batch_summary.json"
-    with open(summary_path, 'w', encoding='utf-8') as f:
-        json.dump({
-            'total': len(pptx_files),
-            'success': success_count,
-            'errors': error_count,
-            'results': results
-        }, f, ensure_ascii=False, indent=2)
+    write_summary(summary_path, {
+        'total': total_files,
+        'success': counts['success'],
+        'errors': counts['errors'],
+        'guard': counts['guard'],
+        'ocr': ocr_engine.report() if ocr_engine else None,
+        'results': results
+    }, deterministic)
 
     print(f"\nSummary saved to: {summary_path}")
 
 if __name__ == "__main__":
-    if len(sys.argv) > 1:
-        folder = sys.argv[1]
+    parser = argparse.ArgumentParser(description="PowerPoint Batch Processing")
+    parser.add_argument('folder', nargs='?', help="処理対象フォルダ")
+    parser.add_argument('--resume', action='store_true',
+                        help="前回のジャーナルを引き継ぎ、記録済みのファイルを飛ばして再開する")
+    parser.add_argument('--ocr', action='store_true',
+                        help="スライド画像をTesseractでOCRし、テキストに追加する（画像ハッシュでキャッシュ）")
+    parser.add_argument('--deterministic', action='store_true',
+                        help="内容が変わっていない出力ファイルは書き換えない（キー順固定、同期の再アップロード防止）")
+    parser.add_argument('--entities', action='store_true',
+                        help="会社名・クライアント名を名寄せインデックス（_entity_index.jsonl）の正規IDに解決する")
+    parser.add_argument('--sheet-export', action='store_true',
+                        help="処理後に新規・変更のあった行をスプレッドシート取り込み用のCSV（_sheet_export.csv）に書き出す")
+    add_catalog_arguments(parser)
+    add_store_arguments(parser)
+    add_io_arguments(parser)
+    add_sharding_arguments(parser)
+    args = parser.parse_args()
+
+    if args.folder:
+        folder = args.folder
     else:
         folder = input("Enter folder path to process: ")
 
@@ -100,4 +218,16 @@ if __name__ == "__main__":
         print(f"ERROR: Folder not found: {folder}")
         sys.exit(1)
 
-    batch_process_folder(folder)
\ No newline at end of file
+    batch_io = io_from_args(folder, args)
+    batch_process_folder(folder, resume=args.resume, node=args.node,
+                         shard=args.shard, leases=args.leases, ocr=args.ocr,
+                         deterministic=args.deterministic, entities=args.entities,
+                         catalog_filters=select_options(args), store=store_from_args(args),
+                         batch_io=batch_io)
+
+    # スプレッドシート取り込み用のCSV（新規・変更のあった行のみ）
+    if args.sheet_export:
+        from sheet_export import export_folder
+        stats = export_folder(str(batch_io.output_folder))
+        print(f"Sheet export: {stats['rows']} new/changed rows "
+              f"({stats['pending']} rows waiting for import) -> {stats['path']}")
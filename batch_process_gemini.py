@@ -5,20 +5,66 @@ PowerPointファイルのバッチ処理スクリプト（Gemini API版 v4.0）
 指定フォルダ内のすべての.pptxファイルをGemini APIで処理してJSONに変換
 """
 
+import argparse
 import os
 import sys
 from pathlib import Path
 from powerpoint_processor_gemini import GeminiPowerPointProcessor
-import json
+from pptx_guard import PptxGuard
+from deck_dedup import cluster_decks
+from batch_journal import summarize
+from batch_sharding import open_journal, final_results, add_sharding_arguments
+from llm_backends import BACKENDS
+from output_writer import write_json_output, write_summary
+from entity_index import open_index
+from deck_catalog import select_files, add_catalog_arguments, select_options
+from text_store import add_store_arguments, store_from_args
+from batch_io import BatchIO, add_io_arguments, io_from_args
+from batch_planner import plan_folder, add_plan_arguments
+import pptx_extraction
 import time
 
 
-def batch_process_folder(folder_path: str, api_key: str):
-    """フォルダ内の全PowerPointファイルをGemini APIで処理"""
+def batch_process_folder(folder_path: str, api_key: str, chunk_mode: bool = False,
+                         max_chunks_per_deck: int = 4, dedup: bool = False,
+                         backend: str = 'gemini', overflow_backend: str = None,
+                         resume: bool = False, node: str = None, shard: str = None,
+                         leases: bool = False, ocr: bool = False, table_first: bool = False,
+                         deterministic: bool = False, entities: bool = False,
+                         catalog_filters: dict = None, store=None, batch_io: BatchIO = None):
+    """
+    フォルダ内の全PowerPointファイルをGemini API（または指定バックエンド）で処理
+
+    store: 抽出結果の TextStore / batch_io: 先読み・出力先・ステージングの BatchIO
+    """
+    batch_io = batch_io or BatchIO(folder_path)
+
+    # 画像内のテキスト（貼り付けられた価格表等）はOCRで取得
+    ocr_engine = None
+    if ocr:
+        from slide_ocr import SlideOCR
+        try:
+            ocr_engine = SlideOCR()
+        except Exception as e:
+            print(f"ERROR: Failed to initialize OCR: {e}")
+            return
 
     # プロセッサー初期化
     try:
-        processor = GeminiPowerPointProcessor(api_key=api_key)
+        # 巨大ファイル対策: メモリ・時間制限付きワーカーで抽出
+        processor = GeminiPowerPointProcessor(
+            api_key=api_key,
+            guard=PptxGuard(),
+            chunk_mode=chunk_mode,
+            max_chunks_per_deck=max_chunks_per_deck,
+            backend=backend,
+            overflow_backend=overflow_backend,
+            ocr=ocr_engine,
+            table_first=table_first,
+            # クライアント名・協力会社名はフォルダの名寄せインデックスで正規IDに解決
+            entities=open_index(folder_path) if entities else None,
+            store=store
+        )
     except Exception as e:
         print(f"ERROR: Failed to initialize Gemini API: {e}")
         return
@@ -30,20 +76,68 @@ def batch_process_folder(folder_path: str, api_key: str):
         print(f"No .pptx files found in: {folder_path}")
         return
 
+    # 文書プロパティのカタログで絞り込み・新しい順に並べ替え（スライドは解析しない）
+    copies = {}
+    if catalog_filters is not None:
+        pptx_files, copies = select_files(folder_path, pptx_files, catalog_filters)
+
     print(f"\nFound {len(pptx_files)} PowerPoint files")
     print("=" * 60)
 
-    success_count = 0
-    error_count = 0
-    results = []
+    # 1ファイルごとに結果をジャーナルへ追記（--resume 時・分散処理時は記録済みのファイルを飛ばす）
+    journal, claimer, done = open_journal(folder_path, "_batch_journal_gemini", resume, node, shard, leases,
+                                          deterministic)
+    total_files = len(pptx_files) + sum(len(members) for members in copies.values())
+
+    # 完全なコピーは代表ファイルの別名として記録
+    for canonical, members in copies.items():
+        for copy in members:
+            if str(copy.relative_to(folder_path)) not in done:
+                journal.append({
+                    'path': str(copy.relative_to(folder_path)),
+                    'file': copy.name,
+                    'status': 'alias',
+                    'canonical': canonical.name
+                })
+
+    # バージョン違いのデッキは最新版だけを分析し、他は別名として記録
+    aliases = {}
+    if dedup:
+        print("Clustering near-duplicate decks...")
+        aliases = cluster_decks(pptx_files, guard=processor.guard, store=store)
+        pptx_files = list(aliases)
+        for canonical, members in aliases.items():
+            for alias in members:
+                if str(alias.relative_to(folder_path)) in done:
+                    continue
+                journal.append({
+                    'path': str(alias.relative_to(folder_path)),
+                    'file': alias.name,
+                    'status': 'alias',
+                    'canonical': canonical.name
+                })
+        print(f"  {total_files} files -> {len(pptx_files)} unique decks")
+
+    pptx_files = [p for p in pptx_files if str(p.relative_to(folder_path)) not in done]
+    if resume:
+        print(f"Resuming: {len(done)} files already recorded")
+
+    # 分散処理時は他ノードの担当・処理中のファイルを飛ばす
+    claim = (lambda p: claimer.claim(str(p.relative_to(folder_path)))) if claimer else None
+
+    # 共有フォルダ上のデッキは次のK件をローカルに先読み（指定時、割り当て済みのもののみ）
+    for i, (pptx_file, source_path) in enumerate(batch_io.decks(pptx_files, claim), 1):
+        rel_path = str(pptx_file.relative_to(folder_path))
 
-    for i, pptx_file in enumerate(pptx_files, 1):
         print(f"\n[{i}/{len(pptx_files)}] Processing: {pptx_file.name}")
         print("-" * 60)
 
         try:
-            # Gemini APIで処理
-            result = processor.process_powerpoint(str(pptx_file))
+            output_path = batch_io.output_path(pptx_file, '.json')
+
+            # Gemini APIで処理（前回の出力から重要な変更が無ければ分析を再利用）
+            previous = pptx_extraction.load_previous_result(output_path)
+            result = processor.process_powerpoint(str(source_path), previous=previous, source_path=str(pptx_file))
 
             if 'error' in result:
                 error_msg = result['error']
@@ -52,61 +146,102 @@ def batch_process_folder(folder_path: str, api_key: str):
                 # 無料枠超過の場合は処理を停止
                 if error_msg == 'FREE_TIER_LIMIT_EXCEEDED':
                     print(f"\n⚠️  バッチ処理を停止します（無料枠超過）")
-                    print(f"   処理済み: {success_count}ファイル")
+                    print(f"   処理済み: {i - 1}ファイル")
                     print(f"   未処理: {len(pptx_files) - i}ファイル")
                     break
 
-                error_count += 1
-                results.append({
+                entry = {
+                    'path': rel_path,
                     'file': pptx_file.name,
                     'status': 'error',
                     'error': error_msg
-                })
+                }
+                # サイズ超過・タイムアウト等はガード判定として記録
+                if result.get('guard_status'):
+                    entry['status'] = result['guard_status']
+                journal.append(entry)
                 continue
 
-            # JSON出力
-            output_path = pptx_file.with_suffix('.json')
-            with open(output_path, 'w', encoding='utf-8') as f:
-                json.dump(result, f, ensure_ascii=False, indent=2)
+            if aliases.get(pptx_file):
+                result['file_info']['aliases'] = [alias.name for alias in aliases[pptx_file]]
+
+            # JSON出力（決定的モードでは内容が同じなら書き込まない）
+            result, written = write_json_output(output_path, result, deterministic)
+            if written:
+                batch_io.written(output_path)
 
             # 結果表示
             analysis = result['gemini_analysis']
-            print(f"  SUCCESS: {output_path.name}")
+            print(f"  SUCCESS: {output_path.name}" + ("" if written else " (unchanged)"))
             print(f"    - Slides: {result['file_info']['slide_count']}")
             print(f"    - Client: {analysis.get('client_name', 'N/A')}")
             print(f"    - Event Type: {analysis.get('event_type', 'N/A')}")
             print(f"    - Event Date: {analysis.get('event_date', 'N/A')}")
             print(f"    - Companies: {len(analysis.get('partner_companies', []))}")
             print(f"    - Confidence: {analysis.get('confidence_score', 0)}%")
+            if result['file_info']['reused_analysis']:
+                print(f"    - Reused previous analysis (no material changes)")
+            local_only = analysis.get('llm_backend') == 'local_tables'
+            if local_only:
+                print(f"    - Resolved from tables (no LLM call)")
 
-            success_count += 1
-            results.append({
+            journal.append({
+                'path': rel_path,
                 'file': pptx_file.name,
                 'output': output_path.name,
                 'slides': result['file_info']['slide_count'],
                 'confidence': analysis.get('confidence_score', 0),
+                'unchanged': not written,
                 'status': 'success'
             })
 
-            # APIレート制限を考慮して少し待機
-            time.sleep(1)
+            # APIレート制限を考慮して少し待機（API未使用時は不要）
+            if processor.backend.metered and not result['file_info']['reused_analysis'] and not local_only:
+                time.sleep(1)
+
+        except KeyboardInterrupt:
+            # 記録済みの分はジャーナルに残っているので --resume で再開できる
+            print("\n  INTERRUPTED: resume later with --resume")
+            break
 
         except Exception as e:
             print(f"  ERROR: {str(e)}")
-            error_count += 1
-            results.append({
+            journal.append({
+                'path': rel_path,
                 'file': pptx_file.name,
                 'status': 'error',
                 'error': str(e)
             })
 
+        finally:
+            if claimer:
+                claimer.release(rel_path, done=journal.is_completed(rel_path))
+
+    # ステージングした出力を反映してから集計
+    batch_io.close()
+
+    # サマリーはジャーナルから集計（再開前の記録・他ノードの記録も含む）
+    results = final_results(folder_path, "_batch_journal_gemini", journal, claimer)
+    counts = summarize(results)
+
     # サマリー出力
     print("\n" + "=" * 60)
     print("BATCH PROCESSING SUMMARY (Gemini API v4.0)")
     print("=" * 60)
-    print(f"Total files: {len(pptx_files)}")
-    print(f"Success: {success_count}")
-    print(f"Errors: {error_count}")
+    print(f"Total files: {total_files}")
+    if counts['aliases']:
+        print(f"Aliases (not analyzed): {counts['aliases']}")
+    print(f"Success: {counts['success']}")
+    if counts['unchanged']:
+        print(f"  - unchanged (not rewritten): {counts['unchanged']}")
+    print(f"Errors: {counts['errors']}")
+    for status, count in counts['guard'].items():
+        print(f"  - {status}: {count}")
+    if ocr_engine:
+        ocr_engine.close()
+        ocr_engine.print_report()
+    if store:
+        store.print_report()
 
     # 平均信頼度スコア
     confidence_scores = [r.get('confidence', 0) for r in results if r.get('status') == 'success']
@@ -116,28 +251,63 @@ def batch_process_folder(folder_path: str, api_key: str):
 
     # サマリーJSONを保存
     summary_path = Path(folder_path) / "_batch_summary_gemini.json"
-    with open(summary_path, 'w', encoding='utf-8') as f:
-        json.dump({
-            'processing_method': 'gemini_api_v4.0',
-            'total': len(pptx_files),
-            'success': success_count,
-            'errors': error_count,
-            'average_confidence': avg_confidence if confidence_scores else 0,
-            'results': results
-        }, f, ensure_ascii=False, indent=2)
+    write_summary(summary_path, {
+        'processing_method': 'gemini_api_v4.0',
+        'total': total_files,
+        'aliases': counts['aliases'],
+        'success': counts['success'],
+        'errors': counts['errors'],
+        'guard': counts['guard'],
+        'ocr': ocr_engine.report() if ocr_engine else None,
+        'average_confidence': avg_confidence if confidence_scores else 0,
+        'results': results
+    }, deterministic)
 
     print(f"\nSummary saved to: {summary_path}")
 
 
 def main():
     """メイン処理"""
+    parser = argparse.ArgumentParser(description="PowerPoint Batch Processing (Gemini API v4.0)")
+    parser.add_argument('folder', nargs='?', help="処理対象フォルダ")
+    parser.add_argument('--chunked', action='store_true',
+                        help="長いデッキをスライド範囲ごとに分割して分析・統合する")
+    parser.add_argument('--max-chunks', type=int, default=4,
+                        help="分割モードで1デッキに使う最大リクエスト数（既定: 4）")
+    parser.add_argument('--dedup', action='store_true',
+                        help="バージョン違いのデッキをまとめ、最新版だけを分析する")
+    parser.add_argument('--update-index', action='store_true',
+                        help="処理後に類似案件検索インデックスを差分更新する（numpyが必要）")
+    parser.add_argument('--sheet-export', action='store_true',
+                        help="処理後に新規・変更のあった行をスプレッドシート取り込み用のCSV（_sheet_export.csv）に書き出す")
+    parser.add_argument('--resume', action='store_true',
+                        help="前回のジャーナルを引き継ぎ、記録済みのファイルを飛ばして再開する")
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default='gemini',
+                        help="分析に使うLLMバックエンド（既定: gemini）")
+    parser.add_argument('--overflow', choices=sorted(BACKENDS),
+                        help="Geminiの無料枠超過後に切り替えるバックエンド（例: local）")
+    parser.add_argument('--ocr', action='store_true',
+                        help="スライド画像をTesseractでOCRし、テキストに追加する（画像ハッシュでキャッシュ）")
+    parser.add_argument('--table-first', action='store_true',
+                        help="表から単価・数量・金額・納期が全て読み取れたデッキはLLMを呼ばずに処理する")
+    parser.add_argument('--deterministic', action='store_true',
+                        help="内容が変わっていない出力ファイルは書き換えない（キー順固定、同期の再アップロード防止）")
+    parser.add_argument('--entities', action='store_true',
+                        help="クライアント名・協力会社名を名寄せインデックス（_entity_index.jsonl）の正規IDに解決する")
+    add_plan_arguments(parser)
+    add_catalog_arguments(parser)
+    add_store_arguments(parser)
+    add_io_arguments(parser)
+    add_sharding_arguments(parser)
+    args = parser.parse_args()
+
     print("=" * 60)
     print("PowerPoint Batch Processing (Gemini API v4.0)")
     print("=" * 60)
 
-    # APIキーの確認
+    # APIキーの確認（Geminiを使う場合のみ、見積もりでは不要）
     api_key = os.environ.get('GEMINI_API_KEY')
-    if not api_key:
+    if not api_key and 'gemini' in (args.backend, args.overflow) and not args.plan:
         print("\nGemini API key not found in environment variable.")
         api_key = input("Enter your Gemini API key: ").strip()
         if not api_key:
@@ -145,8 +315,8 @@ def main():
             return
 
     # フォルダパスを取得
-    if len(sys.argv) > 1:
-        folder = sys.argv[1]
+    if args.folder:
+        folder = args.folder
     else:
         folder = input("\nEnter folder path to process: ").strip()
 
@@ -154,8 +324,61 @@ def main():
         print(f"ERROR: Folder not found: {folder}")
         sys.exit(1)
 
+    # 見積もりのみ（ローカルで抽出し、LLMは呼ばない。前回の出力は --output-root から読む）
+    if args.plan:
+        processor_options = {
+            'chunk_mode': args.chunked,
+            'max_chunks_per_deck': args.max_chunks,
+            'table_first': args.table_first,
+            'store': store_from_args(args),
+        }
+        if args.ocr and args.plan == 'extract':
+            from slide_ocr import SlideOCR
+            try:
+                processor_options['ocr'] = SlideOCR()
+            except Exception as e:
+                print(f"ERROR: Failed to initialize OCR: {e}")
+                sys.exit(1)
+        plan_folder(folder, processor_options, mode=args.plan, backend=args.backend,
+                    overflow_backend=args.overflow, dedup=args.dedup,
+                    catalog_filters=select_options(args), batch_io=BatchIO(folder, output_root=args.output_root))
+        return
+
     # バッチ処理実行
-    batch_process_folder(folder, api_key)
+    batch_io = io_from_args(folder, args)
+    batch_process_folder(
+        folder, api_key,
+        chunk_mode=args.chunked,
+        max_chunks_per_deck=args.max_chunks,
+        dedup=args.dedup,
+        backend=args.backend,
+        overflow_backend=args.overflow,
+        resume=args.resume,
+        node=args.node,
+        shard=args.shard,
+        leases=args.leases,
+        ocr=args.ocr,
+        table_first=args.table_first,
+        deterministic=args.deterministic,
+        entities=args.entities,
+        catalog_filters=select_options(args),
+        store=store_from_args(args),
+        batch_io=batch_io
+    )
+
+    # 類似案件検索インデックスの差分更新
+    if args.update_index:
+        from similarity_index import update_folder_index
+        stats = update_folder_index(str(batch_io.output_folder))
+        print(f"Similarity index updated: {stats['documents']} documents "
+              f"(+{stats['added']} / ~{stats['updated']} / -{stats['removed']})")
+
+    # スプレッドシート取り込み用のCSV（新規・変更のあった行のみ）
+    if args.sheet_export:
+        from sheet_export import export_folder
+        stats = export_folder(str(batch_io.output_folder))
+        print(f"Sheet export: {stats['rows']} new/changed rows "
+              f"({stats['pending']} rows waiting for import) -> {stats['path']}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+複数マシンでの分散バッチ処理
+共有フォルダ上のファイルを、中央サーバー無しで複数ノードに振り分ける。
+
+- 静的分割: 相対パスのハッシュで index/count のシャードに割り当て
+- 動的分割: ファイルごとのリースファイルを排他作成で取得し、ハートビートで更新。
+  期限切れのリース（クラッシュしたノード）は他のノードが引き継ぐ
+
+各ノードは自分のジャーナル（_batch_journal*.<node>.jsonl）に結果を記録し、
+サマリーは全ノードのジャーナルを統合して作成する
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import socket
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Any, Optional
+
+from batch_journal import BatchJournal, latest_results, summarize, completed_paths
+from records import BatchEntry
+from output_writer import dumps
+
+
+# リースファイルを置くフォルダ（処理対象フォルダ直下）
+LEASE_DIR = '_batch_leases'
+
+# リースファイルの拡張子（.jsonにしない: 出力JSONを走査する処理・JSON_processor.js が拾わないように）
+LEASE_SUFFIX = '.lease'
+
+# ジャーナル名 → サマリー名
+SUMMARY_NAMES = {
+    '_batch_journal': '_batch_summary.json',
+    '_batch_journal_gemini': '_batch_summary_gemini.json',
+    '_batch_journal_markdown': '_batch_summary_markdown.json',
+}
+
+
+def default_node_id() -> str:
+    """ノード名の既定値（ホスト名）"""
+    return socket.gethostname()
+
+
+def shard_of(rel_path: str, count: int) -> int:
+    """相対パスのハッシュによるシャード番号（全ノードで同じ結果になる）"""
+    digest = hashlib.sha1(rel_path.replace('\\', '/').encode('utf-8')).hexdigest()
+    return int(digest[:8], 16) % count
+
+
+class StaticShard:
+    """ハッシュによる静的な割り当て"""
+
+    def __init__(self, index: int, count: int):
+        if not 0 <= index < count:
+            raise ValueError(f"Shard index must be in 0..{count - 1}: {index}")
+        self.index = index
+        self.count = count
+
+    def claim(self, rel_path: str) -> bool:
+        """このノードの担当ならTrue"""
+        return shard_of(rel_path, self.count) == self.index
+
+    def release(self, rel_path: str, done: bool):
+        """静的割り当てでは何もしない"""
+
+    def close(self):
+        """静的割り当てでは何もしない"""
+
+
+class LeaseManager:
+    """リースファイルによる動的な割り当て"""
+
+    def __init__(self, folder_path: str, node_id: str, ttl_sec: int = 900,
+                 heartbeat_sec: int = 60, since: Optional[float] = None):
+        """
+        初期化
+
+        Args:
+            folder_path: 処理対象フォルダ（共有フォルダ）
+            node_id: このノードの名前
+            ttl_sec: ハートビートが途絶えてからリースを失効とみなすまでの秒数
+            heartbeat_sec: ハートビート（リースの更新日時の更新）間隔
+            since: この時刻より前に完了したリースは前回の実行のものとして引き継ぐ
+                   （--resume なしの実行。省略時は完了済みのリースを常に尊重する）
+        """
+        self.lease_dir = Path(folder_path) / LEASE_DIR
+        self.lease_dir.mkdir(exist_ok=True)
+        self.node_id = node_id
+        self.ttl_sec = ttl_sec
+        self.heartbeat_sec = heartbeat_sec
+        self.since = since
+
+        self._held = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._heartbeat = threading.Thread(target=self._heartbeat_loop, daemon=True)
+        self._heartbeat.start()
+
+    def _lease_path(self, rel_path: str) -> Path:
+        """ファイルに対応するリースファイルのパス"""
+        key = hashlib.sha1(rel_path.replace('\\', '/').encode('utf-8')).hexdigest()[:16]
+        return self.lease_dir / f"{key}{LEASE_SUFFIX}"
+
+    def _read(self, lease_path: Path) -> Optional[Dict[str, Any]]:
+        """リースの内容（書き込み途中・削除済みならNone）"""
+        try:
+            with open(lease_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def _write_state(self, lease_path: Path, rel_path: str, state: str):
+        """一時ファイル経由でリースの内容を置き換え"""
+        temp_path = lease_path.with_suffix(f".{self.node_id}.tmp")
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'path': rel_path, 'node': self.node_id, 'state': state,
+                       'updated_at': time.time()}, f, ensure_ascii=False)
+        os.replace(temp_path, lease_path)
+
+    def claim(self, rel_path: str) -> bool:
+        """
+        リースを取得
+
+        Returns:
+            取得できればTrue（他ノードが処理中・処理済みならFalse）
+        """
+        lease_path = self._lease_path(rel_path)
+
+        for _ in range(2):
+            try:
+                # 排他作成（共有フォルダ上でも1ノードだけが成功する）
+                fd = os.open(lease_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                if not self._reclaim_expired(lease_path):
+                    return False
+                continue
+
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'path': rel_path, 'node': self.node_id, 'state': 'active',
+                           'updated_at': time.time()}, f, ensure_ascii=False)
+            with self._lock:
+                self._held[rel_path] = lease_path
+            return True
+
+        return False
+
+    def _expired(self, lease: Dict[str, Any], mtime: float) -> bool:
+        """引き継げるリースか（ハートビートの途絶えた処理中のリース・前回の実行で完了したリース）"""
+        if lease.get('state', 'active') != 'active':
+            return self.since is not None and lease.get('updated_at', 0) < self.since
+        return time.time() - mtime >= self.ttl_sec
+
+    def _reclaim_expired(self, lease_path: Path) -> bool:
+        """
+        期限切れのリースを退避（複数ノードが同時に試みても成功するのは1つ）
+
+        確認してから退避すると、その間に他のノードが引き継いだ新しいリースを消してしまうため、
+        先に一意な名前へ退避し、退避したファイルで期限切れを確認する（期限内なら元に戻す）
+        """
+        stale_path = lease_path.with_suffix(f".stale.{self.node_id}.{os.getpid()}.{threading.get_ident()}")
+        try:
+            os.rename(lease_path, stale_path)
+        except FileNotFoundError:
+            # 他のノードが先に退避した（排他作成からやり直す）
+            return True
+
+        # 内容が読めないリース（作成直後にクラッシュ等）も期限切れなら引き継ぐ
+        lease = self._read(stale_path) or {}
+        if not self._expired(lease, stale_path.stat().st_mtime):
+            try:
+                # 期限内: 元に戻す（その間に他のノードが作成していれば、そちらを優先して破棄）
+                os.link(stale_path, lease_path)
+            except FileExistsError:
+                pass
+            except OSError:
+                # ハードリンク非対応のファイルシステム
+                if not lease_path.exists():
+                    os.rename(stale_path, lease_path)
+            if stale_path.exists():
+                os.remove(stale_path)
+            return False
+
+        os.remove(stale_path)
+        print(f"  Reclaimed expired lease from node {lease.get('node')}: {lease.get('path')}")
+        return True
+
+    def release(self, rel_path: str, done: bool):
+        """
+        リースを解放
+
+        Args:
+            done: 成功・別名として記録済みならリースを完了状態で残し、他ノードが再処理しないようにする
+                  （エラー・中断時は削除して他ノード・再開時の再試行に引き渡す）
+        """
+        with self._lock:
+            lease_path = self._held.pop(rel_path, None)
+        if lease_path is None:
+            return
+        if done:
+            self._write_state(lease_path, rel_path, 'done')
+        else:
+            try:
+                os.remove(lease_path)
+            except FileNotFoundError:
+                pass
+
+    def _heartbeat_loop(self):
+        """保持中のリースの更新日時を定期的に更新"""
+        while not self._stop.wait(self.heartbeat_sec):
+            with self._lock:
+                held = list(self._held.items())
+            for rel_path, lease_path in held:
+                try:
+                    os.utime(lease_path)
+                except FileNotFoundError:
+                    print(f"  WARNING: Lease lost (reclaimed by another node): {rel_path}")
+
+    def close(self):
+        """ハートビートを停止し、未完了のリースを解放"""
+        self._stop.set()
+        self._heartbeat.join()
+        with self._lock:
+            held = list(self._held)
+        for rel_path in held:
+            self.release(rel_path, done=False)
+
+
+def node_journal_path(folder_path: str, prefix: str, node_id: Optional[str]) -> Path:
+    """ジャーナルのパス（分散処理時はノードごと）"""
+    if node_id:
+        return Path(folder_path) / f"{prefix}.{node_id}.jsonl"
+    return Path(folder_path) / f"{prefix}.jsonl"
+
+
+def journal_paths(folder_path: str, prefix: str) -> List[Path]:
+    """全ノードのジャーナル（単一ノード実行のものを含む）"""
+    folder = Path(folder_path)
+    paths = sorted(folder.glob(f"{prefix}.*.jsonl"))
+    single = folder / f"{prefix}.jsonl"
+    if single.exists():
+        paths.insert(0, single)
+    return paths
+
+
+def merged_results(folder_path: str, prefix: str) -> List[BatchEntry]:
+    """全ノードのジャーナルを記録日時順に統合し、ファイルごとの最新の結果を返す"""
+    entries = []
+    for path in journal_paths(folder_path, prefix):
+        entries.extend(BatchJournal.load(path))
+    entries.sort(key=lambda entry: entry.get('recorded_at', ''))
+    return latest_results(entries)
+
+
+def create_claimer(folder_path: str, node_id: str, shard: Optional[str] = None,
+                   leases: bool = False, since: Optional[float] = None):
+    """
+    分散処理の割り当て方法を作成
+
+    Args:
+        shard: 静的分割の "index/count"（例: "0/3"）
+        leases: Trueならリースファイルによる動的分割
+        since: この時刻より前に完了したリースを引き継ぐ（--resume なしの実行）
+
+    Returns:
+        StaticShard / LeaseManager（単一ノード実行ならNone）
+    """
+    if shard:
+        index, count = (int(v) for v in shard.split('/'))
+        return StaticShard(index, count)
+    if leases:
+        return LeaseManager(folder_path, node_id, since=since)
+    return None
+
+
+def open_journal(folder_path: str, prefix: str, resume: bool = False,
+                 node_id: Optional[str] = None, shard: Optional[str] = None,
+                 leases: bool = False, deterministic: bool = False):
+    """
+    バッチ処理のジャーナルと割り当て方法を準備
+
+    分散処理時はノードごとのジャーナルに記録する。--resume 時は全ノードで成功・別名として
+    記録済みのファイルを処理済みとして扱い、そうでなければ単一ノードと同じく全ファイルを処理し直す
+    （前回の実行で完了したリースは引き継ぐ）。決定的モードでは記録日時を付けない
+
+    Returns:
+        (ジャーナル, 割り当て方法（単一ノードならNone）, 処理済みファイルの相対パス集合)
+    """
+    if not shard and not leases:
+        journal = BatchJournal(node_journal_path(folder_path, prefix, None), resume=resume,
+                               deterministic=deterministic)
+        return journal, None, journal.completed()
+
+    node_id = node_id or default_node_id()
+    claimer = create_claimer(folder_path, node_id, shard, leases, since=None if resume else time.time())
+    journal = BatchJournal(node_journal_path(folder_path, prefix, node_id), resume=resume,
+                           node_id=node_id, deterministic=deterministic)
+    done = completed_paths(merged_results(folder_path, prefix)) if resume else set()
+    print(f"Node {node_id}: {'leases' if leases and not shard else f'shard {shard}'}"
+          + (f", {len(done)} files already completed by all nodes" if resume else ""))
+    return journal, claimer, done
+
+
+def final_results(folder_path: str, prefix: str, journal: BatchJournal, claimer) -> List[BatchEntry]:
+    """ジャーナルを閉じてサマリー用の結果を返す（分散処理時は全ノード分を統合）"""
+    journal.close()
+    if claimer is None:
+        return journal.results()
+    claimer.close()
+    return merged_results(folder_path, prefix)
+
+
+def add_sharding_arguments(parser):
+    """バッチ処理のCLIに分散処理のオプションを追加"""
+    parser.add_argument('--node', help="分散処理時のノード名（既定: ホスト名）")
+    parser.add_argument('--shard', metavar='INDEX/COUNT',
+                        help="パスのハッシュで静的に分割し、INDEX番目を担当する（例: 0/3）")
+    parser.add_argument('--leases', action='store_true',
+                        help="リースファイルで動的に分割する（クラッシュしたノードの分は引き継ぐ）")
+
+
+def reset(folder_path: str):
+    """分散処理の状態（リース・ノードごとのジャーナル）を削除して新規実行に備える"""
+    folder = Path(folder_path)
+    shutil.rmtree(folder / LEASE_DIR, ignore_errors=True)
+    for prefix in SUMMARY_NAMES:
+        for path in journal_paths(folder_path, prefix):
+            path.unlink()
+            print(f"Removed: {path.name}")
+
+
+def write_merged_summary(folder_path: str, prefix: str) -> Optional[Path]:
+    """全ノードのジャーナルから統合サマリーを作成"""
+    results = merged_results(folder_path, prefix)
+    if not results:
+        return None
+
+    counts = summarize(results)
+    summary_path = Path(folder_path) / SUMMARY_NAMES[prefix]
+    with open(summary_path, 'w', encoding='utf-8') as f:
+        f.write(dumps({
+            'total': len(results),
+            'aliases': counts['aliases'],
+            'success': counts['success'],
+            'errors': counts['errors'],
+            'guard': counts['guard'],
+            'nodes': sorted({r['node'] for r in results if r.get('node')}),
+            'results': results
+        }, deterministic=False))
+    return summary_path
+
+
+def main():
+    """メイン処理（merge: 統合サマリー作成 / reset: 分散処理の状態を削除）"""
+    if len(sys.argv) < 3 or sys.argv[1] not in ('merge', 'reset'):
+        print("Usage: python batch_sharding.py merge|reset <folder>")
+        sys.exit(1)
+
+    command, folder = sys.argv[1], sys.argv[2]
+    if not Path(folder).exists():
+        print(f"ERROR: Folder not found: {folder}")
+        sys.exit(1)
+
+    if command == 'reset':
+        reset(folder)
+        return
+
+    for prefix in SUMMARY_NAMES:
+        summary_path = write_merged_summary(folder, prefix)
+        if summary_path:
+            print(f"Summary saved to: {summary_path}")
+
+
+if __name__ == "__main__":
+    main()
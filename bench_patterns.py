@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+会社名・クライアント名パターンのベンチマーク
+空白の無い長いテキスト（最悪ケース）で analyze_text の処理時間を計測し、
+入力長に対して線形に伸びることを確認する（線形でなければ終了コード1）
+"""
+
+import math
+import re
+import sys
+import time
+from typing import Optional
+
+from powerpoint_processor import PowerPointProcessor
+
+
+# 旧実装のバックトラックしやすいパターン（比較用）
+LEGACY_PATTERNS = [
+    r'([^\s、。\n]+)\s*(?:株式会社|有限会社)',
+    r'([^\s、。\n]+)\s*\(株\)',
+    r'([^\s、。\n]+様)',
+]
+
+# 処理時間 ∝ 入力長^k の指数 k の許容上限（線形なら約1、二乗なら約2）
+MAX_GROWTH_EXPONENT = 1.5
+
+# 計測誤差の大きい極小時間（秒）は指数の当てはめに使わない
+MIN_FIT_SECONDS = 0.001
+
+
+def adversarial_inputs(length: int) -> dict:
+    """最悪ケースの入力を生成"""
+    return {
+        'no_anchor': 'あ' * length,
+        'anchor_at_end': 'あ' * length + '株式会社',
+        'many_anchors': ('エイトキューブ株式会社広研様' * (length // 14 + 1))[:length],
+        'table_like': ('単価500円数量1,000個' * (length // 13 + 1))[:length],
+    }
+
+
+def measure(func, text: str, repeat: int = 5) -> float:
+    """最小処理時間（秒）"""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(text)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def growth_exponent(samples: list) -> Optional[float]:
+    """(入力長, 処理時間) の組を両対数で最小二乗当てはめし、伸びの指数を返す"""
+    points = [(math.log(length), math.log(elapsed))
+              for length, elapsed in samples if elapsed >= MIN_FIT_SECONDS]
+    if len(points) < 2:
+        return None
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    spread = sum((x - mean_x) ** 2 for x, _ in points)
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / spread
+
+
+def legacy_scan(text: str):
+    """旧パターンでの走査"""
+    for pattern in LEGACY_PATTERNS:
+        re.findall(pattern, text, re.IGNORECASE | re.MULTILINE)
+
+
+def main():
+    """メイン処理"""
+    processor = PowerPointProcessor()
+    # ベンチマーク中は時間上限で打ち切らない
+    processor.slide_time_budget = float('inf')
+
+    lengths = [10000, 20000, 40000, 80000, 160000]
+    ok = True
+
+    print("=" * 60)
+    print("COMPANY PATTERN BENCHMARK (analyze_text)")
+    print("=" * 60)
+
+    for name in adversarial_inputs(1):
+        print(f"\n[{name}]")
+        samples = []
+        for length in lengths:
+            text = adversarial_inputs(length)[name]
+            elapsed = measure(processor.analyze_text, text)
+            print(f"  {length:>7} chars: {elapsed * 1000:8.2f} ms")
+            samples.append((length, elapsed))
+        # 隣り合う長さの比ではなく全長さへの当てはめで判定する（1点の揺れで落ちない）
+        exponent = growth_exponent(samples)
+        if exponent is None:
+            print("  growth exponent: n/a (too fast to measure)")
+            continue
+        print(f"  growth exponent: {exponent:.2f} (limit {MAX_GROWTH_EXPONENT})")
+        if exponent > MAX_GROWTH_EXPONENT:
+            ok = False
+
+    # 旧パターンは二乗時間のため短い入力のみ
+    print("\n[legacy patterns, no_anchor]")
+    for length in (2500, 5000):
+        text = adversarial_inputs(length)['no_anchor']
+        print(f"  {length:>7} chars: {measure(legacy_scan, text, repeat=1) * 1000:8.2f} ms")
+
+    print("\n" + ("PASS: linear scaling" if ok else "FAIL: super-linear scaling detected"))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文書プロパティ（docProps）によるデッキのカタログ
+各.pptx（zip）から docProps/core.xml と docProps/app.xml だけを読み出し、
+タイトル・作成者・最終更新者・改訂番号・作成/更新日時・スライド数等を一覧にする。
+スライドを解析しない（python-pptxも使わない）ため、10万ファイルの共有フォルダでも数分で終わる。
+
+- ファイルの読み込みはスレッドで並列化
+- カタログ（_deck_catalog.jsonl）はサイズ・更新日時が同じファイルの記録を再利用して差分更新
+- バッチ処理の前に、スライド数・更新日時・作成者での絞り込み、新しい順の並べ替え、
+  完全なコピー（プロパティ・サイズ・全部品のCRC32が同じファイル）の除外に使う
+"""
+
+import hashlib
+import json
+import sys
+import zipfile
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Any, Optional, Tuple
+
+from output_writer import dumps, write_text_if_changed
+
+
+# 処理対象フォルダ直下のカタログファイル名
+CATALOG_NAME = '_deck_catalog.jsonl'
+
+CORE_PART = 'docProps/core.xml'
+APP_PART = 'docProps/app.xml'
+
+# これより大きいプロパティ部品は読まない（壊れた・細工されたファイル対策）
+MAX_PART_BYTES = 1024 * 1024
+
+DC_NS = '{http://purl.org/dc/elements/1.1/}'
+DCTERMS_NS = '{http://purl.org/dc/terms/}'
+CP_NS = '{http://schemas.openxmlformats.org/package/2006/metadata/core-properties}'
+EP_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/extended-properties}'
+
+# core.xml の要素 → 項目名
+CORE_FIELDS = {
+    f'{DC_NS}title': 'title',
+    f'{DC_NS}subject': 'subject',
+    f'{DC_NS}creator': 'author',
+    f'{CP_NS}lastModifiedBy': 'last_modified_by',
+    f'{CP_NS}revision': 'revision',
+    f'{CP_NS}keywords': 'keywords',
+    f'{CP_NS}category': 'category',
+    f'{DCTERMS_NS}created': 'created',
+    f'{DCTERMS_NS}modified': 'modified',
+}
+
+# app.xml の要素 → 項目名
+APP_FIELDS = {
+    f'{EP_NS}Slides': 'slide_count',
+    f'{EP_NS}HiddenSlides': 'hidden_slides',
+    f'{EP_NS}Notes': 'notes',
+    f'{EP_NS}Words': 'words',
+    f'{EP_NS}TotalTime': 'edit_minutes',
+    f'{EP_NS}Company': 'company',
+    f'{EP_NS}Application': 'application',
+}
+
+# 整数として保存する項目
+INTEGER_FIELDS = ('revision', 'slide_count', 'hidden_slides', 'notes', 'words', 'edit_minutes')
+
+# 完全なコピーの判定に使う項目（全て同じなら同じファイルとみなす）
+# content: 全部品の名前とCRC32（テンプレート由来でプロパティが同じでも、内容が違えば別ファイル）
+COPY_KEY_FIELDS = ('size', 'content', 'title', 'author', 'last_modified_by', 'revision', 'created',
+                   'modified', 'slide_count')
+
+
+def _read_part(package: zipfile.ZipFile, name: str, fields: Dict[str, str]) -> Dict[str, Any]:
+    """プロパティ部品の子要素を項目名で読み込み（部品が無い・壊れている場合は空）"""
+    try:
+        info = package.getinfo(name)
+    except KeyError:
+        return {}
+    if info.file_size > MAX_PART_BYTES:
+        return {}
+    try:
+        root = ET.fromstring(package.read(info))
+    except ET.ParseError:
+        return {}
+
+    values = {}
+    for child in root:
+        field = fields.get(child.tag)
+        if field and child.text and child.text.strip():
+            value = child.text.strip()
+            if field in INTEGER_FIELDS:
+                try:
+                    value = int(value)
+                except ValueError:
+                    continue
+            values[field] = value
+    return values
+
+
+def read_doc_properties(file_path: str) -> Dict[str, Any]:
+    """
+    .pptxの文書プロパティを読み込み（docProps の2部品だけを読む）
+
+    Returns:
+        {'title', 'author', 'modified', 'slide_count', ...}（無い項目は含めない）
+    """
+    with zipfile.ZipFile(file_path) as package:
+        properties = _read_part(package, CORE_PART, CORE_FIELDS)
+        properties.update(_read_part(package, APP_PART, APP_FIELDS))
+    return dict(sorted(properties.items()))
+
+
+def content_signature(package: zipfile.ZipFile) -> str:
+    """部品の名前とCRC32から作る内容の識別子（セントラルディレクトリだけを読み、展開はしない）"""
+    digest = hashlib.sha1()
+    for name, crc in sorted((info.filename, info.CRC) for info in package.infolist()):
+        digest.update(f"{name}\0{crc:08x}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def catalog_entry(file_path: Path, rel_path: str) -> Dict[str, Any]:
+    """カタログの1件（読めないファイルはエラーとして記録）"""
+    stat = file_path.stat()
+    entry = {'path': rel_path, 'size': stat.st_size, 'mtime': int(stat.st_mtime)}
+    try:
+        entry.update(read_doc_properties(str(file_path)))
+        with zipfile.ZipFile(file_path) as package:
+            entry['content'] = content_signature(package)
+    except (zipfile.BadZipFile, OSError, RuntimeError) as e:
+        entry['error'] = str(e)
+    return entry
+
+
+def catalog_path(folder_path: str) -> Path:
+    """フォルダのカタログファイルのパス"""
+    return Path(folder_path) / CATALOG_NAME
+
+
+def load_catalog(folder_path: str) -> Dict[str, Dict[str, Any]]:
+    """カタログを読み込み（{相対パス: 記録}、無ければ空）"""
+    catalog = {}
+    path = catalog_path(folder_path)
+    if not path.exists():
+        return catalog
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(entry, dict) and 'path' in entry:
+                catalog[entry['path']] = entry
+    return catalog
+
+
+def scan_folder(folder_path: str, pptx_files: Optional[List[Path]] = None,
+                workers: int = 32) -> Dict[str, Dict[str, Any]]:
+    """
+    フォルダ内の全.pptxのカタログを作成・差分更新して保存
+
+    サイズ・更新日時が前回と同じファイルは読み直さない。
+    削除されたファイルの記録は除く
+
+    Returns:
+        {相対パス: 記録}
+    """
+    if pptx_files is None:
+        pptx_files = list(Path(folder_path).rglob("*.pptx"))
+    previous = load_catalog(folder_path)
+
+    catalog = {}
+    pending = []
+    for pptx_file in pptx_files:
+        rel_path = str(pptx_file.relative_to(folder_path))
+        entry = previous.get(rel_path)
+        try:
+            stat = pptx_file.stat()
+        except OSError:
+            continue
+        # 内容の識別子が無い記録（古いカタログ）は読み直す
+        if (entry and entry.get('size') == stat.st_size and entry.get('mtime') == int(stat.st_mtime)
+                and (entry.get('content') or entry.get('error'))):
+            catalog[rel_path] = entry
+        else:
+            pending.append((pptx_file, rel_path))
+
+    # 共有フォルダ上では待ち時間が大半なのでスレッドで並列に読む
+    def read(item):
+        try:
+            return catalog_entry(*item)
+        except OSError:
+            return None
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for entry in executor.map(read, pending):
+            if entry:
+                catalog[entry['path']] = entry
+
+    catalog = dict(sorted(catalog.items()))
+    write_text_if_changed(
+        catalog_path(folder_path),
+        ''.join(dumps(entry, indent=False) + "\n" for entry in catalog.values())
+    )
+    return catalog
+
+
+def find_copies(catalog: Dict[str, Dict[str, Any]]) -> Dict[str, List[str]]:
+    """
+    完全なコピー（サイズ・部品のCRC32・プロパティが全て同じファイル）をまとめる
+
+    Returns:
+        {代表の相対パス: [コピーの相対パス, ...]}（コピーの無いファイルも含む）
+    """
+    groups = {}
+    for rel_path, entry in catalog.items():
+        if entry.get('error') or not entry.get('modified') or not entry.get('content'):
+            # 更新日時・内容の識別子の無いファイルは同一と判断できないので単独扱い
+            groups[(rel_path,)] = [rel_path]
+            continue
+        key = tuple(entry.get(field) for field in COPY_KEY_FIELDS)
+        groups.setdefault(key, []).append(rel_path)
+
+    copies = {}
+    for members in groups.values():
+        # パスの短いもの（コピー元らしいもの）を代表にする
+        members.sort(key=lambda p: (len(p), p))
+        copies[members[0]] = members[1:]
+    return copies
+
+
+def matches(entry: Dict[str, Any], min_slides: Optional[int] = None, max_slides: Optional[int] = None,
+            modified_since: Optional[str] = None, author: Optional[str] = None) -> bool:
+    """カタログの記録が絞り込み条件に合うか（読めなかったファイルは本処理でエラーを記録するため残す）"""
+    if entry.get('error'):
+        return True
+    # python-pptx等で保存したファイルはスライド数が0のままのことがあるため不明として扱う
+    slide_count = entry.get('slide_count') or None
+    if min_slides is not None and slide_count is not None and slide_count < min_slides:
+        return False
+    if max_slides is not None and slide_count is not None and slide_count > max_slides:
+        return False
+    if modified_since and (entry.get('modified') or '') < modified_since:
+        return False
+    if author:
+        people = f"{entry.get('author') or ''} {entry.get('last_modified_by') or ''}"
+        if author.casefold() not in people.casefold():
+            return False
+    return True
+
+
+def select_files(folder_path: str, pptx_files: List[Path],
+                 filters: Dict[str, Any]) -> Tuple[List[Path], Dict[Path, List[Path]]]:
+    """
+    カタログでバッチ処理の対象を選ぶ（スライドを解析する前に実行）
+
+    Args:
+        filters: min_slides / max_slides / modified_since / author（select_options で作成）
+
+    Returns:
+        (更新日時の新しい順の処理対象, {代表ファイル: [完全なコピー, ...]})
+    """
+    catalog = scan_folder(folder_path, pptx_files)
+    by_path = {str(p.relative_to(folder_path)): p for p in pptx_files}
+
+    selected = []
+    copies = {}
+    for canonical, members in find_copies(catalog).items():
+        if not matches(catalog[canonical], **filters):
+            continue
+        selected.append(canonical)
+        if members:
+            copies[by_path[canonical]] = [by_path[member] for member in members]
+
+    selected.sort(key=lambda p: (catalog[p].get('modified') or '', p), reverse=True)
+    print(f"Catalog: {len(catalog)} files -> {len(selected)} selected "
+          f"({sum(len(m) for m in copies.values())} exact copies skipped)")
+    return [by_path[p] for p in selected], copies
+
+
+def add_catalog_arguments(parser):
+    """バッチ処理のCLIにカタログによる絞り込みのオプションを追加"""
+    parser.add_argument('--catalog', action='store_true',
+                        help="文書プロパティのカタログで新しい順に処理し、完全なコピーを飛ばす（_deck_catalog.jsonl）")
+    parser.add_argument('--min-slides', type=int, help="スライド数がこれ未満のデッキを飛ばす（--catalog を含む）")
+    parser.add_argument('--max-slides', type=int, help="スライド数がこれを超えるデッキを飛ばす（--catalog を含む）")
+    parser.add_argument('--modified-since', metavar='YYYY-MM-DD',
+                        help="この日以降に更新されたデッキだけを処理する（--catalog を含む）")
+    parser.add_argument('--author', help="作成者・最終更新者にこの文字列を含むデッキだけを処理する（--catalog を含む）")
+
+
+def select_options(args) -> Optional[Dict[str, Any]]:
+    """CLI引数から select_files の絞り込み条件を作成（カタログを使わない場合はNone）"""
+    filters = {
+        'min_slides': args.min_slides,
+        'max_slides': args.max_slides,
+        'modified_since': args.modified_since,
+        'author': args.author,
+    }
+    if not args.catalog and all(value is None for value in filters.values()):
+        return None
+    return filters
+
+
+def file_info_properties(file_path: str) -> Optional[Dict[str, Any]]:
+    """出力の file_info に追加する文書プロパティ（読めなければNone）"""
+    try:
+        return read_doc_properties(file_path) or None
+    except (zipfile.BadZipFile, OSError, RuntimeError):
+        return None
+
+
+def main():
+    """メイン処理（カタログを作成して概要を表示）"""
+    if len(sys.argv) > 1:
+        folder = sys.argv[1]
+    else:
+        folder = input("Enter folder path to scan: ").strip()
+
+    if not Path(folder).exists():
+        print(f"ERROR: Folder not found: {folder}")
+        sys.exit(1)
+
+    catalog = scan_folder(folder)
+    copies = find_copies(catalog)
+    errors = [entry for entry in catalog.values() if entry.get('error')]
+    slides = sum(entry.get('slide_count') or 0 for entry in catalog.values())
+    authors = {}
+    for entry in catalog.values():
+        if entry.get('author'):
+            authors[entry['author']] = authors.get(entry['author'], 0) + 1
+
+    print(f"Files: {len(catalog)}")
+    print(f"Unique (excluding exact copies): {len(copies)}")
+    print(f"Total slides: {slides}")
+    print(f"Unreadable: {len(errors)}")
+    print("Top authors:")
+    for author, count in sorted(authors.items(), key=lambda item: -item[1])[:10]:
+        print(f"  {author}: {count}")
+    print(f"Catalog saved to: {catalog_path(folder)}")
+
+
+if __name__ == "__main__":
+    main()
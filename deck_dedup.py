@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+デッキのバージョン違い（提案書_v1 / v2_修正 / 最終 等）をまとめるクラスタリング
+スライドテキストの文字シングルをMinHash化し、LSHで候補ペアだけを比較するため
+フォルダ全体でも二乗時間にならない。各クラスタは更新日時が最新のファイルを
+代表として残し、他のメンバーは別名（aliases）として記録する
+"""
+
+import hashlib
+import random
+import re
+import sys
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import pptx_extraction
+from pptx_guard import PptxGuard
+
+try:
+    import numpy as np
+except ImportError:
+    # numpyが無い場合は純Pythonで計算（低速）
+    np = None
+
+
+# MinHash用の素数（2^31 - 1、a * h + b が64bit整数に収まる大きさ）
+_MERSENNE_PRIME = (1 << 31) - 1
+
+# numpyで一度に処理するシングル数（置換数 × この数 の行列を作る）
+_BLOCK_SIZE = 8192
+
+
+class DeckClusterer:
+    """MinHash/LSHによる類似デッキのクラスタリングクラス"""
+
+    def __init__(self, num_perm: int = 128, bands: int = 32, threshold: float = 0.7,
+                 shingle_size: int = 5):
+        """
+        初期化
+
+        Args:
+            num_perm: MinHashの置換数（bandsで割り切れること）
+            bands: LSHのバンド数
+            threshold: 同一クラスタとみなす推定Jaccard類似度
+            shingle_size: 文字シングルの長さ
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+
+        # 置換パラメータは固定シードで決定的に生成
+        rng = random.Random(20241001)
+        self._a = [rng.randrange(1, _MERSENNE_PRIME) for _ in range(num_perm)]
+        self._b = [rng.randrange(0, _MERSENNE_PRIME) for _ in range(num_perm)]
+
+    def shingles(self, text: str) -> set:
+        """空白を除いたテキストの文字n-gram集合"""
+        compact = re.sub(r'\s+', '', text)
+        k = self.shingle_size
+        if len(compact) < k:
+            return {compact} if compact else set()
+        return {compact[i:i + k] for i in range(len(compact) - k + 1)}
+
+    def signature(self, text: str) -> Optional[List[int]]:
+        """MinHash署名（テキストが空ならNone）"""
+        shingles = self.shingles(text)
+        if not shingles:
+            return None
+
+        hashes = [
+            int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=4).digest(), 'big')
+            for s in shingles
+        ]
+
+        if np is not None:
+            # (a * h + b) mod p を全置換まとめて計算
+            a = np.array(self._a, dtype=np.uint64)[:, None]
+            b = np.array(self._b, dtype=np.uint64)[:, None]
+            minimum = np.full(self.num_perm, _MERSENNE_PRIME, dtype=np.uint64)
+            for start in range(0, len(hashes), _BLOCK_SIZE):
+                h = np.array(hashes[start:start + _BLOCK_SIZE], dtype=np.uint64)[None, :]
+                minimum = np.minimum(minimum, ((a * h + b) % _MERSENNE_PRIME).min(axis=1))
+            return minimum.tolist()
+
+        return [min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in zip(self._a, self._b)]
+
+    def similarity(self, sig1: List[int], sig2: List[int]) -> float:
+        """署名から推定したJaccard類似度"""
+        return sum(1 for x, y in zip(sig1, sig2) if x == y) / self.num_perm
+
+    def cluster(self, signatures: Dict[str, Optional[List[int]]],
+                rank: Optional[Callable[[str], Any]] = None) -> List[List[str]]:
+        """
+        署名をLSHでクラスタリング
+
+        候補ペアを連結した成分ごとに、rank順で先頭のキーを代表とし、代表との類似度が
+        しきい値以上のキーだけをメンバーにする（残りは同じ手順で別のクラスタに分ける）。
+        類似ペアを連鎖的につなぐと、v1→v2→v3 のように少しずつ変わったデッキが
+        互いに似ていなくても1つにまとまってしまうため
+
+        Args:
+            rank: 代表を選ぶ順序のキー（省略時は signatures の順）
+
+        Returns:
+            クラスタ（キーのリスト、先頭が代表）のリスト。署名がNoneのものは単独クラスタ
+        """
+        keys = list(signatures)
+        parent = {key: key for key in keys}
+
+        def find(key):
+            while parent[key] != key:
+                parent[key] = parent[parent[key]]
+                key = parent[key]
+            return key
+
+        buckets = {}
+        for key in keys:
+            sig = signatures[key]
+            if sig is None:
+                continue
+            for band in range(self.bands):
+                band_key = (band, tuple(sig[band * self.rows:(band + 1) * self.rows]))
+                buckets.setdefault(band_key, []).append(key)
+
+        # 同じバケットに入った候補ペアだけを検証
+        checked = set()
+        for members in buckets.values():
+            if len(members) < 2:
+                continue
+            first = members[0]
+            for other in members[1:]:
+                pair = (first, other)
+                if pair in checked or find(first) == find(other):
+                    continue
+                checked.add(pair)
+                if self.similarity(signatures[first], signatures[other]) >= self.threshold:
+                    parent[find(other)] = find(first)
+
+        components = {}
+        for key in keys:
+            components.setdefault(find(key), []).append(key)
+
+        clusters = []
+        for members in components.values():
+            if rank is not None:
+                members.sort(key=rank)
+            while members:
+                canonical, rest = members[0], members[1:]
+                aliases = [key for key in rest
+                           if self.similarity(signatures[canonical], signatures[key]) >= self.threshold]
+                clusters.append([canonical] + aliases)
+                aliased = set(aliases)
+                members = [key for key in rest if key not in aliased]
+        return clusters
+
+
+def cluster_decks(pptx_files: List[Path], guard: Optional[PptxGuard] = None,
+                  clusterer: Optional[DeckClusterer] = None, store=None) -> Dict[Path, List[Path]]:
+    """
+    .pptxファイルをバージョン違いごとにまとめる（store: TextStore 指定時は抽出結果を共有）
+
+    Returns:
+        {代表ファイル（最新の更新日時）: [別名ファイル, ...]}
+    """
+    clusterer = clusterer or DeckClusterer()
+
+    signatures = {}
+    for i, pptx_file in enumerate(pptx_files, 1):
+        try:
+            slides = pptx_extraction.read_slide_texts(str(pptx_file), guard, store=store)
+            text = "\n".join(text for texts in slides for text in texts)
+            signatures[pptx_file] = clusterer.signature(text)
+        except Exception as e:
+            # 読めないファイルは単独扱い（本処理でエラーとして記録される）
+            print(f"  WARNING: [{i}/{len(pptx_files)}] {pptx_file.name}: {e}")
+            signatures[pptx_file] = None
+
+    mtimes = {pptx_file: pptx_file.stat().st_mtime for pptx_file in signatures}
+    groups = {}
+    for members in clusterer.cluster(signatures, rank=lambda p: -mtimes[p]):
+        groups[members[0]] = members[1:]
+
+    return groups
+
+
+def main():
+    """メイン処理（クラスタ一覧を表示）"""
+    if len(sys.argv) > 1:
+        folder = sys.argv[1]
+    else:
+        folder = input("Enter folder path to scan: ").strip()
+
+    if not Path(folder).exists():
+        print(f"ERROR: Folder not found: {folder}")
+        sys.exit(1)
+
+    pptx_files = list(Path(folder).rglob("*.pptx"))
+    groups = cluster_decks(pptx_files, guard=PptxGuard())
+
+    duplicates = {canonical: aliases for canonical, aliases in groups.items() if aliases}
+    print(f"Files: {len(pptx_files)}")
+    print(f"Unique decks: {len(groups)}")
+    print(f"Version clusters: {len(duplicates)}")
+    for canonical, aliases in duplicates.items():
+        print(f"\n  ✅ {canonical.name}")
+        for alias in aliases:
+            print(f"     ↳ {alias.name}")
+
+
+if __name__ == "__main__":
+    main()
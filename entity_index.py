@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+会社名・クライアント名の名寄せインデックス
+「(株)ABC」「ABC株式会社」「ABC様」「ＡＢＣ」等の表記ゆれを正規化し、
+同じ会社に同じ整数ID（正規ID）を割り当てる。
+
+- 正規化ルール（全角/半角・法人格・敬称・記号）で完全一致を引く
+- 一致しなければ文字bigramの転置インデックスから候補を絞り込み（全件走査しない）、
+  Dice係数がしきい値以上なら同じ会社とみなす
+- 追記専用のJSONL（_entity_index.jsonl）に保存し、全出力から差分で育てる。
+  新しいIDの割り当てはロックファイルで排他するため、共有フォルダ上の複数ノードでも使える
+"""
+
+import json
+import os
+import re
+import sys
+import threading
+import time
+import unicodedata
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Any, Iterable, Optional, Tuple
+
+from output_writer import output_json_files
+
+
+# 処理対象フォルダ直下のインデックスファイル名
+INDEX_NAME = '_entity_index.jsonl'
+
+# 法人格（NFKC正規化後の表記）
+LEGAL_FORMS = re.compile(
+    r'(株式会社|有限会社|合同会社|合資会社|合名会社|'
+    r'一般社団法人|一般財団法人|公益社団法人|公益財団法人|'
+    r'\((?:株|有|同)\)|'
+    r'\b(?:co\.?,?\s*ltd\.?|inc\.?|corp\.?|corporation|k\.k\.?)(?=\W|$))',
+    re.IGNORECASE
+)
+
+# 末尾の敬称
+HONORIFICS = re.compile(r'(様|御中|殿|さま)+$')
+
+# あいまい一致を試す正規化後の最小文字数（短い名前は誤った統合が起きやすい）
+MIN_FUZZY_LENGTH = 4
+
+# 候補の絞り込みで無視する、多くの会社に出現するbigramの出現数
+MAX_POSTING_SIZE = 5000
+
+
+def display_name(name: str) -> str:
+    """表示用の名前（全角/半角を統一し、法人格・敬称を除く）"""
+    name = unicodedata.normalize('NFKC', name).strip()
+    name = HONORIFICS.sub('', name).strip()
+    name = LEGAL_FORMS.sub(' ', name)
+    return re.sub(r'\s+', ' ', name).strip(' ・,.【】「」[]')
+
+
+def normalize_name(name: str) -> str:
+    """照合用のキー（表示用の名前から空白・記号を除いて小文字化）"""
+    return re.sub(r'[\W_]+', '', display_name(name)).casefold()
+
+
+def _bigrams(key: str) -> set:
+    """文字bigramの集合（1文字のキーはその文字）"""
+    if len(key) < 2:
+        return {key}
+    return {key[i:i + 2] for i in range(len(key) - 1)}
+
+
+class EntityIndex:
+    """名寄せインデックス"""
+
+    def __init__(self, path, fuzzy_threshold: float = 0.8, lock_timeout_sec: int = 30):
+        """
+        初期化
+
+        Args:
+            path: インデックスファイル（.jsonl）のパス（無ければ新規作成）
+            fuzzy_threshold: 同じ会社とみなすDice係数の下限
+            lock_timeout_sec: ロックファイルをこの秒数より古ければ残骸とみなす
+        """
+        self.path = Path(path)
+        self.lock_path = self.path.with_suffix('.lock')
+        self.fuzzy_threshold = fuzzy_threshold
+        self.lock_timeout_sec = lock_timeout_sec
+
+        self.entities = {}      # ID → {'id', 'name', 'key', 'aliases'}
+        self._keys = {}         # 正規化キー → ID
+        self._aliases = {}      # 元の表記 → ID（解決結果のキャッシュ）
+        self._postings = {}     # bigram → IDの集合
+        self._gram_counts = {}  # ID → bigramの数
+        self._offset = 0
+        self._lock = threading.Lock()
+
+        self._refresh()
+
+    def _apply(self, record: Dict[str, Any]):
+        """ファイルの1行を反映"""
+        entity_id = record.get('id')
+        if 'key' in record:
+            entity = {'id': entity_id, 'name': record['name'], 'key': record['key'], 'aliases': []}
+            self.entities[entity_id] = entity
+            self._keys.setdefault(record['key'], entity_id)
+            grams = _bigrams(record['key'])
+            self._gram_counts[entity_id] = len(grams)
+            for gram in grams:
+                self._postings.setdefault(gram, set()).add(entity_id)
+        elif 'alias' in record and entity_id in self.entities:
+            self.entities[entity_id]['aliases'].append(record['alias'])
+            self._aliases.setdefault(record['alias'], entity_id)
+
+    def _refresh(self):
+        """前回読み込んだ位置以降の追記（他ノードの割り当て）を反映"""
+        if not self.path.exists():
+            return
+        with open(self.path, 'rb') as f:
+            f.seek(self._offset)
+            data = f.read()
+        # 書き込み途中の最終行は次回に回す
+        end = data.rfind(b'\n') + 1
+        for line in data[:end].splitlines():
+            try:
+                self._apply(json.loads(line))
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                continue
+        self._offset += end
+
+    def _append(self, records: List[Dict[str, Any]]):
+        """記録を追記して反映"""
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._refresh()
+
+    def _acquire_file_lock(self):
+        """新しいIDの割り当て用のロックファイルを排他作成（古い残骸は削除）"""
+        while True:
+            try:
+                os.close(os.open(self.lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return
+            except FileExistsError:
+                try:
+                    if time.time() - self.lock_path.stat().st_mtime > self.lock_timeout_sec:
+                        os.remove(self.lock_path)
+                        continue
+                except FileNotFoundError:
+                    continue
+                time.sleep(0.05)
+
+    def _release_file_lock(self):
+        try:
+            os.remove(self.lock_path)
+        except FileNotFoundError:
+            pass
+
+    def candidates(self, key: str, limit: int = 5) -> List[Tuple[int, float]]:
+        """あいまい一致の候補（ID, Dice係数）を係数の高い順に"""
+        grams = _bigrams(key)
+        shared = Counter()
+        for gram in grams:
+            posting = self._postings.get(gram, ())
+            if len(posting) <= MAX_POSTING_SIZE:
+                shared.update(posting)
+
+        scored = []
+        for entity_id, count in shared.items():
+            scored.append((entity_id, 2 * count / (len(grams) + self._gram_counts[entity_id])))
+        scored.sort(key=lambda item: (-item[1], item[0]))
+        return scored[:limit]
+
+    def _match(self, key: str) -> Optional[int]:
+        """正規化キーに対応する既存のID（完全一致 → あいまい一致）"""
+        if key in self._keys:
+            return self._keys[key]
+        if len(key) >= MIN_FUZZY_LENGTH:
+            for entity_id, score in self.candidates(key, limit=1):
+                if score >= self.fuzzy_threshold:
+                    return entity_id
+        return None
+
+    def resolve(self, name: Optional[str], create: bool = True) -> Optional[int]:
+        """
+        名前を正規IDに解決
+
+        Args:
+            create: 未知の名前なら新しいIDを割り当てる（Falseなら None を返し、ファイルに書き込まない）
+
+        Returns:
+            正規ID（空の名前・記号だけの名前は None）
+        """
+        if not isinstance(name, str) or not name.strip():
+            return None
+
+        with self._lock:
+            if name in self._aliases:
+                return self._aliases[name]
+
+            key = normalize_name(name)
+            if not key:
+                return None
+
+            entity_id = self._match(key)
+            if not create:
+                # 参照のみ（ファイルには書き込まない）
+                return entity_id
+
+            self._acquire_file_lock()
+            try:
+                # ロック取得までに他ノードが割り当てた分を反映してから判定
+                self._refresh()
+                if name in self._aliases:
+                    return self._aliases[name]
+                entity_id = self._match(key)
+                records = []
+                if entity_id is None:
+                    entity_id = max(self.entities, default=0) + 1
+                    records.append({'id': entity_id, 'name': display_name(name), 'key': key})
+                records.append({'id': entity_id, 'alias': name})
+                self._append(records)
+            finally:
+                self._release_file_lock()
+            return entity_id
+
+    def resolve_all(self, names: Iterable[str], create: bool = True) -> List[int]:
+        """複数の名前を正規IDに解決（重複・解決できないものは除く、出現順）"""
+        ids = []
+        for name in names or []:
+            entity_id = self.resolve(name, create)
+            if entity_id is not None and entity_id not in ids:
+                ids.append(entity_id)
+        return ids
+
+    def name(self, entity_id: Optional[int]) -> Optional[str]:
+        """正規IDの表示名"""
+        entity = self.entities.get(entity_id)
+        return entity['name'] if entity else None
+
+    def lookup(self, name: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """名前の検索（完全一致と、あいまい一致の候補）"""
+        key = normalize_name(name)
+        results = []
+        if key in self._keys:
+            results.append((self._keys[key], 1.0))
+        results.extend(item for item in self.candidates(key, limit) if item[0] not in dict(results))
+        return [
+            {'id': entity_id, 'name': self.entities[entity_id]['name'], 'score': round(score, 3),
+             'aliases': self.entities[entity_id]['aliases']}
+            for entity_id, score in results[:limit]
+        ]
+
+
+def index_path(folder_path: str) -> Path:
+    """フォルダのインデックスファイルのパス"""
+    return Path(folder_path) / INDEX_NAME
+
+
+def open_index(folder_path: str) -> EntityIndex:
+    """フォルダのインデックスを開く（無ければ新規作成）"""
+    return EntityIndex(index_path(folder_path))
+
+
+def output_names(data: Dict[str, Any]) -> List[str]:
+    """出力JSON（Gemini版・正規表現版）に含まれる会社名・クライアント名"""
+    if 'gemini_analysis' in data:
+        analysis = data['gemini_analysis'] or {}
+        return [analysis.get('client_name')] + list(analysis.get('partner_companies') or [])
+    summary = data.get('summary', {})
+    return list(summary.get('all_clients') or []) + list(summary.get('all_companies') or [])
+
+
+def build_from_outputs(folder_path: str, index: Optional[EntityIndex] = None) -> Dict[str, int]:
+    """フォルダ内の全出力JSONの名前をインデックスに追加（既知の名前は何もしない）"""
+    index = index or open_index(folder_path)
+    before = len(index.entities)
+    names = 0
+    for json_path in output_json_files(folder_path):
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception:
+            continue
+        if not isinstance(data, dict) or 'error' in data:
+            continue
+        for name in output_names(data):
+            names += index.resolve(name) is not None
+    return {'names': names, 'entities': len(index.entities), 'added': len(index.entities) - before}
+
+
+def main():
+    """メイン処理（build: 全出力から作成 / lookup: 名前を検索 / list: 一覧）"""
+    if len(sys.argv) < 3 or sys.argv[1] not in ('build', 'lookup', 'list'):
+        print("Usage: python entity_index.py build <folder>")
+        print("       python entity_index.py lookup <folder> <name>")
+        print("       python entity_index.py list <folder>")
+        sys.exit(1)
+
+    command, folder = sys.argv[1], sys.argv[2]
+    if not Path(folder).exists():
+        print(f"ERROR: Folder not found: {folder}")
+        sys.exit(1)
+
+    index = open_index(folder)
+    if command == 'build':
+        stats = build_from_outputs(folder, index)
+        print(f"Resolved {stats['names']} names: {stats['entities']} entities ({stats['added']} added)")
+        print(f"Index saved to: {index.path}")
+    elif command == 'lookup':
+        if len(sys.argv) < 4:
+            print("ERROR: name is required")
+            sys.exit(1)
+        for match in index.lookup(sys.argv[3]):
+            print(f"  [{match['id']}] {match['name']} (score {match['score']}, "
+                  f"aliases: {', '.join(match['aliases'][:5])})")
+    else:
+        for entity in sorted(index.entities.values(), key=lambda e: e['id']):
+            print(f"  [{entity['id']}] {entity['name']} ({len(entity['aliases'])} aliases)")
+
+
+if __name__ == "__main__":
+    main()
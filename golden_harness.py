@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+正解データ（ゴールデンコーパス）による精度・速度の回帰チェック
+ラベル付きのデッキ（または抽出済みテキスト）に対して抽出処理を並列に実行し、
+項目ごとの適合率・再現率と、スループット・レイテンシのパーセンタイルを表示する。
+前回保存した基準値より精度・速度が一定以上悪化したら終了コード1で失敗する。
+
+コーパスのフォルダに golden.jsonl を置き、1行に1件:
+  {"id": "case1", "deck": "提案書.pptx",
+   "expected": {"client": "ABC", "dates": ["2024/05/01"], "prices": [1200], "deadlines": ["5月10日"]}}
+  {"id": "case2", "texts": [["1枚目のテキスト", "..."], ["2枚目"]], "expected": {...},
+   "stub_response": "{\"client_name\": \"ABC\", ...}"}
+
+- deck: コーパスのフォルダからの相対パス（texts: スライドごとのテキストブロック）
+- expected: 採点する項目だけ書く（client / dates / prices / deadlines）
+- stub_response: stub バックエンドで返すLLMの応答（記録した応答でLLM後処理を検証する）
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Any, Optional, Set
+
+import pptx_extraction
+from entity_index import normalize_name
+from llm_backends import BACKENDS, StubBackend
+from output_writer import dumps
+
+# tables: 表の列名による解決のみ / regex: 正規表現版 / それ以外: LLMバックエンド
+EXTRACTORS = ['regex', 'tables'] + sorted(BACKENDS)
+
+# 採点する項目
+FIELDS = ('client', 'dates', 'prices', 'deadlines')
+
+# 正解データのファイル名・基準値の履歴（コーパスのフォルダ直下）
+GOLDEN_NAME = 'golden.jsonl'
+BASELINE_NAME = '_golden_baseline.jsonl'
+
+_DATE = re.compile(r'(?:(\d{4})\s*[年/\-.]\s*)?(\d{1,2})\s*[月/\-.]\s*(\d{1,2})')
+
+
+def normalize_value(field: str, value) -> Optional[str]:
+    """比較用に値を正規化（表記ゆれで不一致にしない）"""
+    if value is None or value == '':
+        return None
+    if field == 'client':
+        return normalize_name(str(value)) or None
+    if field == 'prices':
+        number = value if isinstance(value, (int, float)) else pptx_extraction.parse_cell(str(value))
+        if isinstance(number, (int, float)):
+            return str(int(number))
+        return None
+    text = unicodedata.normalize('NFKC', str(value)).strip()
+    match = _DATE.search(text)
+    if match:
+        year, month, day = match.groups()
+        return f"{year + '-' if year else ''}{int(month):02d}-{int(day):02d}"
+    return re.sub(r'\s+', '', text)
+
+
+def normalize_values(field: str, values) -> Set[str]:
+    """値（単一またはリスト）を正規化した集合"""
+    if not isinstance(values, (list, tuple, set)):
+        values = [values]
+    return {normalized for normalized in (normalize_value(field, value) for value in values) if normalized}
+
+
+def load_corpus(corpus_dir: Path) -> List[Dict[str, Any]]:
+    """golden.jsonl を読み込み"""
+    items = []
+    with open(corpus_dir / GOLDEN_NAME, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            item.setdefault('id', item.get('deck') or f"line{line_number}")
+            if item.get('deck'):
+                item['deck'] = str(corpus_dir / item['deck'])
+            items.append(item)
+    return items
+
+
+def _slide_contents(item: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """デッキまたはテキストからスライドごとの内容（read_slide_content と同じ形式）"""
+    if item.get('deck'):
+        return pptx_extraction.read_slide_content(item['deck'])
+    return [{'texts': texts, 'body_texts': texts, 'tables': []} for texts in item.get('texts', [])]
+
+
+def _predict_regex(item: Dict[str, Any]) -> Dict[str, Any]:
+    from powerpoint_processor import PowerPointProcessor
+    processor = PowerPointProcessor()
+    predicted = {field: [] for field in FIELDS}
+    for content in _slide_contents(item):
+        info = processor.analyze_slide(content)
+        predicted['client'].extend(info['clients'])
+        predicted['dates'].extend(info['dates'])
+        predicted['prices'].extend(info['prices'])
+        predicted['deadlines'].extend(info['deadlines'])
+    return predicted
+
+
+def _predict_tables(item: Dict[str, Any]) -> Dict[str, Any]:
+    from table_resolver import resolve_tables
+    fields = resolve_tables([table for content in _slide_contents(item) for table in content['tables']])
+    return {'client': [], 'dates': [], 'prices': [fields['unit_price']], 'deadlines': [fields['deadline']]}
+
+
+def _predict_llm(item: Dict[str, Any], backend: str, usage_log_path: str) -> Dict[str, Any]:
+    from powerpoint_processor_gemini import GeminiPowerPointProcessor
+    if backend == 'stub':
+        # 記録した応答があればそれを返す（無ければ全項目null）
+        backend = StubBackend([item['stub_response']] if item.get('stub_response') else None)
+    processor = GeminiPowerPointProcessor(backend=backend, usage_log_path=usage_log_path)
+
+    if item.get('deck'):
+        result = processor.process_powerpoint(item['deck'])
+        if 'error' in result:
+            raise RuntimeError(result['error'])
+        analysis = result['gemini_analysis']
+    else:
+        texts = [text for slide in item.get('texts', []) for text in slide]
+        analysis = processor.analyze_with_gemini(texts, f"{item['id']}.pptx")
+    if analysis.get('error'):
+        raise RuntimeError(analysis['error'])
+    return {
+        'client': [analysis.get('client_name')],
+        'dates': [analysis.get('event_date')],
+        'prices': [analysis.get('unit_price')],
+        'deadlines': [analysis.get('deadline')],
+    }
+
+
+def run_item(item: Dict[str, Any], extractor: str, usage_log_path: str) -> Dict[str, Any]:
+    """1件を実行して予測値と処理時間を返す（ワーカーで実行）"""
+    started = time.perf_counter()
+    try:
+        if extractor == 'regex':
+            predicted = _predict_regex(item)
+        elif extractor == 'tables':
+            predicted = _predict_tables(item)
+        else:
+            predicted = _predict_llm(item, extractor, usage_log_path)
+        error = None
+    except Exception as e:
+        predicted, error = {}, str(e)
+    return {'id': item['id'], 'predicted': predicted, 'error': error,
+            'latency_ms': (time.perf_counter() - started) * 1000}
+
+
+def score(items: List[Dict[str, Any]], outputs: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """項目ごとの適合率・再現率（全件の一致数を合算するマイクロ平均）"""
+    counts = {field: {'tp': 0, 'fp': 0, 'fn': 0} for field in FIELDS}
+    for item, output in zip(items, outputs):
+        expected = item.get('expected', {})
+        for field in FIELDS:
+            if field not in expected:
+                continue
+            truth = normalize_values(field, expected[field])
+            predicted = normalize_values(field, output['predicted'].get(field, []))
+            counts[field]['tp'] += len(truth & predicted)
+            counts[field]['fp'] += len(predicted - truth)
+            counts[field]['fn'] += len(truth - predicted)
+
+    fields = {}
+    for field, count in counts.items():
+        if not any(count.values()):
+            continue
+        predicted_total = count['tp'] + count['fp']
+        truth_total = count['tp'] + count['fn']
+        fields[field] = dict(
+            count,
+            precision=round(count['tp'] / predicted_total, 4) if predicted_total else 1.0,
+            recall=round(count['tp'] / truth_total, 4) if truth_total else 1.0,
+        )
+    return fields
+
+
+def percentile(values: List[float], p: float) -> float:
+    """パーセンタイル（線形補間）"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * p / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def run_harness(corpus_dir: str, extractor: str = 'regex', workers: int = 4,
+                repeat: int = 1) -> Dict[str, Any]:
+    """
+    コーパス全件を並列に実行して精度・速度を集計
+
+    Args:
+        extractor: regex / tables / LLMバックエンド名
+        workers: 並列数（regex / tables はプロセス、LLMはスレッド）
+        repeat: 速度の測定を安定させるための繰り返し回数（精度は1回目で採点）
+    """
+    corpus_dir = Path(corpus_dir)
+    items = load_corpus(corpus_dir)
+
+    # 正規表現・表の解決はCPU処理なのでプロセス、LLMは待ち時間が大半なのでスレッドで並列化
+    executor_class = ProcessPoolExecutor if extractor in ('regex', 'tables') else ThreadPoolExecutor
+
+    latencies = []
+    outputs = None
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # 使用状況は一時ファイルに記録（実際の無料枠の集計を汚さない）
+        usage_log_path = os.path.join(temp_dir, 'golden_usage.json')
+        started = time.perf_counter()
+        with executor_class(max_workers=workers) as executor:
+            for _ in range(repeat):
+                run = list(executor.map(run_item, items, [extractor] * len(items),
+                                        [usage_log_path] * len(items)))
+                outputs = outputs or run
+                latencies.extend(output['latency_ms'] for output in run)
+        elapsed = time.perf_counter() - started
+
+    return {
+        'extractor': extractor,
+        'items': len(items),
+        'errors': [{'id': output['id'], 'error': output['error']} for output in outputs if output['error']],
+        'fields': score(items, outputs),
+        'speed': {
+            'throughput_per_sec': round(len(items) * repeat / elapsed, 2) if elapsed else 0.0,
+            'p50_ms': round(percentile(latencies, 50), 2),
+            'p95_ms': round(percentile(latencies, 95), 2),
+            'p99_ms': round(percentile(latencies, 99), 2),
+        },
+        'recorded_at': datetime.now().isoformat(),
+    }
+
+
+def load_baseline(corpus_dir: str, extractor: str) -> Optional[Dict[str, Any]]:
+    """基準値の履歴から、抽出処理ごとの最新の記録"""
+    path = Path(corpus_dir) / BASELINE_NAME
+    if not path.exists():
+        return None
+    baseline = None
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get('extractor') == extractor:
+                baseline = record
+    return baseline
+
+
+def save_baseline(corpus_dir: str, report: Dict[str, Any]):
+    """基準値の履歴に追記"""
+    with open(Path(corpus_dir) / BASELINE_NAME, 'a', encoding='utf-8') as f:
+        f.write(dumps(report, deterministic=True, indent=False) + "\n")
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], max_accuracy_drop: float = 0.02,
+            max_slowdown: float = 0.2) -> List[str]:
+    """
+    基準値と比較して回帰の一覧を返す（空なら合格）
+
+    Args:
+        max_accuracy_drop: 許容する適合率・再現率の低下（絶対値、0.02 = 2ポイント）
+        max_slowdown: 許容するスループット低下・p95レイテンシ増加の割合（0.2 = 20%）
+    """
+    regressions = []
+    for field, stats in baseline.get('fields', {}).items():
+        current = report['fields'].get(field)
+        for metric in ('precision', 'recall'):
+            now = current[metric] if current else 0.0
+            if stats[metric] - now > max_accuracy_drop:
+                regressions.append(f"{field} {metric}: {stats[metric]:.3f} -> {now:.3f}")
+
+    before, now = baseline.get('speed', {}), report['speed']
+    if before.get('throughput_per_sec') and \
+            now['throughput_per_sec'] < before['throughput_per_sec'] * (1 - max_slowdown):
+        regressions.append(f"throughput: {before['throughput_per_sec']}/s -> {now['throughput_per_sec']}/s")
+    if before.get('p95_ms') and now['p95_ms'] > before['p95_ms'] * (1 + max_slowdown):
+        regressions.append(f"p95 latency: {before['p95_ms']}ms -> {now['p95_ms']}ms")
+    return regressions
+
+
+def print_report(report: Dict[str, Any]):
+    """結果を表示"""
+    print(f"Extractor: {report['extractor']} ({report['items']} items, {len(report['errors'])} errors)")
+    print(f"  {'field':<10} {'precision':>9} {'recall':>7} {'tp':>5} {'fp':>5} {'fn':>5}")
+    for field, stats in report['fields'].items():
+        print(f"  {field:<10} {stats['precision']:>9.3f} {stats['recall']:>7.3f} "
+              f"{stats['tp']:>5} {stats['fp']:>5} {stats['fn']:>5}")
+    speed = report['speed']
+    print(f"  throughput: {speed['throughput_per_sec']}/s  "
+          f"latency p50 {speed['p50_ms']}ms / p95 {speed['p95_ms']}ms / p99 {speed['p99_ms']}ms")
+    for error in report['errors'][:10]:
+        print(f"  ERROR {error['id']}: {error['error']}")
+
+
+def main():
+    """メイン処理"""
+    parser = argparse.ArgumentParser(description="ゴールデンコーパスによる精度・速度の回帰チェック")
+    parser.add_argument('corpus', help=f"{GOLDEN_NAME} を置いたフォルダ")
+    parser.add_argument('--extractor', choices=EXTRACTORS, default='regex',
+                        help="評価する抽出処理（regex / tables / LLMバックエンド、既定: regex）")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 4, help="並列数（既定: CPU数）")
+    parser.add_argument('--repeat', type=int, default=1, help="速度測定の繰り返し回数（既定: 1）")
+    parser.add_argument('--save-baseline', action='store_true',
+                        help=f"回帰が無ければ今回の結果を基準値として {BASELINE_NAME} に追記する")
+    parser.add_argument('--force', action='store_true',
+                        help="--save-baseline で回帰があっても追記する（意図した精度・速度の変化を受け入れる）")
+    parser.add_argument('--max-accuracy-drop', type=float, default=0.02,
+                        help="許容する適合率・再現率の低下（既定: 0.02）")
+    parser.add_argument('--max-slowdown', type=float, default=0.2,
+                        help="許容するスループット低下・p95レイテンシ増加の割合（既定: 0.2）")
+    args = parser.parse_args()
+
+    if not (Path(args.corpus) / GOLDEN_NAME).exists():
+        print(f"ERROR: {GOLDEN_NAME} not found in: {args.corpus}")
+        sys.exit(1)
+
+    report = run_harness(args.corpus, args.extractor, max(1, args.workers), max(1, args.repeat))
+    print_report(report)
+
+    baseline = load_baseline(args.corpus, args.extractor)
+    regressions = compare(report, baseline, args.max_accuracy_drop, args.max_slowdown) if baseline else []
+
+    # 回帰した結果を基準値にすると、以降の比較で回帰が見逃される
+    if args.save_baseline and (not regressions or args.force):
+        save_baseline(args.corpus, report)
+        print(f"Baseline saved to: {Path(args.corpus) / BASELINE_NAME}")
+    elif args.save_baseline:
+        print("Baseline not saved because of regressions (use --force to accept them)")
+
+    if baseline is None:
+        if not args.save_baseline:
+            print("No baseline yet (run with --save-baseline to record one)")
+    elif regressions:
+        print("REGRESSION:")
+        for regression in regressions:
+            print(f"  - {regression}")
+        sys.exit(1)
+    else:
+        print(f"OK: within thresholds of the baseline recorded at {baseline.get('recorded_at', '?')}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分析に使うLLMバックエンド
+Gemini API（従量・無料枠あり）、ローカルのHTTPモデルサーバー
+（Ollama / llama.cpp のOpenAI互換API）、テスト用の決定的なスタブを
+同じインターフェースで呼び出せるようにする
+"""
+
+import json
+import os
+import urllib.error
+import urllib.request
+from typing import Dict, Any, List, Optional, Tuple
+
+
+class LLMBackend:
+    """バックエンドの共通インターフェース"""
+
+    # 無料枠・RPMの管理対象（従量課金のバックエンドのみTrue）
+    metered = False
+
+    name = 'base'
+
+    def generate(self, prompt: str, schema: Dict[str, Any]) -> Tuple[str, Dict[str, int]]:
+        """
+        プロンプトを送信してJSON文字列を受け取る
+
+        Args:
+            prompt: プロンプト
+            schema: 期待するJSONのレスポンススキーマ
+
+        Returns:
+            (レスポンスのテキスト, 実トークン数 {prompt_tokens, output_tokens}（不明なら空）)
+        """
+        raise NotImplementedError
+
+    def describe(self) -> str:
+        """起動時の表示用の説明"""
+        return self.name
+
+
+class GeminiBackend(LLMBackend):
+    """Gemini API（無料枠の使用量を記録する）"""
+
+    metered = True
+
+    name = 'gemini'
+
+    def __init__(self, api_key: Optional[str] = None, model_name: str = 'gemini-2.0-flash-lite'):
+        """
+        初期化
+
+        Args:
+            api_key: Gemini APIキー（省略時は環境変数から取得）
+            model_name: モデル名（無料版推奨: Flash-Lite）
+        """
+        self.api_key = api_key or os.environ.get('GEMINI_API_KEY')
+        if not self.api_key:
+            raise ValueError(
+                "Gemini API key is required. "
+                "Set GEMINI_API_KEY environment variable or pass api_key parameter."
+            )
+
+        # google-generativeaiはここで初めてimport
+        try:
+            import google.generativeai as genai
+        except ImportError:
+            raise ImportError(
+                "google-generativeai is not installed. "
+                "Please install it with: pip install google-generativeai"
+            )
+        genai.configure(api_key=self.api_key)
+        self.model_name = model_name
+        self.model = genai.GenerativeModel(model_name)
+
+    def generate(self, prompt: str, schema: Dict[str, Any]) -> Tuple[str, Dict[str, int]]:
+        # JSONモード + レスポンススキーマで出力形式を制約
+        response = self.model.generate_content(prompt, generation_config={
+            'response_mime_type': 'application/json',
+            'response_schema': schema,
+        })
+
+        tokens = {}
+        metadata = getattr(response, 'usage_metadata', None)
+        if metadata is not None:
+            tokens['prompt_tokens'] = getattr(metadata, 'prompt_token_count', None)
+            tokens['output_tokens'] = getattr(metadata, 'candidates_token_count', None)
+        return response.text, {k: v for k, v in tokens.items() if v is not None}
+
+    def describe(self) -> str:
+        return f"{self.name} ({self.model_name})"
+
+
+class LocalHTTPBackend(LLMBackend):
+    """ローカルのモデルサーバー（OpenAI互換の /chat/completions）"""
+
+    name = 'local'
+
+    def __init__(self, base_url: Optional[str] = None, model_name: Optional[str] = None,
+                 timeout_sec: int = 300):
+        """
+        初期化
+
+        Args:
+            base_url: APIのベースURL（省略時は環境変数 LOCAL_LLM_URL、既定はOllama）
+            model_name: モデル名（省略時は環境変数 LOCAL_LLM_MODEL）
+            timeout_sec: 1リクエストのタイムアウト
+        """
+        self.base_url = (base_url or os.environ.get('LOCAL_LLM_URL')
+                         or 'http://localhost:11434/v1').rstrip('/')
+        self.model_name = model_name or os.environ.get('LOCAL_LLM_MODEL') or 'llama3.1'
+        self.timeout_sec = timeout_sec
+
+    def generate(self, prompt: str, schema: Dict[str, Any]) -> Tuple[str, Dict[str, int]]:
+        # スキーマ指定の対応はサーバーにより異なるため、JSONモードのみ指定し
+        # 項目はプロンプトで指示する
+        payload = {
+            'model': self.model_name,
+            'messages': [{'role': 'user', 'content': prompt}],
+            'temperature': 0,
+            'response_format': {'type': 'json_object'},
+        }
+        request = urllib.request.Request(
+            f"{self.base_url}/chat/completions",
+            data=json.dumps(payload).encode('utf-8'),
+            headers={'Content-Type': 'application/json'},
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout_sec) as response:
+                body = json.loads(response.read().decode('utf-8'))
+        except urllib.error.URLError as e:
+            raise RuntimeError(f"Local model server unavailable ({self.base_url}): {e}")
+
+        usage = body.get('usage') or {}
+        tokens = {'prompt_tokens': usage.get('prompt_tokens'), 'output_tokens': usage.get('completion_tokens')}
+        return body['choices'][0]['message']['content'], {k: v for k, v in tokens.items() if v is not None}
+
+    def describe(self) -> str:
+        return f"{self.name} ({self.model_name} @ {self.base_url})"
+
+
+class StubBackend(LLMBackend):
+    """テスト用の決定的なバックエンド（APIを呼ばない）"""
+
+    name = 'stub'
+
+    def __init__(self, responses: Optional[List[str]] = None):
+        """
+        初期化
+
+        Args:
+            responses: 順番に返すレスポンス（使い切った後・省略時は全項目nullのJSON）
+        """
+        self.responses = list(responses or [])
+        self.prompts = []
+
+    def generate(self, prompt: str, schema: Dict[str, Any]) -> Tuple[str, Dict[str, int]]:
+        self.prompts.append(prompt)
+        if self.responses:
+            return self.responses.pop(0), {}
+
+        empty = {
+            field: [] if spec.get('type') == 'array' else None
+            for field, spec in schema.get('properties', {}).items()
+        }
+        return json.dumps(empty, ensure_ascii=False), {}
+
+
+def estimate_tokens(text: str) -> int:
+    """トークン数の概算（日本語は約1文字1トークン、英数字は約4文字1トークン）"""
+    ascii_chars = sum(1 for c in text if ord(c) < 128)
+    return (len(text) - ascii_chars) + (ascii_chars + 3) // 4
+
+
+BACKENDS = {
+    'gemini': GeminiBackend,
+    'local': LocalHTTPBackend,
+    'stub': StubBackend,
+}
+
+
+def create_backend(name: str, api_key: Optional[str] = None) -> LLMBackend:
+    """名前からバックエンドを作成"""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown LLM backend: {name} (choose from {', '.join(BACKENDS)})")
+    if name == 'gemini':
+        return GeminiBackend(api_key=api_key)
+    return BACKENDS[name]()
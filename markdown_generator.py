@@ -5,20 +5,25 @@ NotebookLM用Markdown生成スクリプト
 PowerPointファイルをGemini APIで分析してMarkdown形式で出力
 """
 
-import json
 import os
 from pathlib import Path
 from datetime import datetime
 from powerpoint_processor_gemini import GeminiPowerPointProcessor
+from pptx_guard import PptxGuard
+import pptx_extraction
+from output_writer import write_json_output, write_text_if_changed
 
 
-def generate_markdown_from_json(json_data: dict, output_path: str = None) -> str:
+def generate_markdown_from_json(json_data: dict, output_path: str = None,
+                                deterministic: bool = False) -> str:
     """
     JSONデータからNotebookLM用のMarkdownを生成
 
     Args:
         json_data: PowerPoint処理結果のJSONデータ
         output_path: 出力先パス（省略時は標準出力）
+        deterministic: Trueならフッターに現在時刻ではなく処理日時を記載し、
+                       内容が変わらなければファイルを書き換えない
 
     Returns:
         生成されたMarkdownテキスト
@@ -44,6 +49,12 @@ def generate_markdown_from_json(json_data: dict, output_path: str = None) -> str
     md_lines.append(f"# {title}\n")
     md_lines.append(f"**元ファイル**: `{file_name}`  ")
     md_lines.append(f"**処理日時**: {file_info.get('processed_at', '')}  ")
+    properties = file_info.get('doc_properties') or {}
+    if properties.get('author'):
+        md_lines.append(f"**作成者**: {properties['author']}  ")
+    if properties.get('modified'):
+        md_lines.append(f"**最終更新**: {properties['modified'][:10]}"
+                        f"{'（' + properties['last_modified_by'] + '）' if properties.get('last_modified_by') else ''}  ")
     md_lines.append(f"**信頼度スコア**: {analysis.get('confidence_score', 0)}%\n")
     md_lines.append("---\n")
 
@@ -123,6 +134,14 @@ def generate_markdown_from_json(json_data: dict, output_path: str = None) -> str
         tags = " ".join([f"`#{kw}`" for kw in keywords if kw])
         md_lines.append(f"{tags}\n")
 
+    # 別バージョン（内容がほぼ同一のため分析を省略したファイル）
+    aliases = file_info.get('aliases', [])
+    if aliases:
+        md_lines.append("## 🗂️ 同一内容の別バージョン\n")
+        for alias in aliases:
+            md_lines.append(f"- `{alias}`")
+        md_lines.append("")
+
     # スライドテキストサンプル
     slide_sample = json_data.get('slide_texts_sample', '')
     if slide_sample:
@@ -133,13 +152,22 @@ def generate_markdown_from_json(json_data: dict, output_path: str = None) -> str
 
     # フッター
     md_lines.append("---")
-    md_lines.append(f"\n*Generated by Gemini API v4.0 - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}*")
+    if deterministic:
+        generated_at = file_info.get('processed_at', '')[:19].replace('T', ' ')
+    else:
+        generated_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    md_lines.append(f"\n*Generated by Gemini API v4.0 - {generated_at}*")
 
     # Markdown文字列を生成
     markdown_text = "\n".join(md_lines)
 
     # ファイル出力
-    if output_path:
+    if output_path and deterministic:
+        if write_text_if_changed(output_path, markdown_text):
+            print(f"✅ Markdown生成完了: {output_path}")
+        else:
+            print(f"✅ Markdown変更なし（書き込み省略）: {output_path}")
+    elif output_path:
         with open(output_path, 'w', encoding='utf-8') as f:
             f.write(markdown_text)
         print(f"✅ Markdown生成完了: {output_path}")
@@ -147,13 +175,28 @@ def generate_markdown_from_json(json_data: dict, output_path: str = None) -> str
     return markdown_text
 
 
-def process_powerpoint_to_markdown(pptx_path: str, api_key: str = None):
+def process_powerpoint_to_markdown(pptx_path: str, api_key: str = None,
+                                   guard: PptxGuard = None,
+                                   processor_options: dict = None,
+                                   aliases: list = None,
+                                   deterministic: bool = False,
+                                   json_path: str = None, md_path: str = None,
+                                   source_path: str = None) -> dict:
     """
     PowerPointファイルを処理してMarkdownを生成
 
     Args:
         pptx_path: PowerPointファイルのパス
         api_key: Gemini APIキー
+        guard: 読み込みガード（省略時はガードなし）
+        processor_options: GeminiPowerPointProcessor への追加オプション（chunk_mode等）
+        aliases: 同一内容の別バージョンのファイル名（出力に記録）
+        deterministic: 内容が変わらなければJSON・Markdownを書き換えない（同期の再アップロード防止）
+        json_path / md_path: 出力先（省略時は.pptxと同じ場所）
+        source_path: 元のファイルのパス（先読みしたローカルのコピーを処理する場合）
+
+    Returns:
+        処理結果（初期化失敗時はNone。'unchanged' は両方の書き込みを省略したらTrue）
     """
     print(f"\n{'='*60}")
     print(f"PowerPoint → Markdown 変換（NotebookLM用）")
@@ -161,30 +204,40 @@ def process_powerpoint_to_markdown(pptx_path: str, api_key: str = None):
 
     # プロセッサー初期化
     try:
-        processor = GeminiPowerPointProcessor(api_key=api_key)
+        processor = GeminiPowerPointProcessor(api_key=api_key, guard=guard, **(processor_options or {}))
     except Exception as e:
         print(f"ERROR: {e}")
-        return
+        return None
 
     # PowerPoint処理
     pptx_file = Path(pptx_path)
     print(f"📄 Processing: {pptx_file.name}")
 
-    result = processor.process_powerpoint(str(pptx_file))
+    # 前回のJSONがあれば重要な変更が無い限りGemini分析を再利用
+    json_path = Path(json_path) if json_path else pptx_file.with_suffix('.json')
+    previous = pptx_extraction.load_previous_result(json_path)
+    result = processor.process_powerpoint(str(pptx_file), previous=previous, source_path=source_path)
 
     if 'error' in result:
         print(f"❌ ERROR: {result['error']}")
-        return
+        return result
+
+    if aliases:
+        result['file_info']['aliases'] = list(aliases)
 
-    # JSON保存（オプション）
-    json_path = pptx_file.with_suffix('.json')
-    with open(json_path, 'w', encoding='utf-8') as f:
-        json.dump(result, f, ensure_ascii=False, indent=2)
-    print(f"✅ JSON保存: {json_path.name}")
+    # JSON保存（決定的モードでは内容が同じなら書き込まず、前回の処理日時のまま）
+    result, json_written = write_json_output(json_path, result, deterministic)
+    print(f"✅ JSON保存: {json_path.name}" if json_written else f"✅ JSON変更なし: {json_path.name}")
 
     # Markdown生成
-    md_path = pptx_file.with_suffix('.md')
-    markdown_text = generate_markdown_from_json(result, str(md_path))
+    md_path = Path(md_path) if md_path else pptx_file.with_suffix('.md')
+    if deterministic:
+        markdown_text = generate_markdown_from_json(result, deterministic=True)
+        md_written = write_text_if_changed(md_path, markdown_text)
+        print(f"✅ Markdown生成完了: {md_path}" if md_written else f"✅ Markdown変更なし: {md_path.name}")
+    else:
+        markdown_text = generate_markdown_from_json(result, str(md_path))
+        md_written = True
 
     # 結果表示
     print(f"\n{'='*60}")
@@ -200,6 +253,8 @@ def process_powerpoint_to_markdown(pptx_path: str, api_key: str = None):
     print(f"   3. '{md_path.name}' をアップロード")
     print(f"{'='*60}\n")
 
+    return dict(result, unchanged=not (json_written or md_written))
+
 
 def main():
     """メイン処理"""
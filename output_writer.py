@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+出力ファイルの決定的な書き込み
+内容が変わっていない .json / .md は書き換えない（更新日時も変えない）ことで、
+Googleドライブ等の同期クライアントによるアーカイブ全体の再アップロードを防ぐ。
+
+- キー順を固定（sort_keys）して同じ内容なら同じバイト列にする
+- 処理日時・再利用フラグ等の実行ごとに変わる項目は比較から除外し、
+  内容が変わらなければディスク上の値（前回の処理日時）をそのまま使う
+- 書き込む場合も一時ファイル経由で置き換える
+- orjson がインストールされていれば高速なエンコーダーを使う（出力形式は同じ）
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Any, Tuple
+
+from records import SlotRecord, to_json
+
+# 任意の高速エンコーダー（pip install orjson、無ければ標準のjson）
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# 比較から除外する file_info の項目（実行ごとに変わる）
+VOLATILE_FILE_INFO = ('processed_at', 'reused_analysis', 'reused_slides')
+
+# 決定的モードでバッチのジャーナル・サマリーの記録から除く項目（実行ごとに変わる）
+VOLATILE_ENTRY_FIELDS = ('recorded_at',)
+
+
+def output_json_files(folder_path) -> List[Path]:
+    """
+    フォルダ内の出力JSON（パス順）
+
+    _batch_summary*.json 等の集計ファイル・_batch_leases 等の管理フォルダ（_で始まる名前）と
+    一時ファイル等（.で始まる名前）は除く。類似案件検索・名寄せ・価格分析・スプレッドシート用
+    エクスポートが同じデッキの集合を対象にするよう、出力を走査する処理はこれを使う
+    """
+    folder = Path(folder_path)
+    return sorted(path for path in folder.rglob('*.json')
+                  if not any(part.startswith(('_', '.')) for part in path.relative_to(folder).parts))
+
+
+def content_hash(data: bytes) -> str:
+    """内容のハッシュ"""
+    return hashlib.sha1(data).hexdigest()
+
+
+def stable_view(result: Dict[str, Any]) -> Dict[str, Any]:
+    """実行ごとに変わる項目を除いたコピー（比較用）"""
+    if 'file_info' not in result:
+        return {key: value for key, value in result.items() if key != 'processed_at'}
+    file_info = {key: value for key, value in result['file_info'].items() if key not in VOLATILE_FILE_INFO}
+    return dict(result, file_info=file_info)
+
+
+def dumps(result: Any, deterministic: bool = True, indent: bool = True) -> str:
+    """
+    JSON文字列に変換（レコード型も従来の形式に変換）
+
+    Args:
+        deterministic: キー順を固定する
+        indent: 2スペースでインデントする（Falseなら1行、ジャーナル用）
+    """
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        if deterministic:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(result, default=to_json, option=option).decode('utf-8')
+    return json.dumps(result, ensure_ascii=False, indent=2 if indent else None,
+                      sort_keys=deterministic, default=to_json)
+
+
+def write_text_if_changed(path, text: str) -> bool:
+    """
+    内容が異なる場合だけテキストを書き込み
+
+    Returns:
+        書き込んだらTrue（同じ内容で書き込みを省略したらFalse）
+    """
+    path = Path(path)
+    data = text.encode('utf-8')
+    try:
+        if path.stat().st_size == len(data) and content_hash(path.read_bytes()) == content_hash(data):
+            return False
+    except OSError:
+        pass
+
+    temp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    temp_path.write_bytes(data)
+    os.replace(temp_path, path)
+    return True
+
+
+def write_json_output(path, result: Dict[str, Any], deterministic: bool = True) -> Tuple[Dict[str, Any], bool]:
+    """
+    処理結果のJSONを書き込み
+
+    決定的モードでは、実行ごとに変わる項目を除いた内容がディスク上のJSONと同じなら
+    書き込まず、ディスク上の結果（前回の処理日時を含む）を返す。
+    Markdown等の派生出力はこの戻り値から作ると、それらも同じバイト列になる
+
+    Returns:
+        (ディスク上の内容と一致する結果, 書き込んだらTrue)
+    """
+    path = Path(path)
+    if not deterministic:
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(dumps(result, deterministic=False))
+        return result, True
+
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            existing = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        existing = None
+
+    if isinstance(existing, dict) and dumps(stable_view(existing)) == dumps(stable_view(result)):
+        # 内容が同じなら、ディスク上のバイト列も決定的な形式か確認して書き込みを省略
+        return existing, write_text_if_changed(path, dumps(existing))
+
+    write_text_if_changed(path, dumps(result))
+    return result, True
+
+
+def write_summary(path, summary: Dict[str, Any], deterministic: bool = False) -> bool:
+    """
+    バッチのサマリーJSONを書き込み
+
+    決定的モードでは各記録の記録日時を除いてキー順を固定し、内容が同じなら書き換えない
+
+    Returns:
+        書き込んだらTrue
+    """
+    if not deterministic:
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(dumps(summary, deterministic=False))
+        return True
+
+    results = []
+    for entry in summary.get('results') or []:
+        data = entry.to_dict() if isinstance(entry, SlotRecord) else dict(entry)
+        results.append({key: value for key, value in data.items() if key not in VOLATILE_ENTRY_FIELDS})
+    return write_text_if_changed(path, dumps(dict(summary, results=results)))
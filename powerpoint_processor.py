@@ -6,25 +6,40 @@ python-pptxを使用してPowerPointファイルからテキストを抽出し
 Google Apps Scriptで処理しやすいJSON形式に変換する
 """
 
-import json
 import re
+import time
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, List, Any, Optional
 
-try:
-    from pptx import Presentation
-except ImportError:
-    print("ERROR: python-pptx is not installed")
-    print("Please install it with: pip install python-pptx")
-    exit(1)
+import pptx_extraction
+from pptx_guard import PptxGuard, PptxGuardError
+from table_resolver import resolve_table, resolve_tables
+from output_writer import dumps
+from records import SlideAnalysis, SlideRecord, SummaryAccumulator
+from deck_catalog import file_info_properties
 
 
 class PowerPointProcessor:
     """PowerPoint解析・JSON変換クラス"""
 
-    def __init__(self):
-        """初期化"""
+    # 解析ルールのバージョン（patterns を変更したら上げる。前回結果の再利用判定に使用）
+    ANALYZER_VERSION = 3
+
+    def __init__(self, guard: Optional[PptxGuard] = None, ocr=None, entities=None, store=None):
+        """
+        初期化
+
+        Args:
+            guard: 読み込みガード（指定時はメモリ・時間制限付きワーカーで抽出）
+            ocr: SlideOCR（指定時はスライド画像のOCRテキストも解析対象にする）
+            entities: EntityIndex（指定時は会社名・クライアント名を正規IDに解決）
+            store: TextStore（指定時は抽出結果を再利用し、解析ルールの変更後も.pptxを開き直さない）
+        """
+        self.guard = guard
+        self.ocr = ocr
+        self.entities = entities
+        self.store = store
         self.patterns = {
             # 価格パターン（強化版）
             'price': [
@@ -46,12 +61,10 @@ class PowerPointProcessor:
                 r'(\d{1,2}月(?:上旬|中旬|下旬))',
             ],
             # 会社名パターン（強化版）
+            # 「〇〇株式会社」「〇〇(株)」「〇〇様」の前方一致は anchored_patterns で処理
             'company': [
                 r'(?:株式会社|有限会社)\s*([^\s、。\n]+)',
-                r'([^\s、。\n]+)\s*(?:株式会社|有限会社)',
                 r'\(株\)\s*([^\s、。\n]+)',
-                r'([^\s、。\n]+)\s*\(株\)',
-                r'([^\s、。\n]+様)',  # 様付き
                 r'クライアント[\s:：]*([^\s、。\n]+)',
             ],
             # 日付パターン（強化版）
@@ -76,50 +89,37 @@ class PowerPointProcessor:
             ],
         }
 
-    def extract_text_from_slide(self, slide) -> List[str]:
-        """スライドからテキストを抽出"""
-        texts = []
+        # 語尾のアンカー語から後方に名称を取り出すパターン
+        # 空白の少ない日本語テキストで「([^\s、。\n]+)株式会社」のような正規表現は
+        # 開始位置ごとに再試行して二乗時間になるため、アンカー語を先に探して
+        # 直前の文字を上限付きで遡る（線形時間）
+        self.anchored_patterns = {
+            'company': [
+                {'anchors': ('株式会社', '有限会社'), 'skip_space': True, 'keep_anchor': False},
+                {'anchors': ('(株)',), 'skip_space': True, 'keep_anchor': False},
+                {'anchors': ('様',), 'skip_space': False, 'keep_anchor': True},  # 様付き
+            ],
+        }
+        self._anchor_regexes = {}
+        for rules in self.anchored_patterns.values():
+            for rule in rules:
+                self._anchor_regexes[rule['anchors']] = re.compile(
+                    '|'.join(re.escape(anchor) for anchor in rule['anchors'])
+                )
 
-        for shape in slide.shapes:
-            try:
-                text = self._extract_text_from_shape(shape)
-                if text.strip():
-                    texts.append(text.strip())
-            except Exception as e:
-                # エラーが発生してもスキップして続行
-                continue
+        # アンカー語から遡る最大文字数
+        self.max_name_length = 30
+
+        # 1スライドあたりの解析時間の上限（秒）
+        self.slide_time_budget = 2.0
 
-        return texts
+    def extract_text_from_slide(self, slide) -> List[str]:
+        """スライドからテキストを抽出"""
+        return pptx_extraction.extract_text_from_slide(slide)
 
     def _extract_text_from_shape(self, shape) -> str:
         """図形からテキストを抽出"""
-        text = ""
-
-        # テキストフレーム
-        if hasattr(shape, 'text_frame') and shape.text_frame:
-            text += shape.text_frame.text + "\n"
-
-        # テーブル
-        if hasattr(shape, 'table'):
-            try:
-                table = shape.table
-                for row in table.rows:
-                    row_text = []
-                    for cell in row.cells:
-                        cell_text = cell.text.strip()
-                        if cell_text:
-                            row_text.append(cell_text)
-                    if row_text:
-                        text += " | ".join(row_text) + "\n"
-            except:
-                pass  # テーブルが存在しない場合はスキップ
-
-        # グループ化された図形
-        if hasattr(shape, 'shapes'):
-            for sub_shape in shape.shapes:
-                text += self._extract_text_from_shape(sub_shape)
-
-        return text
+        return pptx_extraction.extract_text_from_shape(shape)
 
     def analyze_text(self, text: str) -> Dict[str, Any]:
         """テキストから情報を抽出（強化版）"""
@@ -135,8 +135,16 @@ class PowerPointProcessor:
             'keywords': []
         }
 
+        started = time.monotonic()
+
         # パターンマッチング（複数パターン対応）
         for key, patterns in self.patterns.items():
+            # 時間上限を超えたら残りのカテゴリは打ち切る
+            if time.monotonic() - started > self.slide_time_budget:
+                print(f"  WARNING: Text analysis exceeded {self.slide_time_budget}s, skipping remaining patterns")
+                info['timed_out'] = True
+                break
+
             all_matches = []
 
             # パターンが配列の場合は全てを試す
@@ -156,6 +164,9 @@ class PowerPointProcessor:
                 except:
                     pass
 
+            for rule in self.anchored_patterns.get(key, []):
+                all_matches.extend(self._find_anchored(text, rule))
+
             # データ型に応じて処理
             if key == 'price':
                 prices = [self._clean_number(m) for m in all_matches]
@@ -164,24 +175,56 @@ class PowerPointProcessor:
                 quantities = [self._clean_number(m) for m in all_matches]
                 info['quantities'] = [q for q in quantities if q and q > 0]
             elif key == 'deadline':
-                info['deadlines'] = list(set([self._clean_string(m) for m in all_matches]))
+                info['deadlines'] = sorted(set(self._clean_string(m) for m in all_matches))
             elif key == 'company':
-                info['companies'] = list(set([self._clean_string(m) for m in all_matches]))
+                info['companies'] = sorted(set(self._clean_string(m) for m in all_matches))
             elif key == 'date':
                 info['dates'] = self._format_dates(all_matches)
             elif key == 'event_type':
-                info['event_types'] = list(set([self._clean_string(m) for m in all_matches]))
+                info['event_types'] = sorted(set(self._clean_string(m) for m in all_matches))
             elif key == 'client':
-                info['clients'] = list(set([self._clean_string(m) for m in all_matches]))
+                info['clients'] = sorted(set(self._clean_string(m) for m in all_matches))
             elif key == 'novelty':
-                info['novelties'] = list(set([self._clean_string(m) for m in all_matches]))
+                info['novelties'] = sorted(set(self._clean_string(m) for m in all_matches))
 
         # キーワード抽出
         keywords = self._extract_keywords(text)
         info['keywords'] = keywords
 
+        # 会社名・クライアント名の正規ID（表記ゆれを名寄せ）
+        if self.entities:
+            self._resolve_entities(info)
+
         return info
 
+    def _resolve_entities(self, info):
+        """解析結果の会社名・クライアント名を名寄せインデックスで正規IDに解決"""
+        info['company_ids'] = self.entities.resolve_all(info['companies'])
+        info['client_ids'] = self.entities.resolve_all(info['clients'])
+
+    def _find_anchored(self, text: str, rule: Dict[str, Any]) -> List[str]:
+        """アンカー語の直前にある名称を抽出（アンカー語の出現ごとに上限付きで後方展開）"""
+        names = []
+        floor = 0
+
+        for match in self._anchor_regexes[rule['anchors']].finditer(text):
+            end = match.start()
+            if rule['skip_space']:
+                while end > floor and text[end - 1].isspace():
+                    end -= 1
+
+            start = end
+            limit = max(floor, end - self.max_name_length)
+            # [^\s、。\n] に相当する文字だけを遡る
+            while start > limit and text[start - 1] not in '、。' and not text[start - 1].isspace():
+                start -= 1
+
+            if start < end:
+                names.append(text[start:match.end()] if rule['keep_anchor'] else text[start:end])
+            floor = match.end()
+
+        return names
+
     def _clean_number(self, number_str) -> Optional[int]:
         """数値文字列をクリーンアップ"""
         try:
@@ -237,7 +280,7 @@ class PowerPointProcessor:
                     formatted_dates.append(str(match))
             except:
                 continue
-        return list(set(formatted_dates))
+        return sorted(set(formatted_dates))
 
     def _extract_keywords(self, text: str) -> List[str]:
         """キーワード抽出（簡易版）"""
@@ -255,69 +298,120 @@ class PowerPointProcessor:
 
         return keywords
 
-    def process_powerpoint(self, file_path: str) -> Dict[str, Any]:
-        """PowerPointファイルを処理してJSON化"""
+    def read_slide_texts(self, file_path: str) -> List[List[str]]:
+        """スライドごとのテキストブロックを読み込み（ガード指定時はワーカー経由、OCR指定時は画像のテキストも追加）"""
+        return pptx_extraction.read_slide_texts(file_path, self.guard, self.ocr, self.store)
+
+    def read_slide_content(self, file_path: str) -> List[Dict[str, Any]]:
+        """スライドごとのテキストと構造化した表を読み込み"""
+        return pptx_extraction.read_slide_content(file_path, self.guard, self.ocr, self.store)
+
+    def analyze_slide(self, slide: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        1スライドを解析
+
+        表の単価・数量・金額・納期の列は列名から直接取り出し、
+        正規表現は表以外のテキストと、項目に対応しなかったセルだけに適用する
+        """
+        resolved_tables = [resolve_table(table) for table in slide.get('tables', [])]
+        residual = [line for resolved in resolved_tables for line in resolved['residual']]
+        info = self.analyze_text("\n".join(slide['body_texts'] + residual))
+
+        for resolved in resolved_tables:
+            item_costs = set()
+            for item in resolved['items']:
+                for field, key in (('unit_price', 'prices'), ('total_cost', 'prices'),
+                                   ('order_quantity', 'quantities')):
+                    value = self._clean_number(item.get(field)) if isinstance(item.get(field), int) else None
+                    if value:
+                        info[key].append(value)
+                        if field == 'total_cost':
+                            item_costs.add(value)
+                if item.get('deadline') is not None and str(item['deadline']) not in info['deadlines']:
+                    info['deadlines'].append(str(item['deadline']))
+                if isinstance(item.get('novelty_items'), str) and item['novelty_items'] not in info['novelties']:
+                    info['novelties'].append(item['novelty_items'])
+            # 合計行の金額は、明細の金額と同じ（1行だけの表・合計行も明細として読んだ）なら重複させない
+            if resolved['total'] is not None and int(resolved['total']) not in item_costs:
+                info['prices'].append(int(resolved['total']))
+
+        return info
+
+    def process_powerpoint(self, file_path: str, previous: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        PowerPointファイルを処理してJSON化
+
+        Args:
+            file_path: PowerPointファイルのパス
+            previous: 前回の出力（指定時は内容が変わっていないスライドの解析結果を再利用）
+        """
         try:
-            presentation = Presentation(file_path)
+            all_slides = self.read_slide_content(file_path)
+
+            # 前回の解析結果（同じ解析ルールのもののみ）をハッシュで引けるようにする
+            reusable = {}
+            if previous and previous.get('file_info', {}).get('analyzer_version') == self.ANALYZER_VERSION:
+                for slide in previous.get('slides', []):
+                    if slide.get('content_hash'):
+                        reusable[slide['content_hash']] = SlideAnalysis.from_dict(slide['analyzed_info'])
 
             result = {
                 'file_info': {
                     'file_name': Path(file_path).name,
                     'processed_at': datetime.now().isoformat(),
-                    'slide_count': len(presentation.slides)
+                    'slide_count': len(all_slides),
+                    'analyzer_version': self.ANALYZER_VERSION,
+                    'reused_slides': 0,
+                    # 文書プロパティ（タイトル・作成者・改訂番号等、カタログと同じ項目）
+                    'doc_properties': file_info_properties(file_path)
                 },
                 'slides': [],
-                'summary': {
-                    'all_prices': [],
-                    'all_quantities': [],
-                    'all_companies': [],
-                    'all_keywords': [],
-                    'all_deadlines': [],
-                    'all_dates': [],
-                    'all_event_types': [],
-                    'all_clients': [],
-                    'all_novelties': []
-                }
+                'summary': {},
+                # 表の列名から直接解決した単価・数量・総費用・納期
+                'table_fields': resolve_tables([table for slide in all_slides for table in slide['tables']])
             }
 
-            # 各スライドを処理
-            for i, slide in enumerate(presentation.slides, 1):
-                slide_texts = self.extract_text_from_slide(slide)
+            # 各スライドを処理（スライド・解析結果は __slots__ のレコードで保持）
+            summary = SummaryAccumulator()
+            for i, slide in enumerate(all_slides, 1):
+                slide_texts = slide['texts']
                 combined_text = "\n".join(slide_texts)
+                content_hash = pptx_extraction.slide_hash(slide_texts)
+
+                # 内容が変わっていないスライドは前回の解析結果を再利用
+                if content_hash in reusable:
+                    analyzed_info = reusable[content_hash]
+                    result['file_info']['reused_slides'] += 1
+                    # 名寄せを使っていなかった前回の結果にはIDを追加
+                    if self.entities and analyzed_info.company_ids is None:
+                        self._resolve_entities(analyzed_info)
+                else:
+                    analyzed_info = SlideAnalysis.from_dict(self.analyze_slide(slide))
+
+                result['slides'].append(SlideRecord(
+                    slide_number=i,
+                    raw_texts=slide_texts,
+                    tables=slide['tables'],
+                    analyzed_info=analyzed_info,
+                    text_length=len(combined_text),
+                    content_hash=content_hash
+                ))
 
-                analyzed_info = self.analyze_text(combined_text)
-
-                slide_data = {
-                    'slide_number': i,
-                    'raw_texts': slide_texts,
-                    'analyzed_info': analyzed_info,
-                    'text_length': len(combined_text)
-                }
-
-                result['slides'].append(slide_data)
-
-                # サマリー情報を蓄積
-                result['summary']['all_prices'].extend(analyzed_info['prices'])
-                result['summary']['all_quantities'].extend(analyzed_info['quantities'])
-                result['summary']['all_companies'].extend(analyzed_info['companies'])
-                result['summary']['all_keywords'].extend(analyzed_info['keywords'])
-                result['summary']['all_deadlines'].extend(analyzed_info['deadlines'])
-                result['summary']['all_dates'].extend(analyzed_info['dates'])
-                result['summary']['all_event_types'].extend(analyzed_info['event_types'])
-                result['summary']['all_clients'].extend(analyzed_info['clients'])
-                result['summary']['all_novelties'].extend(analyzed_info['novelties'])
-
-            # 重複を除去
-            result['summary']['all_companies'] = list(set(result['summary']['all_companies']))
-            result['summary']['all_keywords'] = list(set(result['summary']['all_keywords']))
-            result['summary']['all_deadlines'] = list(set(result['summary']['all_deadlines']))
-            result['summary']['all_dates'] = list(set(result['summary']['all_dates']))
-            result['summary']['all_event_types'] = list(set(result['summary']['all_event_types']))
-            result['summary']['all_clients'] = list(set(result['summary']['all_clients']))
-            result['summary']['all_novelties'] = list(set(result['summary']['all_novelties']))
+                # サマリー情報を蓄積（重複を除く項目は集合に追加）
+                summary.add(analyzed_info)
+
+            # 重複を除去（出力を決定的にするため並び順を固定）
+            result['summary'] = summary.to_dict()
 
             return result
 
+        except PptxGuardError as e:
+            return {
+                'error': str(e),
+                'guard_status': e.status,
+                'file_name': Path(file_path).name,
+                'processed_at': datetime.now().isoformat()
+            }
         except Exception as e:
             return {
                 'error': str(e),
@@ -351,7 +445,7 @@ def main():
     # JSON出力
     output_path = Path(file_path).with_suffix('.json')
     with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(result, f, ensure_ascii=False, indent=2)
+        f.write(dumps(result, deterministic=False))
 
     print(f"Processing completed!")
     print(f"Output file: {output_path}")
@@ -8,23 +8,19 @@ python-pptx + Gemini APIを使用してPowerPointファイルから高精度で
 import json
 import os
 import re
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 
-try:
-    from pptx import Presentation
-except ImportError:
-    print("ERROR: python-pptx is not installed")
-    print("Please install it with: pip install python-pptx")
-    exit(1)
-
-try:
-    import google.generativeai as genai
-except ImportError:
-    print("ERROR: google-generativeai is not installed")
-    print("Please install it with: pip install google-generativeai")
-    exit(1)
+import pptx_extraction
+from pptx_guard import PptxGuard, PptxGuardError
+from llm_backends import LLMBackend, create_backend, estimate_tokens
+from table_resolver import REQUIRED_FIELDS, resolve_tables, fully_resolved
+from deck_catalog import file_info_properties
 
 
 class GeminiPowerPointProcessor:
@@ -37,33 +33,87 @@ class GeminiPowerPointProcessor:
         'rpm': 15                     # 1分間15回
     }
 
-    def __init__(self, api_key: Optional[str] = None, usage_log_path: Optional[str] = None):
+    # 1リクエストに含めるスライドテキストの最大文字数
+    PROMPT_CHAR_LIMIT = 3000
+
+    # リスト項目の最大件数（プロンプトの指示と同じ）
+    LIST_FIELD_LIMITS = {
+        'partner_companies': 5,
+        'novelty_items': 5,
+        'keywords': 10,
+    }
+
+    # 抽出項目と型（レスポンススキーマと検証に使用）
+    ANALYSIS_FIELDS = {
+        'client_name': 'string',
+        'event_date': 'string',
+        'event_type': 'string',
+        'event_description': 'string',
+        'unit_price': 'integer',
+        'total_cost': 'integer',
+        'order_quantity': 'integer',
+        'target_count': 'integer',
+        'deadline': 'string',
+        'partner_companies': 'array',
+        'novelty_items': 'array',
+        'venue': 'string',
+        'keywords': 'array',
+    }
+
+    def __init__(self, api_key: Optional[str] = None, usage_log_path: Optional[str] = None,
+                 guard: Optional[PptxGuard] = None, chunk_mode: bool = False,
+                 max_chunks_per_deck: int = 4, backend: Any = 'gemini',
+                 overflow_backend: Any = None, ocr=None, table_first: bool = False,
+                 entities=None, store=None):
         """
         初期化
 
         Args:
             api_key: Gemini APIキー（省略時は環境変数から取得）
             usage_log_path: 使用状況ログファイルパス（省略時は.gemini_usage.json）
+            guard: 読み込みガード（指定時はメモリ・時間制限付きワーカーで抽出）
+            chunk_mode: 長いデッキをスライド範囲ごとに分割して分析・統合する
+            max_chunks_per_deck: 分割モードで1デッキに使う最大リクエスト数
+            backend: 分析に使うLLMバックエンド（gemini / local / stub またはインスタンス）
+            overflow_backend: 従量バックエンドの無料枠超過後に切り替えるバックエンド
+            ocr: SlideOCR（指定時はスライド画像のOCRテキストも分析対象にする）
+            table_first: 表から単価・数量・総費用・納期が全て解決できたデッキはLLMを呼ばない
+            entities: EntityIndex（指定時はクライアント名・協力会社名を正規IDに解決）
+            store: TextStore（指定時は抽出結果を再利用し、プロンプトの変更後も.pptxを開き直さない）
         """
-        # APIキーの設定
-        self.api_key = api_key or os.environ.get('GEMINI_API_KEY')
-        if not self.api_key:
-            raise ValueError(
-                "Gemini API key is required. "
-                "Set GEMINI_API_KEY environment variable or pass api_key parameter."
-            )
+        self.guard = guard
+        self.ocr = ocr
+        self.table_first = table_first
+        self.entities = entities
+        self.store = store
+        self.chunk_mode = chunk_mode
+        self.max_chunks_per_deck = max(1, max_chunks_per_deck)
+
+        # 並列リクエスト用のロックとRPM管理
+        self._usage_lock = threading.Lock()
+        self._rate_lock = threading.Lock()
+        self._request_times = deque()
+
+        # 変更スライドの重要項目判定・表で解決したデッキの解析用（必要になった時点で作成）
+        self._material_detector = None
 
         # 使用状況ログの設定
         self.usage_log_path = usage_log_path or Path.home() / '.gemini_usage.json'
         self.usage_data = self._load_usage_data()
+        # リクエストごとの記録（プロンプトサイズ・トークン数・レイテンシ）は追記専用のログに保存
+        self.calls_log_path = Path(self.usage_log_path).with_suffix('.calls.jsonl')
 
-        # Gemini APIの初期化
-        genai.configure(api_key=self.api_key)
-        # 無料版推奨モデル: Flash-Lite (1日1,000回、月30,000回まで)
-        self.model = genai.GenerativeModel('gemini-2.0-flash-lite')
+        # LLMバックエンドの初期化（無料版推奨: Gemini Flash-Lite、1日1,000回・月30,000回まで）
+        self.backend = backend if isinstance(backend, LLMBackend) else create_backend(backend, api_key)
+        self.overflow_backend = overflow_backend
+        if overflow_backend is not None and not isinstance(overflow_backend, LLMBackend):
+            self.overflow_backend = create_backend(overflow_backend, api_key)
 
-        print("Gemini API initialized successfully (using gemini-2.0-flash-lite)")
-        self._print_usage_status()
+        print(f"LLM backend initialized successfully (using {self.backend.describe()})")
+        if self.overflow_backend:
+            print(f"Overflow backend: {self.overflow_backend.describe()}")
+        if self.backend.metered:
+            self._print_usage_status()
 
     def _load_usage_data(self) -> Dict[str, Any]:
         """使用状況データを読み込み"""
@@ -89,7 +139,7 @@ class GeminiPowerPointProcessor:
         except Exception as e:
             print(f"WARNING: Failed to save usage data: {e}")
 
-    def _check_free_tier_limit(self) -> bool:
+    def _check_free_tier_limit(self, verbose: bool = True) -> bool:
         """無料枠の制限チェック（超過したらFalseを返す）"""
         today = datetime.now().strftime('%Y-%m-%d')
         this_month = datetime.now().strftime('%Y-%m')
@@ -97,6 +147,8 @@ class GeminiPowerPointProcessor:
         # 日次使用量
         daily_count = self.usage_data['daily'].get(today, 0)
         if daily_count >= self.FREE_TIER_LIMITS['daily_requests']:
+            if not verbose:
+                return False
             print(f"\n⚠️  FREE TIER LIMIT EXCEEDED: Daily limit ({self.FREE_TIER_LIMITS['daily_requests']} requests/day)")
             print(f"   Today's usage: {daily_count}/{self.FREE_TIER_LIMITS['daily_requests']}")
             print(f"   システムを停止します（無料枠超過のため課金を防止）")
@@ -105,6 +157,8 @@ class GeminiPowerPointProcessor:
         # 月次使用量
         monthly_count = self.usage_data['monthly'].get(this_month, 0)
         if monthly_count >= self.FREE_TIER_LIMITS['monthly_requests']:
+            if not verbose:
+                return False
             print(f"\n⚠️  FREE TIER LIMIT EXCEEDED: Monthly limit ({self.FREE_TIER_LIMITS['monthly_requests']} requests/month)")
             print(f"   This month's usage: {monthly_count}/{self.FREE_TIER_LIMITS['monthly_requests']}")
             print(f"   システムを停止します（無料枠超過のため課金を防止）")
@@ -117,17 +171,90 @@ class GeminiPowerPointProcessor:
         today = datetime.now().strftime('%Y-%m-%d')
         this_month = datetime.now().strftime('%Y-%m')
 
-        # 日次カウント
-        self.usage_data['daily'][today] = self.usage_data['daily'].get(today, 0) + 1
+        with self._usage_lock:
+            # 日次カウント
+            self.usage_data['daily'][today] = self.usage_data['daily'].get(today, 0) + 1
+
+            # 月次カウント
+            self.usage_data['monthly'][this_month] = self.usage_data['monthly'].get(this_month, 0) + 1
 
-        # 月次カウント
-        self.usage_data['monthly'][this_month] = self.usage_data['monthly'].get(this_month, 0) + 1
+            # 総カウント
+            self.usage_data['total'] = self.usage_data.get('total', 0) + 1
 
-        # 総カウント
-        self.usage_data['total'] = self.usage_data.get('total', 0) + 1
+            # 保存
+            self._save_usage_data()
 
-        # 保存
-        self._save_usage_data()
+    def _select_backend(self) -> Optional[LLMBackend]:
+        """
+        リクエストに使うバックエンドを選択
+
+        無料枠の管理は従量バックエンドのみ。枠を超えた場合はオーバーフロー先、
+        設定が無ければNone（課金を防ぐため停止）
+        """
+        if not self.backend.metered:
+            return self.backend
+        if self.overflow_backend is None:
+            return self.backend if self._check_free_tier_limit() else None
+        if self._check_free_tier_limit(verbose=False):
+            return self.backend
+        return self.overflow_backend
+
+    def _generate(self, backend: LLMBackend, prompt: str, fields: List[str],
+                  call: Dict[str, Any]) -> str:
+        """
+        選択したバックエンドにプロンプトを送信（従量バックエンドのみRPM・使用回数を管理）
+
+        call にプロンプトサイズ・トークン数・レイテンシを追記する
+        （失敗時はここで記録、成功時は呼び出し元が結果を付けて記録）
+        """
+        if backend.metered:
+            self._wait_for_rate_limit()
+
+        call.update({
+            'backend': backend.name,
+            'prompt_chars': len(prompt),
+            'estimated_prompt_tokens': estimate_tokens(prompt),
+        })
+        started = time.monotonic()
+        try:
+            response_text, tokens = backend.generate(prompt, self._build_response_schema(fields))
+        except Exception:
+            call['latency_ms'] = round((time.monotonic() - started) * 1000)
+            call['outcome'] = 'error'
+            self._record_call(call)
+            raise
+        call['latency_ms'] = round((time.monotonic() - started) * 1000)
+        call['response_chars'] = len(response_text)
+        call.update(tokens)
+
+        # API使用回数をカウント（成功したらカウント）
+        if backend.metered:
+            self._increment_usage()
+
+        return response_text.strip()
+
+    def _record_call(self, call: Dict[str, Any]):
+        """リクエスト1件の記録を追記"""
+        line = json.dumps(dict(call, at=datetime.now().isoformat(timespec='seconds')),
+                          ensure_ascii=False) + "\n"
+        with self._usage_lock:
+            try:
+                with open(self.calls_log_path, 'a', encoding='utf-8') as f:
+                    f.write(line)
+            except Exception as e:
+                print(f"WARNING: Failed to save call log: {e}")
+
+    def _wait_for_rate_limit(self):
+        """直近1分間のリクエスト数がRPM上限に達していれば待機"""
+        with self._rate_lock:
+            while True:
+                now = time.monotonic()
+                while self._request_times and now - self._request_times[0] >= 60:
+                    self._request_times.popleft()
+                if len(self._request_times) < self.FREE_TIER_LIMITS['rpm']:
+                    self._request_times.append(now)
+                    return
+                time.sleep(60 - (now - self._request_times[0]))
 
     def _print_usage_status(self):
         """現在の使用状況を表示"""
@@ -145,77 +272,36 @@ class GeminiPowerPointProcessor:
         print(f"   Today: {daily_count}/{self.FREE_TIER_LIMITS['daily_requests']} requests (残り {daily_remaining})")
         print(f"   This month: {monthly_count}/{self.FREE_TIER_LIMITS['monthly_requests']} requests (残り {monthly_remaining})")
         print(f"   Total: {total_count} requests")
+
+        parse = self.usage_data.get('parse', {})
+        parsed_total = sum(parse.values())
+        if parsed_total:
+            failure_rate = parse.get('failed', 0) / parsed_total * 100
+            print(f"   JSON parse: ok {parse.get('ok', 0)} / repaired {parse.get('repaired', 0)} "
+                  f"/ failed {parse.get('failed', 0)} (失敗率 {failure_rate:.1f}%)")
         print()
 
+    def _record_parse_outcome(self, outcome: str):
+        """レスポンス解析結果（ok / repaired / failed）を使用状況に記録"""
+        with self._usage_lock:
+            parse = self.usage_data.setdefault('parse', {'ok': 0, 'repaired': 0, 'failed': 0})
+            parse[outcome] = parse.get(outcome, 0) + 1
+            self._save_usage_data()
+
     def extract_text_from_slide(self, slide) -> List[str]:
         """スライドからテキストを抽出"""
-        texts = []
-
-        for shape in slide.shapes:
-            try:
-                text = self._extract_text_from_shape(shape)
-                if text.strip():
-                    texts.append(text.strip())
-            except Exception as e:
-                continue
-
-        return texts
+        return pptx_extraction.extract_text_from_slide(slide)
 
     def _extract_text_from_shape(self, shape) -> str:
         """図形からテキストを抽出"""
-        text = ""
-
-        # テキストフレーム
-        if hasattr(shape, 'text_frame') and shape.text_frame:
-            text += shape.text_frame.text + "\n"
-
-        # テーブル
-        if hasattr(shape, 'table'):
-            try:
-                table = shape.table
-                for row in table.rows:
-                    row_text = []
-                    for cell in row.cells:
-                        cell_text = cell.text.strip()
-                        if cell_text:
-                            row_text.append(cell_text)
-                    if row_text:
-                        text += " | ".join(row_text) + "\n"
-            except:
-                pass
-
-        # グループ化された図形
-        if hasattr(shape, 'shapes'):
-            for sub_shape in shape.shapes:
-                text += self._extract_text_from_shape(sub_shape)
-
-        return text
-
-    def analyze_with_gemini(self, slide_texts: List[str], file_name: str) -> Dict[str, Any]:
-        """
-        Gemini APIでテキストを分析
-
-        Args:
-            slide_texts: スライドのテキストリスト
-            file_name: ファイル名
-
-        Returns:
-            構造化された分析結果
-        """
-        # 無料枠チェック
-        if not self._check_free_tier_limit():
-            error_result = self._get_empty_analysis()
-            error_result['error'] = 'FREE_TIER_LIMIT_EXCEEDED'
-            return error_result
+        return pptx_extraction.extract_text_from_shape(shape)
 
-        # テキストを結合
-        combined_text = "\n\n".join(slide_texts)
-
-        # ファイル名からクライアント名を事前抽出
+    def build_prompt(self, combined_text: str, file_name: str, char_limit: Optional[int] = None) -> str:
+        """分析用のプロンプト（スライドテキストは char_limit 文字まで、省略時は PROMPT_CHAR_LIMIT）"""
+        char_limit = char_limit or self.PROMPT_CHAR_LIMIT
         client_hint = self._extract_client_from_filename(file_name)
 
-        # プロンプト作成
-        prompt = f"""あなたはプロモーション事業のデータ分析AIです。
+        return f"""あなたはプロモーション事業のデータ分析AIです。
 以下のPowerPointスライドのテキストから、構造化データを抽出してください。
 
 【ファイル名】
@@ -238,7 +324,7 @@ class GeminiPowerPointProcessor:
 13. keywords: 重要なキーワードリスト（最大10個）
 
 【スライドテキスト】
-{combined_text[:3000]}
+{combined_text[:char_limit]}
 
 【出力形式】
 以下のJSON形式で出力してください。値が不明な場合はnullを設定してください。
@@ -260,42 +346,367 @@ class GeminiPowerPointProcessor:
 
 重要: 必ずJSON形式のみを出力してください。説明文は不要です。"""
 
+    def analyze_with_gemini(self, slide_texts: List[str], file_name: str,
+                            folder: Optional[str] = None, section: str = 'analysis',
+                            char_limit: Optional[int] = None,
+                            repairs: Optional[threading.Semaphore] = None) -> Dict[str, Any]:
+        """
+        Gemini APIでテキストを分析
+
+        Args:
+            slide_texts: スライドのテキストリスト
+            file_name: ファイル名
+            folder: ファイルのフォルダ（使用量の記録用）
+            section: リクエストの種類（analysis / chunk、使用量の記録用）
+            char_limit: プロンプトに含めるテキストの上限（省略時は PROMPT_CHAR_LIMIT）
+            repairs: 再リクエストの残り回数（分割モードでデッキのリクエスト数の上限に含める）
+
+        Returns:
+            構造化された分析結果
+        """
+        # 無料枠チェック（超過時はオーバーフロー先へ）
+        backend = self._select_backend()
+        if backend is None:
+            error_result = self._get_empty_analysis()
+            error_result['error'] = 'FREE_TIER_LIMIT_EXCEEDED'
+            return error_result
+
+        # テキストを結合
+        combined_text = "\n\n".join(slide_texts)
+
+        # ファイル名からクライアント名を事前抽出
+        client_hint = self._extract_client_from_filename(file_name)
+
+        # プロンプト作成
+        char_limit = char_limit or self.PROMPT_CHAR_LIMIT
+        prompt = self.build_prompt(combined_text, file_name, char_limit)
+
+        call = {
+            'section': section,
+            'file': file_name,
+            'folder': folder,
+            'client': client_hint or None,
+            'source_chars': len(combined_text),
+            'truncated': len(combined_text) > char_limit,
+        }
+
         try:
-            # Gemini APIに送信
-            print("  Sending to Gemini API...")
-            response = self.model.generate_content(prompt)
+            # LLMに送信
+            print(f"  Sending to {backend.name}...")
+            response_text = self._generate(backend, prompt, list(self.ANALYSIS_FIELDS), call)
+        except Exception as e:
+            print(f"  ERROR: {backend.name} call failed: {e}")
+            # 空の分析結果を返すと成功として記録され、--resume で再試行されない
+            error_result = self._get_empty_analysis()
+            error_result['error'] = 'LLM_CALL_FAILED'
+            return error_result
 
-            # API使用回数をカウント（成功したらカウント）
-            self._increment_usage()
+        # レスポンスを検証し、壊れた項目だけを再リクエストで補完
+        parsed = self._parse_json_response(response_text)
+        if parsed is None:
+            print(f"  WARNING: Failed to parse {backend.name} response as JSON")
+            print(f"  Response: {response_text[:500]}")
+            analyzed_data, invalid_fields = self._get_empty_analysis(), list(self.ANALYSIS_FIELDS)
+        else:
+            analyzed_data, invalid_fields = self._validate_analysis(parsed)
+
+        if invalid_fields and repairs is not None and not repairs.acquire(blocking=False):
+            print(f"  WARNING: Request limit per deck reached, not repairing: {', '.join(invalid_fields)}")
+            call['outcome'] = 'failed'
+        elif invalid_fields:
+            repaired = self._repair_fields(backend, invalid_fields,
+                                           combined_text[:char_limit], response_text, call)
+            if repaired is None:
+                call['outcome'] = 'failed'
+            else:
+                analyzed_data.update(repaired)
+                call['outcome'] = 'repaired'
+        else:
+            call['outcome'] = 'ok'
+        self._record_parse_outcome(call['outcome'])
+
+        call['client'] = analyzed_data.get('client_name') or call['client']
+        self._record_call(call)
+
+        # 信頼度スコアを計算
+        confidence = self._calculate_confidence(analyzed_data)
+        analyzed_data['confidence_score'] = confidence
+        analyzed_data['llm_backend'] = backend.name
+
+        print(f"  {backend.name} analysis completed (confidence: {confidence}%)")
+        return analyzed_data
+
+    def _build_response_schema(self, fields: List[str]) -> Dict[str, Any]:
+        """指定項目のレスポンススキーマを作成"""
+        properties = {}
+        for field in fields:
+            field_type = self.ANALYSIS_FIELDS[field]
+            if field_type == 'array':
+                properties[field] = {'type': 'array', 'items': {'type': 'string'}}
+            else:
+                properties[field] = {'type': field_type, 'nullable': True}
+        return {'type': 'object', 'properties': properties, 'required': fields}
+
+    def _parse_json_response(self, response_text: str) -> Optional[Dict[str, Any]]:
+        """レスポンスからJSONオブジェクトを取り出す（失敗時はNone）"""
+        candidates = [response_text]
+
+        # JSONブロックを抽出（```json ``` で囲まれている場合）
+        json_match = re.search(r'```(?:json)?\s*(.*?)\s*```', response_text, re.DOTALL)
+        if json_match:
+            candidates.append(json_match.group(1))
 
-            # レスポンスからJSONを抽出
-            response_text = response.text.strip()
+        # 前後に説明文が付いている場合は最初の { から最後の } まで
+        start, end = response_text.find('{'), response_text.rfind('}')
+        if 0 <= start < end:
+            candidates.append(response_text[start:end + 1])
 
-            # JSONブロックを抽出（```json ``` で囲まれている場合）
-            json_match = re.search(r'```json\s*(.*?)\s*```', response_text, re.DOTALL)
-            if json_match:
-                json_str = json_match.group(1)
+        for candidate in candidates:
+            try:
+                data = json.loads(candidate)
+            except (json.JSONDecodeError, TypeError):
+                continue
+            if isinstance(data, dict):
+                return data
+        return None
+
+    def _validate_analysis(self, data: Dict[str, Any]) -> Tuple[Dict[str, Any], List[str]]:
+        """
+        型を検証・補正
+
+        Returns:
+            (補正済みの分析結果, 不正な項目名のリスト)
+        """
+        result = self._get_empty_analysis()
+        invalid_fields = []
+
+        for field, field_type in self.ANALYSIS_FIELDS.items():
+            value = data.get(field)
+            if value is None or value == '':
+                # 不明な項目はそのまま（nullは正常な回答）
+                continue
+
+            if field_type == 'integer':
+                if isinstance(value, bool):
+                    invalid_fields.append(field)
+                elif isinstance(value, (int, float)):
+                    result[field] = int(value)
+                else:
+                    cleaned = re.sub(r'[,\s円¥￥名個]', '', str(value))
+                    if cleaned.isdigit():
+                        result[field] = int(cleaned)
+                    else:
+                        invalid_fields.append(field)
+            elif field_type == 'array':
+                if isinstance(value, str):
+                    value = [v.strip() for v in re.split(r'[,、]', value)]
+                if isinstance(value, list):
+                    result[field] = [str(v) for v in value if v not in (None, '')]
+                else:
+                    invalid_fields.append(field)
             else:
-                # JSONブロックがない場合はそのまま使用
-                json_str = response_text
+                if isinstance(value, (dict, list)):
+                    invalid_fields.append(field)
+                else:
+                    result[field] = str(value)
+
+        return result, invalid_fields
 
-            # JSONをパース
-            analyzed_data = json.loads(json_str)
+    def _repair_fields(self, backend: LLMBackend, fields: List[str], source_text: str,
+                       response_text: str, origin: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        不正・欠落した項目だけを小さなリクエストで再取得
 
-            # 信頼度スコアを計算
-            confidence = self._calculate_confidence(analyzed_data)
-            analyzed_data['confidence_score'] = confidence
+        Args:
+            origin: 元のリクエストの記録（ファイル・フォルダ・クライアントを引き継ぐ）
 
-            print(f"  Gemini API analysis completed (confidence: {confidence}%)")
-            return analyzed_data
+        Returns:
+            補完した項目（失敗時はNone）
+        """
+        if backend.metered and not self._check_free_tier_limit():
+            return None
 
-        except json.JSONDecodeError as e:
-            print(f"  ERROR: Failed to parse Gemini response as JSON: {e}")
-            print(f"  Response: {response_text[:500]}")
-            return self._get_empty_analysis()
+        prompt = f"""以下のテキストから、指定された項目だけをJSONで出力してください。
+値が不明な場合はnullを設定してください。
+
+【項目】
+{', '.join(fields)}
+
+【前回の出力（形式が不正）】
+{response_text[:1000]}
+
+【スライドテキスト】
+{source_text}"""
+
+        call = {key: origin.get(key) for key in ('file', 'folder', 'client')}
+        call['section'] = 'repair'
+
+        try:
+            print(f"  Repairing fields: {', '.join(fields)}")
+            parsed = self._parse_json_response(self._generate(backend, prompt, fields, call))
         except Exception as e:
-            print(f"  ERROR: Gemini API call failed: {e}")
-            return self._get_empty_analysis()
+            print(f"  ERROR: Repair request failed: {e}")
+            return None
+
+        call['outcome'] = 'failed' if parsed is None else 'ok'
+        self._record_call(call)
+        if parsed is None:
+            return None
+
+        validated, still_invalid = self._validate_analysis(parsed)
+        return {field: validated[field] for field in fields if field not in still_invalid}
+
+    def chunk_budget(self, slides: List[List[str]]) -> int:
+        """
+        分割モードの1チャンクの文字数の上限
+
+        PROMPT_CHAR_LIMIT で max_chunks_per_deck に収まらない場合は、
+        貪欲法の分割が上限のチャンク数に収まる最小の文字数まで広げる（プロンプトにもこの文字数まで含める）
+        """
+        if len(self._greedy_chunks(slides, self.PROMPT_CHAR_LIMIT)) <= self.max_chunks_per_deck:
+            return self.PROMPT_CHAR_LIMIT
+
+        # チャンク数は上限の文字数に対して単調減少なので二分探索（全体の文字数なら1チャンク）
+        low, high = self.PROMPT_CHAR_LIMIT, len("\n\n".join(text for texts in slides for text in texts))
+        while low + 1 < high:
+            middle = (low + high) // 2
+            if len(self._greedy_chunks(slides, middle)) <= self.max_chunks_per_deck:
+                high = middle
+            else:
+                low = middle
+        return high
+
+    @staticmethod
+    def _greedy_chunks(slides: List[List[str]], budget: int) -> List[Tuple[int, int, List[str]]]:
+        """先頭から budget 文字（結合時の区切りを含む）に収まるだけスライドを詰めて分割"""
+        chunks = []
+        start, current, size = 1, [], 0
+        for number, texts in enumerate(slides, 1):
+            slide_size = len("\n\n".join(texts))
+            separator = 2 if current and texts else 0
+            if current and texts and size + separator + slide_size > budget:
+                chunks.append((start, number - 1, current))
+                start, current, size, separator = number, [], 0, 0
+            current.extend(texts)
+            size += separator + slide_size
+        if current:
+            chunks.append((start, len(slides), current))
+        return chunks
+
+    def _split_into_chunks(self, slides: List[List[str]]) -> List[Tuple[int, int, List[str]]]:
+        """
+        スライドを連続した範囲ごとに分割（各チャンクは chunk_budget 以内）
+
+        1枚で chunk_budget を超えるスライドだけは単独のチャンクとなり、単一リクエストと同様に切り詰められる
+
+        Returns:
+            (開始スライド番号, 終了スライド番号, テキストブロック) のリスト
+        """
+        return self._greedy_chunks(slides, self.chunk_budget(slides))
+
+    def analyze_chunked(self, slides: List[List[str]], file_name: str,
+                        folder: Optional[str] = None) -> Dict[str, Any]:
+        """
+        スライド範囲ごとに並列で分析し、ローカルのルールで統合（map-reduce）
+
+        Args:
+            slides: スライドごとのテキストブロック
+            file_name: ファイル名
+            folder: ファイルのフォルダ（使用量の記録用）
+
+        Returns:
+            統合された分析結果（chunk_ranges に分析したスライド範囲を記録、失敗したチャンクがあればそのエラー）
+        """
+        chunks = self._split_into_chunks(slides)
+        budget = self.chunk_budget(slides)
+        print(f"  Chunked analysis: {len(chunks)} chunks "
+              f"({', '.join(f'{a}-{b}' for a, b, _ in chunks)})")
+
+        # 再リクエストもデッキのリクエスト数の上限（max_chunks_per_deck）に含める
+        repairs = threading.Semaphore(max(0, self.max_chunks_per_deck - len(chunks)))
+
+        workers = min(len(chunks), self.FREE_TIER_LIMITS['rpm'])
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            analyses = list(executor.map(
+                lambda chunk: self.analyze_with_gemini(chunk[2], file_name, folder, 'chunk',
+                                                       budget, repairs), chunks
+            ))
+
+        # 1つでも失敗したチャンクがあれば、一部のスライドだけの統合結果にせずデッキのエラーとする
+        failed = [a for a in analyses if a.get('error')]
+        if failed:
+            return failed[0]
+
+        merged = self._merge_analyses(analyses)
+        merged['chunk_ranges'] = [f"{a}-{b}" for a, b, _ in chunks]
+        merged['llm_backend'] = ', '.join(sorted({a['llm_backend'] for a in analyses if a.get('llm_backend')}))
+        return merged
+
+    def _merge_analyses(self, analyses: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """チャンクごとの分析結果を決定的なルールで統合"""
+        merged = self._get_empty_analysis()
+
+        def dominant(field):
+            # 最頻値（同数の場合は先に出現したチャンクを優先）
+            values = [a.get(field) for a in analyses if a.get(field) not in (None, '')]
+            if not values:
+                return None
+            counts = Counter(values)
+            return max(values, key=lambda v: (counts[v], -values.index(v)))
+
+        for field in ('client_name', 'event_date', 'event_type', 'venue', 'deadline',
+                      'unit_price', 'order_quantity'):
+            merged[field] = dominant(field)
+
+        # 概要は最初に記述のあるチャンク（通常は表紙・概要スライド）
+        merged['event_description'] = next(
+            (a['event_description'] for a in analyses if a.get('event_description')), None
+        )
+
+        targets = [a['target_count'] for a in analyses if a.get('target_count')]
+        merged['target_count'] = max(targets) if targets else None
+
+        merged['total_cost'] = self._merge_total_cost(
+            [a['total_cost'] for a in analyses if a.get('total_cost')],
+            merged['unit_price'], merged['order_quantity']
+        )
+
+        # リスト項目は出現順を保った和集合
+        for field, limit in self.LIST_FIELD_LIMITS.items():
+            union = []
+            for analysis in analyses:
+                for item in analysis.get(field) or []:
+                    if item and item not in union:
+                        union.append(item)
+            merged[field] = union[:limit]
+
+        merged['confidence_score'] = self._calculate_confidence(merged)
+        return merged
+
+    def _merge_total_cost(self, costs: List[int], unit_price: Optional[int],
+                          quantity: Optional[int]) -> Optional[int]:
+        """
+        チャンクごとの総費用を統合
+
+        単価×数量と整合する値があればそれを採用し、最大値が他の合計と一致すれば
+        総額とみなす。どちらでもなければ内訳とみなして合計する
+        """
+        distinct = sorted(set(costs))
+        if not distinct:
+            return None
+        if len(distinct) == 1:
+            return distinct[0]
+
+        if unit_price and quantity:
+            expected = unit_price * quantity
+            for cost in distinct:
+                if abs(cost - expected) <= expected * 0.1:
+                    return cost
+
+        largest, others = distinct[-1], distinct[:-1]
+        if abs(largest - sum(others)) <= largest * 0.01:
+            return largest
+        return sum(distinct)
 
     def _extract_client_from_filename(self, filename: str) -> str:
         """ファイル名からクライアント名を抽出"""
@@ -343,36 +754,178 @@ class GeminiPowerPointProcessor:
             'confidence_score': 0
         }
 
-    def process_powerpoint(self, file_path: str) -> Dict[str, Any]:
-        """PowerPointファイルを処理してJSON化"""
+    def read_slide_texts(self, file_path: str) -> List[List[str]]:
+        """スライドごとのテキストブロックを読み込み（ガード指定時はワーカー経由、OCR指定時は画像のテキストも追加）"""
+        return pptx_extraction.read_slide_texts(file_path, self.guard, self.ocr, self.store)
+
+    def _local_analyzer(self):
+        """正規表現版のプロセッサー（初回に作成）"""
+        if self._material_detector is None:
+            from powerpoint_processor import PowerPointProcessor
+            self._material_detector = PowerPointProcessor()
+        return self._material_detector
+
+    def _apply_table_fields(self, analyzed_data: Dict[str, Any], table_fields: Dict[str, Any]):
+        """LLMが返さなかった単価・数量・総費用・納期・品名を表の値で補完"""
+        filled = [field for field in REQUIRED_FIELDS
+                  if analyzed_data.get(field) is None and table_fields.get(field) is not None]
+        for field in filled:
+            analyzed_data[field] = table_fields[field]
+        if not analyzed_data.get('novelty_items') and table_fields.get('novelty_items'):
+            analyzed_data['novelty_items'] = list(table_fields['novelty_items'])
+            filled.append('novelty_items')
+
+        if filled:
+            print(f"  Filled from tables: {', '.join(filled)}")
+            analyzed_data['confidence_score'] = self._calculate_confidence(analyzed_data)
+
+    def analyze_from_tables(self, slides: List[Dict[str, Any]], file_name: str,
+                            table_fields: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        LLMを使わずに分析（表で単価・数量・総費用・納期が全て解決できたデッキ用）
+
+        表の値に加え、クライアント名・実施時期・種別・会社名等は正規表現版の解析で補う
+        """
+        detector = self._local_analyzer()
+        infos = [detector.analyze_slide(slide) for slide in slides]
+
+        def collect(key):
+            values = []
+            for info in infos:
+                values.extend(v for v in info[key] if v not in values)
+            return values
+
+        analyzed_data = self._get_empty_analysis()
+        analyzed_data.update({field: table_fields[field] for field in REQUIRED_FIELDS})
+        clients = collect('clients')
+        analyzed_data['client_name'] = (self._extract_client_from_filename(file_name)
+                                        or next(iter(clients), None))
+        # 実施時期は年を含む日付のうち最も早いもの（年月のみの「/01」は同じ月の日付があれば除く）
+        dates = [d for d in collect('dates') if re.match(r'\d{4}/', d)]
+        dated = sorted(d for d in dates
+                       if not (d.endswith('/01') and any(o[:8] == d[:8] and o != d for o in dates)))
+        analyzed_data['event_date'] = dated[0] if dated else None
+        analyzed_data['event_type'] = next(iter(collect('event_types')), None)
+        # クライアント（様付き）と記号だけの名称は協力会社から除く
+        analyzed_data['partner_companies'] = [
+            name for name in collect('companies')
+            if re.search(r'\w', name) and not name.endswith('様') and name not in clients
+        ][:5]
+        analyzed_data['novelty_items'] = list(table_fields['novelty_items']) or collect('novelties')[:5]
+        analyzed_data['keywords'] = collect('keywords')[:10]
+
+        analyzed_data['confidence_score'] = self._calculate_confidence(analyzed_data)
+        analyzed_data['llm_backend'] = 'local_tables'
+        print(f"  Resolved from tables without LLM (confidence: {analyzed_data['confidence_score']}%)")
+        return analyzed_data
+
+    def _has_material_changes(self, slides: List[List[str]], previous: Dict[str, Any]) -> bool:
+        """
+        前回の出力と比べて、再分析が必要な変更があるか判定
+
+        追加・変更されたスライドに価格・数量・日付・納期・会社名が含まれる場合、
+        またはスライドが削除された場合に True
+        """
+        previous_hashes = previous.get('slide_hashes')
+        if not previous_hashes or not previous.get('gemini_analysis'):
+            return True
+        if previous['gemini_analysis'].get('error') or not previous['gemini_analysis'].get('confidence_score'):
+            return True
+
+        hashes = [pptx_extraction.slide_hash(texts) for texts in slides]
+        if set(previous_hashes) - set(hashes):
+            return True
+
+        changed = [texts for texts, h in zip(slides, hashes) if h not in set(previous_hashes)]
+        if not changed:
+            return False
+
+        # 変更スライドに重要項目が含まれるかは正規表現版の解析でローカルに判定
+        info = self._local_analyzer().analyze_text("\n".join(text for texts in changed for text in texts))
+        return any(info[field] for field in
+                   ('prices', 'quantities', 'dates', 'deadlines', 'companies', 'clients'))
+
+    def process_powerpoint(self, file_path: str, previous: Optional[Dict[str, Any]] = None,
+                           source_path: Optional[str] = None) -> Dict[str, Any]:
+        """
+        PowerPointファイルを処理してJSON化
+
+        Args:
+            file_path: PowerPointファイルのパス
+            previous: 前回の出力（指定時は重要な変更が無ければ前回のGemini分析を再利用）
+            source_path: 元のファイルのパス（先読みしたローカルのコピーを処理する場合、使用量のフォルダ別集計に使う）
+        """
+        folder = str(Path(source_path or file_path).resolve().parent)
         try:
             print(f"Processing: {Path(file_path).name}")
-            presentation = Presentation(file_path)
+            contents = pptx_extraction.read_slide_content(file_path, self.guard, self.ocr, self.store)
+            slides = [content['texts'] for content in contents]
+            table_fields = resolve_tables([table for content in contents for table in content['tables']])
 
             # 全スライドからテキストを抽出
             all_slide_texts = []
-            for i, slide in enumerate(presentation.slides, 1):
-                slide_texts = self.extract_text_from_slide(slide)
+            for i, slide_texts in enumerate(slides, 1):
                 all_slide_texts.extend(slide_texts)
-                print(f"  Slide {i}/{len(presentation.slides)}: {len(slide_texts)} text blocks extracted")
+                print(f"  Slide {i}/{len(slides)}: {len(slide_texts)} text blocks extracted")
+
+            # Gemini APIで分析（長いデッキは分割モードで統合）
+            total_chars = len("\n\n".join(all_slide_texts))
+            reused = previous is not None and not self._has_material_changes(slides, previous)
+            if reused:
+                print("  No material changes since last run, reusing previous Gemini analysis")
+                analyzed_data = previous['gemini_analysis']
+            elif self.table_first and fully_resolved(table_fields):
+                analyzed_data = self.analyze_from_tables(contents, Path(file_path).name, table_fields)
+            elif self.chunk_mode and total_chars > self.PROMPT_CHAR_LIMIT:
+                analyzed_data = self.analyze_chunked(slides, Path(file_path).name, folder)
+            else:
+                analyzed_data = self.analyze_with_gemini(all_slide_texts, Path(file_path).name, folder)
+
+            # 分析できなかった（無料枠超過等）場合は出力せず、ファイルのエラーとして返す
+            # （成功として記録すると --resume・分散処理で二度と再処理されない）
+            if analyzed_data.get('error'):
+                return {
+                    'error': analyzed_data['error'],
+                    'file_name': Path(file_path).name,
+                    'processed_at': datetime.now().isoformat()
+                }
 
-            # Gemini APIで分析
-            analyzed_data = self.analyze_with_gemini(all_slide_texts, Path(file_path).name)
+            # LLMが取りこぼした価格・数量・納期は表の値で補完
+            if not reused and analyzed_data.get('confidence_score'):
+                self._apply_table_fields(analyzed_data, table_fields)
+
+            # クライアント名・協力会社名の正規ID（表記ゆれを名寄せ）
+            if self.entities:
+                analyzed_data['client_id'] = self.entities.resolve(analyzed_data.get('client_name'))
+                analyzed_data['partner_company_ids'] = self.entities.resolve_all(
+                    analyzed_data.get('partner_companies'))
 
             # 結果を構築
             result = {
                 'file_info': {
                     'file_name': Path(file_path).name,
                     'processed_at': datetime.now().isoformat(),
-                    'slide_count': len(presentation.slides),
-                    'processing_method': 'gemini_api_v4.0'
+                    'slide_count': len(slides),
+                    'processing_method': 'gemini_api_v4.0',
+                    'reused_analysis': reused,
+                    # 文書プロパティ（タイトル・作成者・改訂番号等、カタログと同じ項目）
+                    'doc_properties': file_info_properties(file_path)
                 },
                 'gemini_analysis': analyzed_data,
+                'table_fields': table_fields,
+                'slide_hashes': [pptx_extraction.slide_hash(texts) for texts in slides],
                 'slide_texts_sample': '\n'.join(all_slide_texts[:5])[:1000]  # サンプルのみ保存
             }
 
             return result
 
+        except PptxGuardError as e:
+            return {
+                'error': str(e),
+                'guard_status': e.status,
+                'file_name': Path(file_path).name,
+                'processed_at': datetime.now().isoformat()
+            }
         except Exception as e:
             return {
                 'error': str(e),
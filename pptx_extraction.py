@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+PowerPointテキスト抽出の共通処理
+正規表現版・Gemini版の両プロセッサーとガードのワーカーが共有する。
+python-pptxは実際に読み込むときまでimportしない
+"""
+
+import hashlib
+import json
+import re
+import unicodedata
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from pptx_guard import PptxGuard
+
+
+# 抽出処理のバージョン（抽出結果が変わる修正をしたら上げる、text_store の保存先が変わる）
+EXTRACTOR_VERSION = 1
+
+
+def load_presentation(file_path: str):
+    """python-pptxでファイルを開く（python-pptxはここで初めてimport）"""
+    try:
+        from pptx import Presentation
+    except ImportError:
+        raise ImportError(
+            "python-pptx is not installed. "
+            "Please install it with: pip install python-pptx"
+        )
+    return Presentation(file_path)
+
+
+# 数値セル（「1,000円」「¥1,000」「500個」等）
+_NUMBER_CELL = re.compile(r'^[¥\\]?\s*(\d{1,3}(?:,\d{3})+|\d+)(\.\d+)?\s*(?:円|個|枚|部|本|セット|名|人|件)?$')
+
+
+def extract_text_from_slide(slide, include_tables: bool = True) -> List[str]:
+    """スライドからテキストを抽出（include_tables=Falseなら表を除く）"""
+    texts = []
+
+    for shape in slide.shapes:
+        try:
+            text = extract_text_from_shape(shape, include_tables)
+            if text.strip():
+                texts.append(text.strip())
+        except Exception:
+            # エラーが発生してもスキップして続行
+            continue
+
+    return texts
+
+
+def extract_text_from_shape(shape, include_tables: bool = True) -> str:
+    """図形からテキストを抽出"""
+    text = ""
+
+    # テキストフレーム
+    if hasattr(shape, 'text_frame') and shape.text_frame:
+        text += shape.text_frame.text + "\n"
+
+    # テーブル
+    if include_tables and hasattr(shape, 'table'):
+        try:
+            table = shape.table
+            for row in table.rows:
+                row_text = []
+                for cell in row.cells:
+                    cell_text = cell.text.strip()
+                    if cell_text:
+                        row_text.append(cell_text)
+                if row_text:
+                    text += " | ".join(row_text) + "\n"
+        except:
+            pass  # テーブルが存在しない場合はスキップ
+
+    # グループ化された図形
+    if hasattr(shape, 'shapes'):
+        for sub_shape in shape.shapes:
+            text += extract_text_from_shape(sub_shape, include_tables)
+
+    return text
+
+
+def parse_cell(text: str):
+    """セルの値を型付け（金額・数量は int / float、空欄は None、それ以外は文字列）"""
+    text = unicodedata.normalize('NFKC', text).strip()
+    if not text:
+        return None
+    match = _NUMBER_CELL.match(text)
+    if not match:
+        return text
+    integer = int(match.group(1).replace(',', ''))
+    return integer + float(match.group(2)) if match.group(2) else integer
+
+
+def table_record(table) -> Dict[str, Any]:
+    """表を「ヘッダー行 + 型付きセルの行」として抽出"""
+    rows = [[cell.text.strip() for cell in row.cells] for row in table.rows]
+    if not rows:
+        return {'header': [], 'rows': []}
+    return {
+        'header': [unicodedata.normalize('NFKC', cell) for cell in rows[0]],
+        'rows': [[parse_cell(cell) for cell in row] for row in rows[1:]],
+    }
+
+
+def extract_tables_from_slide(slide) -> List[Dict[str, Any]]:
+    """スライド内の表（グループ内を含む）を構造化して抽出"""
+    tables = []
+
+    def walk(shapes):
+        for shape in shapes:
+            try:
+                if getattr(shape, 'has_table', False):
+                    tables.append(table_record(shape.table))
+                elif hasattr(shape, 'shapes'):
+                    walk(shape.shapes)
+            except Exception:
+                # エラーが発生してもスキップして続行
+                continue
+
+    walk(slide.shapes)
+    return tables
+
+
+def read_slide_content(file_path: str, guard: Optional[PptxGuard] = None,
+                       ocr=None, store=None) -> List[Dict[str, Any]]:
+    """
+    スライドごとのテキストと表を読み込み
+
+    Args:
+        guard: 読み込みガード（指定時はワーカー経由）
+        ocr: SlideOCR（指定時は画像のOCRテキストをスライドのテキストに追加）
+        store: TextStore（指定時は同じ内容のデッキの抽出結果を再利用し、.pptxを開かない）
+
+    Returns:
+        スライドごとの {'texts': 表を含むテキストブロック,
+                        'body_texts': 表を除くテキストブロック,
+                        'tables': 構造化した表}
+    """
+    if store:
+        return store.read(file_path, lambda: read_slide_content(file_path, guard, ocr), store.variant(ocr))
+
+    if guard:
+        slides = guard.extract_slide_content(file_path)
+    else:
+        presentation = load_presentation(file_path)
+        slides = [
+            {
+                'texts': extract_text_from_slide(slide),
+                'body_texts': extract_text_from_slide(slide, include_tables=False),
+                'tables': extract_tables_from_slide(slide),
+            }
+            for slide in presentation.slides
+        ]
+
+    if ocr:
+        from slide_ocr import merge_slide_texts
+        ocr_slides = ocr.slide_texts(file_path)
+        for key in ('texts', 'body_texts'):
+            merged = merge_slide_texts([slide[key] for slide in slides], ocr_slides)
+            for slide, texts in zip(slides, merged):
+                slide[key] = texts
+
+    return slides
+
+
+def read_slide_texts(file_path: str, guard: Optional[PptxGuard] = None,
+                     ocr=None, store=None) -> List[List[str]]:
+    """
+    スライドごとのテキストブロックを読み込み（表は「 | 」区切りの行として含む）
+
+    Args:
+        guard: 読み込みガード（指定時はワーカー経由）
+        ocr: SlideOCR（指定時は画像のOCRテキストをスライドのテキストに追加）
+        store: TextStore（指定時は抽出結果を再利用）
+    """
+    return [slide['texts'] for slide in read_slide_content(file_path, guard, ocr, store)]
+
+
+def slide_hash(slide_texts: List[str]) -> str:
+    """スライドのテキスト内容のハッシュ（変更検出用）"""
+    return hashlib.sha1("\n".join(slide_texts).encode('utf-8')).hexdigest()
+
+
+def load_previous_result(json_path) -> Optional[Dict[str, Any]]:
+    """前回の出力JSONを読み込み（無い・壊れている・エラー結果の場合はNone）"""
+    path = Path(json_path)
+    if not path.exists():
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except Exception:
+        return None
+    if not isinstance(data, dict) or 'error' in data:
+        return None
+    return data
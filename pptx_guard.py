@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+PowerPoint読み込みガード
+巨大な動画・画像を含む.pptxでバッチ処理がメモリ不足にならないよう、
+読み込み前にzipエントリのサイズを検査し、メディアを除去したうえで
+メモリ・時間制限付きのワーカープロセスでテキストを抽出する
+
+ワーカーは常駐させて使い回し（max_tasks_per_worker 件ごとに入れ替え）、
+forkserver（Windowsは spawn）で起動する。スレッドから呼ばれても、
+ロックを保持したままの親プロセスを fork しないため
+"""
+
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import zipfile
+from pathlib import Path
+from typing import Dict, List, Any, Optional
+
+try:
+    import resource
+except ImportError:
+    # Windowsでは resource モジュールが無いため、時間制限のみ適用する
+    resource = None
+
+
+# テキスト抽出に不要なバイナリ部品（画像・動画・埋め込みファイル）
+MEDIA_PREFIXES = ('ppt/media/', 'ppt/embeddings/')
+
+
+class PptxGuardError(Exception):
+    """ガードにより処理を打ち切った場合の例外"""
+
+    def __init__(self, status: str, message: str):
+        super().__init__(message)
+        # oversize / timeout / memory / crashed / invalid
+        self.status = status
+
+
+class PptxGuard:
+    """メモリ・時間制限付きPowerPoint読み込みクラス"""
+
+    DEFAULT_LIMITS = {
+        'max_part_mb': 64,            # メディア以外の単一部品（XML）の上限
+        'max_parts_total_mb': 256,    # メディア以外の部品の展開後合計の上限
+        'strip_media_over_mb': 20,    # メディア合計がこれを超えたら除去したコピーを読む
+        'memory_mb': 1024,            # ワーカーのアドレス空間上限（起動直後の使用量に加算、resource対応OSのみ）
+        'timeout_sec': 120,           # 1ファイルあたりの処理時間上限
+        'max_tasks_per_worker': 50,   # ワーカーを入れ替えるまでの処理件数（断片化したメモリを解放）
+    }
+
+    def __init__(self, limits: Optional[Dict[str, Any]] = None, workers: Optional[int] = None):
+        """
+        初期化
+
+        Args:
+            limits: DEFAULT_LIMITS を上書きする制限値
+            workers: 同時に使うワーカーの上限（省略時はCPU数、超えた分は空きを待つ）
+        """
+        self.limits = dict(self.DEFAULT_LIMITS)
+        if limits:
+            self.limits.update(limits)
+        self.workers = max(1, workers or os.cpu_count() or 1)
+
+        start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        self._context = multiprocessing.get_context(start_method)
+        self._idle = []
+        self._started = 0
+        self._cond = threading.Condition()
+
+    def inspect_package(self, file_path: str) -> Dict[str, Any]:
+        """
+        zipエントリを読み込まずにサイズだけ検査
+
+        Returns:
+            status（ok / oversize / invalid）とサイズ情報
+        """
+        mb = 1024 * 1024
+        report = {
+            'status': 'ok',
+            'reason': '',
+            'parts_total': 0,
+            'media_total': 0,
+            'largest_part': 0,
+        }
+
+        try:
+            with zipfile.ZipFile(file_path) as package:
+                infos = package.infolist()
+        except (zipfile.BadZipFile, OSError) as e:
+            report['status'] = 'invalid'
+            report['reason'] = f"Not a valid .pptx package: {e}"
+            return report
+
+        for info in infos:
+            if info.filename.startswith(MEDIA_PREFIXES):
+                report['media_total'] += info.file_size
+            else:
+                report['parts_total'] += info.file_size
+                report['largest_part'] = max(report['largest_part'], info.file_size)
+
+        if report['largest_part'] > self.limits['max_part_mb'] * mb:
+            report['status'] = 'oversize'
+            report['reason'] = (
+                f"Part too large: {report['largest_part'] // mb}MB "
+                f"(limit {self.limits['max_part_mb']}MB)"
+            )
+        elif report['parts_total'] > self.limits['max_parts_total_mb'] * mb:
+            report['status'] = 'oversize'
+            report['reason'] = (
+                f"Uncompressed parts too large: {report['parts_total'] // mb}MB "
+                f"(limit {self.limits['max_parts_total_mb']}MB)"
+            )
+
+        return report
+
+    def extract_slide_texts(self, file_path: str) -> List[List[str]]:
+        """
+        ワーカープロセスでスライドごとのテキストを抽出
+
+        Returns:
+            スライドごとのテキストブロックのリスト
+
+        Raises:
+            PptxGuardError: サイズ超過・タイムアウト・メモリ超過時
+        """
+        return [slide['texts'] for slide in self.extract_slide_content(file_path)]
+
+    def extract_slide_content(self, file_path: str) -> List[Dict[str, Any]]:
+        """
+        ワーカープロセスでスライドごとのテキストと表を抽出
+
+        Returns:
+            スライドごとの {'texts', 'body_texts', 'tables'}（pptx_extraction.read_slide_content と同じ形式）
+
+        Raises:
+            PptxGuardError: サイズ超過・タイムアウト・メモリ超過時
+        """
+        report = self.inspect_package(file_path)
+        if report['status'] != 'ok':
+            raise PptxGuardError(report['status'], report['reason'])
+
+        strip_media = report['media_total'] > self.limits['strip_media_over_mb'] * 1024 * 1024
+
+        worker = self._acquire()
+        reusable = False
+        try:
+            try:
+                status, payload = worker.run(str(file_path), strip_media, self.limits['timeout_sec'])
+            except (EOFError, OSError):
+                # 結果を返さずに終了（OOM killer等）
+                raise PptxGuardError('crashed', 'Extraction worker exited unexpectedly')
+            # 読み込みエラーはワーカーを使い続ける（メモリ超過後は入れ替える）
+            reusable = status in ('ok', 'error') and worker.reusable
+        finally:
+            self._release(worker, reusable)
+
+        if status == 'ok':
+            return payload
+        if status == 'memory':
+            raise PptxGuardError(
+                'memory',
+                f"Memory limit exceeded ({self.limits['memory_mb']}MB)"
+            )
+        raise RuntimeError(payload)
+
+    def _acquire(self) -> '_GuardWorker':
+        """空いているワーカーを取得（上限に達していなければ起動、達していれば空きを待つ）"""
+        with self._cond:
+            while not self._idle and self._started >= self.workers:
+                self._cond.wait()
+            if self._idle:
+                return self._idle.pop()
+            self._started += 1
+
+        try:
+            return _GuardWorker(self._context, self.limits['memory_mb'], self.limits['max_tasks_per_worker'])
+        except BaseException:
+            with self._cond:
+                self._started -= 1
+                self._cond.notify()
+            raise
+
+    def _release(self, worker: '_GuardWorker', reusable: bool):
+        """ワーカーを返却（タイムアウト・クラッシュ・処理件数の上限に達したものは停止）"""
+        if not reusable:
+            worker.stop()
+        with self._cond:
+            if reusable:
+                self._idle.append(worker)
+            else:
+                self._started -= 1
+            self._cond.notify()
+
+    def start(self, count: Optional[int] = None):
+        """ワーカーを先に起動しておく（常駐サービスの起動時、最初のリクエストで待たせない）"""
+        count = min(count or self.workers, self.workers)
+        with self._cond:
+            needed = max(0, count - self._started)
+            self._started += needed
+        for _ in range(needed):
+            worker = None
+            try:
+                worker = _GuardWorker(self._context, self.limits['memory_mb'], self.limits['max_tasks_per_worker'])
+                worker.wait_ready(self.limits['timeout_sec'])
+            except BaseException:
+                if worker:
+                    worker.stop()
+                with self._cond:
+                    self._started -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._idle.append(worker)
+                self._cond.notify()
+
+    def close(self):
+        """待機中のワーカーを停止"""
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._started -= len(idle)
+        for worker in idle:
+            worker.stop()
+
+
+class _GuardWorker:
+    """常駐ワーカープロセス（パイプで1件ずつ処理を依頼）"""
+
+    def __init__(self, context, memory_mb: int, max_tasks: int):
+        self.max_tasks = max(1, max_tasks)
+        self.tasks = 0
+        self.ready = False
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_loop,
+            args=(child_conn, memory_mb, self.max_tasks),
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+
+    @property
+    def reusable(self) -> bool:
+        return self.tasks < self.max_tasks and self.process.is_alive()
+
+    def wait_ready(self, timeout_sec: float):
+        """起動（python-pptxの読み込み）の完了を待つ"""
+        if self.ready:
+            return
+        if not self.conn.poll(timeout_sec):
+            raise PptxGuardError('timeout', f"Extraction worker did not start within {timeout_sec}s")
+        self.conn.recv()
+        self.ready = True
+
+    def run(self, file_path: str, strip_media: bool, timeout_sec: float):
+        """1ファイルを抽出（タイムアウト時は PptxGuardError、呼び出し側でワーカーを停止する）"""
+        self.tasks += 1
+        self.conn.send((file_path, strip_media))
+        self.wait_ready(timeout_sec)
+        if not self.conn.poll(timeout_sec):
+            raise PptxGuardError('timeout', f"Extraction timed out after {timeout_sec}s")
+        return self.conn.recv()
+
+    def stop(self):
+        self.conn.close()
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process.join()
+
+
+def _address_space_bytes() -> int:
+    """現在のアドレス空間の大きさ（取得できなければ0）"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[0]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+
+def _apply_memory_limit(memory_mb: int):
+    """ワーカープロセスのアドレス空間を制限（起動直後の使用量 + memory_mb）"""
+    if resource is None or not memory_mb:
+        return
+    # インタプリタ・python-pptx の読み込み分は環境で大きく変わるため上限に含めない
+    limit = _address_space_bytes() + memory_mb * 1024 * 1024
+    try:
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ValueError, OSError):
+        pass
+
+
+def _strip_media(src_path: str, dst_path: str):
+    """メディア部品を空にした.pptxのコピーをストリーミングで作成"""
+    with zipfile.ZipFile(src_path) as zin, \
+            zipfile.ZipFile(dst_path, 'w', zipfile.ZIP_DEFLATED) as zout:
+        for info in zin.infolist():
+            if info.filename.startswith(MEDIA_PREFIXES):
+                # 関連付けを壊さないようエントリ自体は残す
+                zout.writestr(info.filename, b'')
+                continue
+            with zin.open(info) as src, zout.open(info.filename, 'w') as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+
+
+def _extract(file_path: str, strip_media: bool):
+    """1ファイルを抽出して (状態, 結果) を返す"""
+    import pptx_extraction
+
+    temp_dir = None
+    try:
+        open_path = file_path
+        if strip_media:
+            temp_dir = tempfile.mkdtemp(prefix='pptx_guard_')
+            open_path = os.path.join(temp_dir, Path(file_path).name)
+            _strip_media(file_path, open_path)
+
+        return 'ok', pptx_extraction.read_slide_content(open_path)
+    except MemoryError:
+        return 'memory', 'MemoryError'
+    except Exception as e:
+        return 'error', str(e)
+    finally:
+        if temp_dir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def _worker_loop(conn, memory_mb: int, max_tasks: int):
+    """ワーカープロセス本体（python-pptxを読み込み、制限を掛けてから max_tasks 件まで処理）"""
+    # python-pptx（lxml）の読み込み分を制限の基準に含める
+    try:
+        import pptx  # noqa: F401
+    except ImportError:
+        pass
+
+    _apply_memory_limit(memory_mb)
+    try:
+        conn.send(('ready', None))
+        for _ in range(max_tasks):
+            try:
+                file_path, strip_media = conn.recv()
+            except EOFError:
+                return
+            status, payload = _extract(file_path, strip_media)
+            try:
+                conn.send((status, payload))
+            except MemoryError:
+                conn.send(('memory', 'MemoryError'))
+            if status == 'memory':
+                return
+    finally:
+        conn.close()
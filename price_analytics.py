@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+単価・数量の横断分析スクリプト
+バッチ処理で生成された全JSONを一括で読み込み、NumPy/pandasのベクトル演算で
+価格・数量を正規化して、ノベルティ別・クライアント別・年別の統計と
+ヒストグラム、外れ値を一度に算出する
+"""
+
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+from entity_index import EntityIndex, index_path
+from output_writer import output_json_files
+
+# numpy / pandas は分析時に初めてimport（_load_dependencies）
+np = None
+pd = None
+
+# レポートのファイル名（.jsonにしない: JSON_processor.js は .json を全て取り込み対象にする）
+REPORT_NAME = '_price_analytics.jsonl'
+
+
+# 妥当な値の範囲（PowerPointProcessor._clean_number と同じ 1円～10億円）
+VALUE_MIN = 1
+VALUE_MAX = 1000000000
+
+# 外れ値判定のしきい値（修正Zスコア）
+OUTLIER_Z = 3.5
+
+# ヒストグラムのビン数（log10(円) で 1円～10億円を等分）
+HISTOGRAM_BIN_COUNT = 36
+
+DIMENSIONS = {
+    'novelty': 'ノベルティ別',
+    'client': 'クライアント別',
+    'year': '年別',
+}
+
+
+def _load_dependencies():
+    """numpy / pandas を読み込む（未インストールなら ImportError）"""
+    global np, pd
+    if pd is not None:
+        return
+    try:
+        import numpy
+        import pandas
+    except ImportError:
+        raise ImportError(
+            "numpy / pandas is not installed. "
+            "Please install it with: pip install numpy pandas"
+        )
+    np, pd = numpy, pandas
+
+
+def _histogram_bins():
+    """ヒストグラムのビンの境界（log10(円)）"""
+    return np.linspace(0, 9, HISTOGRAM_BIN_COUNT + 1)
+
+
+def _load_json(path: Path) -> Optional[Dict[str, Any]]:
+    """JSONを読み込み（壊れたファイルはスキップ）"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception:
+        return None
+
+
+def _first(values) -> Optional[str]:
+    """リストの先頭要素（空ならNone）"""
+    return values[0] if values else None
+
+
+def load_results(folder_path: str, workers: int = 16) -> 'pd.DataFrame':
+    """
+    フォルダ内の全結果JSONを列指向で一括読み込み
+
+    Gemini版（gemini_analysis）と正規表現版（summary）の両方に対応し、
+    1ファイル1行（正規表現版は検出した価格ごとに1行）の生データを返す
+    """
+    _load_dependencies()
+
+    json_files = output_json_files(folder_path)
+
+    # ファイルI/Oはスレッドで並列化
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        documents = list(executor.map(_load_json, json_files))
+
+    columns = {
+        'file': [], 'client': [], 'client_id': [], 'date': [], 'novelty': [],
+        'unit_price': [], 'order_quantity': [], 'total_cost': [],
+    }
+
+    def append(file, client, client_id, date, novelties, unit_price, quantity, total_cost):
+        columns['file'].append(file)
+        columns['client'].append(client)
+        columns['client_id'].append(client_id)
+        columns['date'].append(date)
+        columns['novelty'].append(novelties or [None])
+        columns['unit_price'].append(unit_price)
+        columns['order_quantity'].append(quantity)
+        columns['total_cost'].append(total_cost)
+
+    for path, data in zip(json_files, documents):
+        if not isinstance(data, dict) or 'error' in data:
+            continue
+
+        file_name = data.get('file_info', {}).get('file_name', path.name)
+
+        if 'gemini_analysis' in data:
+            g = data['gemini_analysis'] or {}
+            append(
+                file_name, g.get('client_name'), g.get('client_id'), g.get('event_date'),
+                g.get('novelty_items'), g.get('unit_price'),
+                g.get('order_quantity'), g.get('total_cost'),
+            )
+        elif 'summary' in data:
+            s = data['summary']
+            prices = s.get('all_prices') or [None]
+            quantity = _first(s.get('all_quantities'))
+            for price in prices:
+                append(
+                    file_name, _first(s.get('all_clients')), _first(s.get('all_client_ids')),
+                    _first(s.get('all_dates')),
+                    s.get('all_novelties'), price, quantity, None,
+                )
+
+    return pd.DataFrame(columns)
+
+
+def _to_number(series: 'pd.Series') -> 'pd.Series':
+    """「1,000円」「¥1,000」等をまとめて数値化し、範囲外はNaNにする"""
+    cleaned = series.astype('string').str.replace(r'[,\s円¥￥\\]', '', regex=True)
+    values = pd.to_numeric(cleaned, errors='coerce')
+    return values.where((values >= VALUE_MIN) & (values <= VALUE_MAX))
+
+
+def normalize(frame: 'pd.DataFrame') -> 'pd.DataFrame':
+    """価格・数量・年・名称をベクトル演算で正規化"""
+    frame = frame.explode('novelty', ignore_index=True)
+
+    frame['unit_price'] = _to_number(frame['unit_price'])
+    frame['order_quantity'] = _to_number(frame['order_quantity'])
+    frame['total_cost'] = _to_number(frame['total_cost'])
+
+    # 単価が無い場合は 総費用 / 数量 で補完
+    derived = frame['total_cost'] / frame['order_quantity']
+    frame['unit_price'] = frame['unit_price'].fillna(derived.round())
+
+    frame['year'] = frame['date'].astype('string').str.extract(r'(\d{4})', expand=False)
+
+    for column in ('client', 'novelty'):
+        frame[column] = (
+            frame[column].astype('string')
+            .str.normalize('NFKC')
+            .str.replace(r'(株式会社|有限会社|\(株\)|様)', '', regex=True)
+            .str.strip()
+            .replace('', pd.NA)
+        )
+
+    return frame
+
+
+def canonical_clients(frame: 'pd.DataFrame', index: EntityIndex) -> 'pd.DataFrame':
+    """
+    クライアント名を名寄せインデックスの正規IDの表示名に置き換え
+
+    出力に正規IDがあればそれを使い、無ければ名前をインデックスで参照する
+    （参照のみで新しいIDは作らない）。解決できない名前はそのまま残す
+    """
+    ids = pd.to_numeric(frame['client_id'], errors='coerce')
+    missing = ids.isna() & frame['client'].notna()
+    ids[missing] = frame.loc[missing, 'client'].map(lambda name: index.resolve(name, create=False))
+    names = ids.map(lambda entity_id: index.name(int(entity_id)) if pd.notna(entity_id) else None)
+    frame['client'] = names.astype('string').fillna(frame['client'])
+    return frame
+
+
+def flag_outliers(frame: 'pd.DataFrame', dimension: str) -> 'pd.Series':
+    """グループ内の修正Zスコア（中央値・MAD基準）で単価の外れ値を判定"""
+    grouped = frame.groupby(dimension)['unit_price']
+    median = grouped.transform('median')
+    mad = (frame['unit_price'] - median).abs().groupby(frame[dimension]).transform('median')
+    z = 0.6745 * (frame['unit_price'] - median) / mad.replace(0, np.nan)
+    return z.abs() > OUTLIER_Z
+
+
+def dimension_statistics(frame: 'pd.DataFrame', dimension: str) -> Dict[str, Any]:
+    """1つの軸についての統計・ヒストグラム・外れ値"""
+    priced = frame.dropna(subset=['unit_price', dimension])
+    if priced.empty:
+        return {'stats': {}, 'histograms': {}, 'outliers': []}
+
+    grouped = priced.groupby(dimension)
+    stats = grouped.agg(
+        count=('unit_price', 'size'),
+        files=('file', 'nunique'),
+        mean=('unit_price', 'mean'),
+        median=('unit_price', 'median'),
+        std=('unit_price', 'std'),
+        min=('unit_price', 'min'),
+        max=('unit_price', 'max'),
+        quantity_median=('order_quantity', 'median'),
+    )
+    quantiles = grouped['unit_price'].quantile([0.25, 0.75]).unstack()
+    stats['p25'] = quantiles[0.25]
+    stats['p75'] = quantiles[0.75]
+    stats = stats.round(1).sort_values('count', ascending=False)
+
+    # 全グループ分のヒストグラムを1回のcrosstabで集計
+    bins = pd.cut(np.log10(priced['unit_price']), _histogram_bins(), include_lowest=True, labels=False)
+    histograms = pd.crosstab(priced[dimension], bins).reindex(
+        columns=range(HISTOGRAM_BIN_COUNT), fill_value=0
+    )
+
+    outlier_mask = flag_outliers(priced, dimension)
+    outliers = priced.loc[outlier_mask, ['file', dimension, 'unit_price']]
+
+    return {
+        'stats': json.loads(stats.to_json(orient='index', force_ascii=False)),
+        'histograms': {str(k): v.tolist() for k, v in histograms.iterrows()},
+        'outliers': json.loads(outliers.to_json(orient='records', force_ascii=False)),
+    }
+
+
+def analyze_folder(folder_path: str) -> Dict[str, Any]:
+    """フォルダ全体の価格・数量分析レポートを作成（numpy / pandas が無ければ ImportError）"""
+    frame = normalize(load_results(folder_path))
+
+    # 名寄せインデックスがあれば、表記ゆれのあるクライアントを正規IDでまとめて集計
+    if index_path(folder_path).exists() and not frame.empty:
+        frame = canonical_clients(frame, EntityIndex(index_path(folder_path)))
+
+    report = {
+        'files': int(frame['file'].nunique()) if not frame.empty else 0,
+        'priced_rows': int(frame['unit_price'].notna().sum()) if not frame.empty else 0,
+        'histogram_bin_edges_yen': np.round(10 ** _histogram_bins()).astype(int).tolist(),
+        'dimensions': {},
+    }
+
+    if frame.empty:
+        return report
+
+    for dimension in DIMENSIONS:
+        report['dimensions'][dimension] = dimension_statistics(frame, dimension)
+
+    return report
+
+
+def main():
+    """メイン処理"""
+    if len(sys.argv) > 1:
+        folder = sys.argv[1]
+    else:
+        folder = input("Enter folder path to analyze: ").strip()
+
+    if not Path(folder).exists():
+        print(f"ERROR: Folder not found: {folder}")
+        sys.exit(1)
+
+    try:
+        report = analyze_folder(folder)
+    except ImportError as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+
+    # 1行のJSONとして保存（.jsonl: 他の管理ファイルと同じく出力JSONとして取り込まれない）
+    output_path = Path(folder) / REPORT_NAME
+    with open(output_path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(report, ensure_ascii=False) + "\n")
+
+    print("=" * 60)
+    print("PRICE / QUANTITY ANALYTICS")
+    print("=" * 60)
+    print(f"Files: {report['files']}")
+    print(f"Priced rows: {report['priced_rows']}")
+
+    for dimension, label in DIMENSIONS.items():
+        section = report['dimensions'].get(dimension, {})
+        stats = section.get('stats', {})
+        print(f"\n【{label}】 {len(stats)} groups, {len(section.get('outliers', []))} outliers")
+        for name, row in list(stats.items())[:10]:
+            print(f"  {name}: n={row['count']} median=¥{row['median']:,.0f} "
+                  f"(¥{row['min']:,.0f} - ¥{row['max']:,.0f})")
+
+    print(f"\nReport saved to: {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,423 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+常駐型のPowerPoint処理サービス（ローカルHTTP API）
+python-pptx・LLMバックエンド・使用状況ログを起動時に一度だけ読み込み、
+プロセッサーを常駐させて1デッキごとの起動コストを無くす。
+
+- asyncio のストリームで受け付け、解析はスレッドプールのワーカーで実行
+- Gemini版プロセッサーは全クライアントで1つを共有する
+  （RPM制限・無料枠の使用状況ログ・リクエストの記録が全リクエスト共通になる）
+
+API:
+    GET  /health                    稼働状況・処理件数・平均処理時間
+    GET  /usage                     LLMの使用状況（今日・今月・無料枠）
+    POST /process                   JSON本文 {"path", "mode", "format", "save"} でファイルを処理
+    POST /process?mode=&format=&filename=
+                                    本文に.pptxのバイト列をアップロードして処理
+
+    mode: regex（正規表現版、既定）/ gemini
+    format: json（既定）/ markdown（gemini のみ）
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http import HTTPStatus
+from pathlib import Path
+from typing import Dict, List, Any, Optional, Tuple
+from urllib.parse import urlsplit, parse_qs
+
+import pptx_extraction
+from llm_backends import BACKENDS
+from output_writer import dumps, write_json_output, write_text_if_changed
+from powerpoint_processor import PowerPointProcessor
+from pptx_guard import PptxGuard
+from text_store import add_store_arguments, store_from_args
+
+
+MODES = ('regex', 'gemini')
+FORMATS = ('json', 'markdown')
+
+# リクエストヘッダーの上限（行数・1行の長さ）
+MAX_HEADER_LINES = 100
+MAX_LINE_BYTES = 8192
+
+
+class ServiceError(Exception):
+    """HTTPエラーとして返す例外"""
+
+    def __init__(self, status: HTTPStatus, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class ProcessingService:
+    """プロセッサーを常駐させる処理サービス"""
+
+    def __init__(self, workers: int = 4, backend: Optional[str] = 'gemini',
+                 overflow_backend: Optional[str] = None, table_first: bool = False,
+                 guard: bool = True, roots: Optional[List[str]] = None,
+                 max_upload_mb: int = 200, store=None):
+        """
+        初期化
+
+        Args:
+            workers: 解析を実行するスレッド数
+            backend: Gemini版プロセッサーのLLMバックエンド（Noneなら正規表現版のみ）
+            overflow_backend: 従量バックエンドの無料枠超過後に切り替えるバックエンド
+            table_first: 表から項目が全て解決できたデッキはLLMを呼ばない
+            guard: 読み込みガード（メモリ・時間制限付きワーカー）を使うか
+            roots: path指定で処理を許可するフォルダ（省略時は制限なし）
+            max_upload_mb: アップロードの最大サイズ
+            store: TextStore（指定時は同じ内容のデッキの抽出結果を再利用）
+        """
+        self.workers = workers
+        self.backend = backend
+        self.overflow_backend = overflow_backend
+        self.table_first = table_first
+        # 保護付きのワーカーは並列数だけ常駐させる（リクエストごとにプロセスを起動しない）
+        self.guard = PptxGuard(workers=workers) if guard else None
+        self.roots = [Path(root).resolve() for root in roots or []]
+        self.max_upload_bytes = max_upload_mb * 1024 * 1024
+        self.store = store
+
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='pptx-worker')
+        self.regex_processor = PowerPointProcessor(guard=self.guard, store=store)
+        self.gemini_processor = None
+
+        self.started_at = time.time()
+        self._stats_lock = threading.Lock()
+        self.stats = {mode: {'requests': 0, 'errors': 0, 'total_ms': 0} for mode in MODES}
+
+    def warm_up(self):
+        """python-pptx・LLMバックエンド・保護付きのワーカーを読み込んでおく（起動時に1回）"""
+        import pptx  # noqa: F401
+
+        if self.guard:
+            self.guard.start()
+
+        if self.backend:
+            from powerpoint_processor_gemini import GeminiPowerPointProcessor
+            # 全クライアントで共有（RPM制限・使用状況ログを一元管理）
+            self.gemini_processor = GeminiPowerPointProcessor(
+                guard=self.guard,
+                backend=self.backend,
+                overflow_backend=self.overflow_backend,
+                table_first=self.table_first,
+                store=self.store,
+            )
+
+    def _check_path(self, path: str) -> Path:
+        """処理対象のパスを検証"""
+        file_path = Path(path).resolve()
+        if self.roots and not any(root == file_path or root in file_path.parents for root in self.roots):
+            raise ServiceError(HTTPStatus.FORBIDDEN, f"Path is outside the allowed roots: {path}")
+        if file_path.suffix.lower() != '.pptx':
+            raise ServiceError(HTTPStatus.BAD_REQUEST, f"Not a .pptx file: {path}")
+        if not file_path.is_file():
+            raise ServiceError(HTTPStatus.NOT_FOUND, f"File not found: {path}")
+        return file_path
+
+    def process_file(self, file_path: Path, mode: str, output_format: str,
+                     save: bool = False, display_name: Optional[str] = None) -> Tuple[Dict[str, Any], Optional[str]]:
+        """
+        1ファイルを処理（ワーカースレッドで実行）
+
+        Args:
+            save: Trueなら結果のJSON（・Markdown）をファイルの隣に保存
+            display_name: アップロード時の元のファイル名
+
+        Returns:
+            (処理結果, Markdown（format=markdown の場合のみ）)
+        """
+        json_path = file_path.with_suffix('.json')
+        # path指定時は前回の出力があれば変更の無い部分の解析を再利用
+        previous = pptx_extraction.load_previous_result(json_path) if display_name is None else None
+
+        if mode == 'gemini':
+            result = self.gemini_processor.process_powerpoint(str(file_path), previous=previous)
+        else:
+            result = self.regex_processor.process_powerpoint(str(file_path), previous=previous)
+
+        if 'error' in result:
+            return result, None
+
+        # 保存時は内容が変わらなければ書き換えない（ディスク上の結果をそのまま返す）
+        if save:
+            result, _ = write_json_output(json_path, result)
+
+        markdown_text = None
+        if output_format == 'markdown':
+            from markdown_generator import generate_markdown_from_json
+            markdown_text = generate_markdown_from_json(result, deterministic=save)
+            if save:
+                write_text_if_changed(file_path.with_suffix('.md'), markdown_text)
+
+        return result, markdown_text
+
+    def process_upload(self, body: bytes, filename: str, mode: str,
+                       output_format: str) -> Tuple[Dict[str, Any], Optional[str]]:
+        """アップロードされた.pptxを一時フォルダに保存して処理（ワーカースレッドで実行）"""
+        # ファイル名（【クライアント名様】等）も分析のヒントになるため元の名前で保存
+        with tempfile.TemporaryDirectory(prefix='pptx_service_') as temp_dir:
+            temp_path = Path(temp_dir) / filename
+            temp_path.write_bytes(body)
+            return self.process_file(temp_path, mode, output_format, display_name=filename)
+
+    def _record(self, mode: str, elapsed_ms: int, error: bool):
+        """処理件数・処理時間を記録"""
+        with self._stats_lock:
+            stats = self.stats[mode]
+            stats['requests'] += 1
+            stats['errors'] += error
+            stats['total_ms'] += elapsed_ms
+
+    def health(self) -> Dict[str, Any]:
+        """稼働状況"""
+        with self._stats_lock:
+            modes = {
+                mode: {
+                    'requests': stats['requests'],
+                    'errors': stats['errors'],
+                    'avg_ms': round(stats['total_ms'] / stats['requests']) if stats['requests'] else None,
+                }
+                for mode, stats in self.stats.items()
+            }
+        return {
+            'status': 'ok',
+            'uptime_sec': round(time.time() - self.started_at),
+            'workers': self.workers,
+            'guard': self.guard is not None,
+            'modes': modes,
+            'llm_backend': self.gemini_processor.backend.describe() if self.gemini_processor else None,
+        }
+
+    def usage(self) -> Dict[str, Any]:
+        """LLMの使用状況（共有の使用状況ログから）"""
+        if not self.gemini_processor:
+            raise ServiceError(HTTPStatus.NOT_FOUND, "LLM backend is not enabled (started with --regex-only)")
+
+        processor = self.gemini_processor
+        today = datetime.now().strftime('%Y-%m-%d')
+        this_month = datetime.now().strftime('%Y-%m')
+        with processor._usage_lock:
+            daily = processor.usage_data.get('daily', {}).get(today, 0)
+            monthly = processor.usage_data.get('monthly', {}).get(this_month, 0)
+        return {
+            'backend': processor.backend.describe(),
+            'overflow_backend': processor.overflow_backend.describe() if processor.overflow_backend else None,
+            'today': daily,
+            'this_month': monthly,
+            'limits': processor.FREE_TIER_LIMITS,
+        }
+
+    async def handle_process(self, query: Dict[str, str], headers: Dict[str, str],
+                             body: bytes) -> Tuple[HTTPStatus, Dict[str, Any], Optional[str]]:
+        """POST /process"""
+        content_type = headers.get('content-type', '').split(';')[0].strip()
+        if content_type == 'application/json':
+            try:
+                request = json.loads(body.decode('utf-8') or '{}')
+            except (UnicodeDecodeError, json.JSONDecodeError) as e:
+                raise ServiceError(HTTPStatus.BAD_REQUEST, f"Invalid JSON body: {e}")
+            if not isinstance(request, dict) or not request.get('path'):
+                raise ServiceError(HTTPStatus.BAD_REQUEST, "JSON body requires 'path'")
+        else:
+            request = dict(query)
+
+        mode = request.get('mode', 'regex')
+        output_format = request.get('format', 'json')
+        if mode not in MODES:
+            raise ServiceError(HTTPStatus.BAD_REQUEST, f"Unknown mode: {mode} (choose from {', '.join(MODES)})")
+        if output_format not in FORMATS:
+            raise ServiceError(HTTPStatus.BAD_REQUEST, f"Unknown format: {output_format}")
+        if mode == 'gemini' and not self.gemini_processor:
+            raise ServiceError(HTTPStatus.BAD_REQUEST, "LLM backend is not enabled (started with --regex-only)")
+        if output_format == 'markdown' and mode != 'gemini':
+            raise ServiceError(HTTPStatus.BAD_REQUEST, "Markdown output requires mode=gemini")
+
+        loop = asyncio.get_running_loop()
+        started = time.monotonic()
+        if content_type == 'application/json':
+            file_path = self._check_path(request['path'])
+            save = request.get('save') in (True, 'true', '1')
+            job = lambda: self.process_file(file_path, mode, output_format, save=save)
+        else:
+            if not body:
+                raise ServiceError(HTTPStatus.BAD_REQUEST, "Upload a .pptx body or send a JSON body with 'path'")
+            filename = Path(request.get('filename') or 'upload.pptx').name
+            if not filename.lower().endswith('.pptx'):
+                raise ServiceError(HTTPStatus.BAD_REQUEST, f"Not a .pptx file: {filename}")
+            job = lambda: self.process_upload(body, filename, mode, output_format)
+
+        result, markdown_text = await loop.run_in_executor(self.executor, job)
+        elapsed_ms = round((time.monotonic() - started) * 1000)
+        self._record(mode, elapsed_ms, 'error' in result)
+
+        if 'error' in result:
+            status = HTTPStatus.UNPROCESSABLE_ENTITY
+            return status, result, None
+        return HTTPStatus.OK, result, markdown_text
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """1接続（1リクエスト）を処理"""
+        started = time.monotonic()
+        try:
+            try:
+                method, target, headers, body = await self._read_request(reader)
+                url = urlsplit(target)
+                query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+
+                if method == 'GET' and url.path == '/health':
+                    await self._respond(writer, HTTPStatus.OK, self.health(), started=started)
+                elif method == 'GET' and url.path == '/usage':
+                    await self._respond(writer, HTTPStatus.OK, self.usage(), started=started)
+                elif method == 'POST' and url.path == '/process':
+                    status, result, markdown_text = await self.handle_process(query, headers, body)
+                    await self._respond(writer, status, result, markdown_text, started=started)
+                else:
+                    raise ServiceError(HTTPStatus.NOT_FOUND, f"No route: {method} {url.path}")
+            except ServiceError as e:
+                await self._respond(writer, e.status, {'error': str(e)}, started=started)
+            except Exception as e:
+                print(f"ERROR: {e}")
+                await self._respond(writer, HTTPStatus.INTERNAL_SERVER_ERROR, {'error': str(e)}, started=started)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Tuple[str, str, Dict[str, str], bytes]:
+        """HTTPリクエストを読み込み（Content-Length 指定の本文のみ対応）"""
+        request_line = await reader.readline()
+        if len(request_line) > MAX_LINE_BYTES:
+            raise ServiceError(HTTPStatus.REQUEST_URI_TOO_LONG, "Request line too long")
+        parts = request_line.decode('latin-1').split()
+        if len(parts) != 3:
+            raise ServiceError(HTTPStatus.BAD_REQUEST, "Malformed request line")
+        method, target, _ = parts
+
+        headers = {}
+        for _ in range(MAX_HEADER_LINES):
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            if len(line) > MAX_LINE_BYTES:
+                raise ServiceError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "Header line too long")
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        else:
+            raise ServiceError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "Too many headers")
+
+        if 'chunked' in headers.get('transfer-encoding', '').lower():
+            raise ServiceError(HTTPStatus.LENGTH_REQUIRED, "Chunked uploads are not supported; send Content-Length")
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError:
+            raise ServiceError(HTTPStatus.BAD_REQUEST, "Invalid Content-Length")
+        if length > self.max_upload_bytes:
+            raise ServiceError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                               f"Upload exceeds {self.max_upload_bytes // (1024 * 1024)}MB")
+        body = await reader.readexactly(length) if length else b''
+        return method.upper(), target, headers, body
+
+    async def _respond(self, writer: asyncio.StreamWriter, status: HTTPStatus, data: Dict[str, Any],
+                       markdown_text: Optional[str] = None, started: Optional[float] = None):
+        """JSON（またはMarkdown）のレスポンスを送信"""
+        if markdown_text is not None:
+            payload = markdown_text.encode('utf-8')
+            content_type = 'text/markdown; charset=utf-8'
+        else:
+            payload = dumps(data, deterministic=False).encode('utf-8')
+            content_type = 'application/json; charset=utf-8'
+
+        elapsed_ms = round((time.monotonic() - started) * 1000) if started else 0
+        head = (
+            f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            f"X-Processing-Ms: {elapsed_ms}\r\n"
+            f"Connection: close\r\n\r\n"
+        )
+        writer.write(head.encode('latin-1') + payload)
+        await writer.drain()
+
+    async def serve(self, host: str, port: int):
+        """サービスを起動（Ctrl+Cで停止）"""
+        loop = asyncio.get_running_loop()
+        print("Warming up processors...")
+        await loop.run_in_executor(self.executor, self.warm_up)
+
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        print(f"Listening on http://{host}:{port} ({self.workers} workers)")
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        """ワーカーを停止"""
+        self.executor.shutdown(wait=False)
+        if self.guard:
+            self.guard.close()
+
+
+def main():
+    """メイン処理"""
+    parser = argparse.ArgumentParser(description="PowerPoint Processing Service (local HTTP API)")
+    parser.add_argument('--host', default='127.0.0.1', help="待ち受けアドレス（既定: 127.0.0.1）")
+    parser.add_argument('--port', type=int, default=8765, help="待ち受けポート（既定: 8765）")
+    parser.add_argument('--workers', type=int, default=4, help="解析を実行するスレッド数（既定: 4）")
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default='gemini',
+                        help="mode=gemini で使うLLMバックエンド（既定: gemini）")
+    parser.add_argument('--overflow', choices=sorted(BACKENDS),
+                        help="Geminiの無料枠超過後に切り替えるバックエンド（例: local）")
+    parser.add_argument('--regex-only', action='store_true',
+                        help="LLMバックエンドを使わず、正規表現版のみ提供する")
+    parser.add_argument('--table-first', action='store_true',
+                        help="表から単価・数量・金額・納期が全て読み取れたデッキはLLMを呼ばずに処理する")
+    parser.add_argument('--no-guard', action='store_true',
+                        help="読み込みガード（ワーカープロセスでの抽出）を使わない（信頼できるファイルのみ）")
+    parser.add_argument('--root', action='append',
+                        help="path指定で処理を許可するフォルダ（複数指定可、省略時は制限なし）")
+    parser.add_argument('--max-upload-mb', type=int, default=200,
+                        help="アップロードの最大サイズ（既定: 200MB）")
+    add_store_arguments(parser)
+    args = parser.parse_args()
+
+    # APIキーの確認（Geminiを使う場合のみ。常駐するため入力は起動時の1回だけ）
+    backend = None if args.regex_only else args.backend
+    if backend and not os.environ.get('GEMINI_API_KEY') and 'gemini' in (args.backend, args.overflow):
+        print("\nGemini API key not found in environment variable.")
+        api_key = input("Enter your Gemini API key: ").strip()
+        if not api_key:
+            print("ERROR: API key is required (or start with --regex-only)")
+            sys.exit(1)
+        os.environ['GEMINI_API_KEY'] = api_key
+
+    service = ProcessingService(
+        workers=args.workers,
+        backend=backend,
+        overflow_backend=args.overflow,
+        table_first=args.table_first,
+        guard=not args.no_guard,
+        roots=args.root,
+        max_upload_mb=args.max_upload_mb,
+        store=store_from_args(args),
+    )
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        print("\nStopped")
+    finally:
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+処理結果のレコード型（__slots__ で1件あたりのメモリを削減）
+スライドごとの解析結果・スライド・バッチ処理の記録は件数が多く、
+同じキーを持つ dict を大量に保持していたため、固定項目のクラスにする。
+
+既存コードとの互換のため record['key'] / record.get('key') でも参照でき、
+JSONへは to_dict()（output_writer.dumps の default）で従来と同じ形式に変換する
+"""
+
+from typing import Dict, List, Any
+
+
+class SlotRecord:
+    """__slots__ を使うレコードの基底クラス"""
+
+    __slots__ = ()
+
+    # JSONに出力する項目（この順で出力）
+    FIELDS = ()
+
+    # 値がNoneのときは出力しない項目
+    OPTIONAL = ()
+
+    def __init__(self, **values):
+        for field in self.FIELDS:
+            setattr(self, field, values.pop(field, None))
+        if values:
+            raise TypeError(f"Unknown fields for {type(self).__name__}: {', '.join(values)}")
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]):
+        """dict（JSONから読み込んだもの等）から作成（未知の項目は無視）"""
+        return cls(**{field: data[field] for field in cls.FIELDS if field in data})
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON出力用の dict"""
+        return {
+            field: getattr(self, field) for field in self.FIELDS
+            if field not in self.OPTIONAL or getattr(self, field) is not None
+        }
+
+    def __getitem__(self, key: str):
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key: str, value):
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.FIELDS and (key not in self.OPTIONAL or getattr(self, key) is not None)
+
+    def get(self, key: str, default=None):
+        value = getattr(self, key, None) if key in self.FIELDS else None
+        return default if value is None else value
+
+    def __eq__(self, other) -> bool:
+        return type(self) is type(other) and self.to_dict() == other.to_dict()
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+class SlideAnalysis(SlotRecord):
+    """1スライドの正規表現解析の結果（analyzed_info）"""
+
+    FIELDS = ('prices', 'quantities', 'deadlines', 'companies', 'dates',
+              'event_types', 'clients', 'novelties', 'keywords', 'timed_out',
+              'company_ids', 'client_ids')
+    OPTIONAL = ('timed_out', 'company_ids', 'client_ids')
+    __slots__ = FIELDS
+
+
+class SlideRecord(SlotRecord):
+    """1スライドの出力（slides の要素）"""
+
+    FIELDS = ('slide_number', 'raw_texts', 'tables', 'analyzed_info', 'text_length', 'content_hash')
+    __slots__ = FIELDS
+
+
+class BatchEntry(SlotRecord):
+    """バッチ処理のジャーナルの1件（ファイルごとの処理結果）"""
+
+    FIELDS = ('path', 'file', 'output', 'markdown', 'slides', 'confidence', 'unchanged',
+              'canonical', 'status', 'error', 'recorded_at', 'node')
+    OPTIONAL = ('output', 'markdown', 'slides', 'confidence', 'unchanged',
+                'canonical', 'error', 'recorded_at', 'node')
+    __slots__ = FIELDS + ('extra',)
+
+    def __init__(self, **values):
+        # 固定項目以外（将来追加された項目等）も失わないように保持
+        self.extra = {key: values.pop(key) for key in list(values) if key not in self.FIELDS} or None
+        super().__init__(**values)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]):
+        return cls(**data)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = super().to_dict()
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def get(self, key: str, default=None):
+        if key not in self.FIELDS and self.extra:
+            return self.extra.get(key, default)
+        return super().get(key, default)
+
+
+class SummaryAccumulator:
+    """
+    デッキ全体のサマリー（all_* の一覧）の集計
+
+    スライドごとに extend した後に重複除去するのではなく、
+    重複除去する項目は集合に直接追加して最後に一度だけ並べ替える
+    """
+
+    __slots__ = ('prices', 'quantities', 'unique', 'ids')
+
+    # 出現順に全て残す項目
+    LIST_FIELDS = ('prices', 'quantities')
+
+    # 重複を除いて並べ替える項目
+    UNIQUE_FIELDS = ('companies', 'keywords', 'deadlines', 'dates', 'event_types', 'clients', 'novelties')
+
+    # 名寄せインデックス使用時の正規ID（entity_index）
+    ID_FIELDS = ('company_ids', 'client_ids')
+
+    def __init__(self):
+        self.prices = []
+        self.quantities = []
+        self.unique = {field: set() for field in self.UNIQUE_FIELDS}
+        self.ids = None
+
+    def add(self, analysis):
+        """1スライドの解析結果を追加"""
+        self.prices.extend(analysis['prices'])
+        self.quantities.extend(analysis['quantities'])
+        for field, values in self.unique.items():
+            values.update(analysis[field])
+        if analysis.get('company_ids') is not None:
+            if self.ids is None:
+                self.ids = {field: set() for field in self.ID_FIELDS}
+            for field, values in self.ids.items():
+                values.update(analysis.get(field, []))
+
+    def to_dict(self) -> Dict[str, List[Any]]:
+        """サマリー（従来の summary と同じキー順）"""
+        summary = {'all_prices': self.prices, 'all_quantities': self.quantities}
+        for field in self.UNIQUE_FIELDS:
+            summary[f'all_{field}'] = sorted(self.unique[field])
+        if self.ids is not None:
+            for field in self.ID_FIELDS:
+                summary[f'all_{field}'] = sorted(self.ids[field])
+        return summary
+
+
+def to_json(obj) -> Any:
+    """JSONエンコーダーの default（レコード型を dict に変換）"""
+    if isinstance(obj, (SlotRecord, SummaryAccumulator)):
+        return obj.to_dict()
+    if isinstance(obj, (set, frozenset)):
+        return sorted(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+スプレッドシート取り込み用の一括エクスポート
+出力JSONを JSON_processor.js の formatDataForSpreadsheet と同じ列順に平坦化し、
+前回のエクスポート以降に新規・変更のあった行だけを1つのCSV（_sheet_export.csv）にまとめる。
+GAS側は importSheetExport() でCSVを読み込み、appendRow の代わりに setValues で一括登録する。
+
+- 行の変更は「登録日時」以外の列の内容で判定（同じ内容で出力し直したJSONは含めない）
+- GASが取り込む前に次のバッチが終わった場合は、未取り込みのCSVに追記・上書きする
+  （GASは取り込み後にCSVをゴミ箱に移す）
+- 行のキーは「元ファイル名」（JSONのファイル名、GAS側の重複判定と同じ）
+"""
+
+import argparse
+import csv
+import hashlib
+import io
+import json
+import os
+import re
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Any, Optional
+
+from output_writer import output_json_files, write_text_if_changed
+
+
+# 出力ファイル名（.jsonにしない: JSON_processor.js は .json を全て取り込み対象にする）
+EXPORT_NAME = '_sheet_export.csv'
+
+# エクスポート済みの行の記録（パス・サイズ・更新日時・行のハッシュ、後の記録が優先）
+STATE_NAME = '_sheet_export_state.jsonl'
+
+# JSON_processor.js の getOrCreateMainSheet と同じ列
+SHEET_COLUMNS = [
+    '登録日時', '担当者名', 'クライアント名', '実施時期', 'イベント種別',
+    '景品カテゴリ', '具体的な景品名', '単価', '発注数量', 'MOQ', '納期',
+    '協力会社名', '協力会社評価', '会場名', '会場費用', '成功要因',
+    '失敗・反省点', '企画書URL', 'タグ', '信頼度スコア',
+    '元ファイル名', '抽出テキスト', '全会社名'
+]
+
+KEY_COLUMN = SHEET_COLUMNS.index('元ファイル名')
+
+# 抽出テキストの最大文字数（GAS側と同じ）
+TEXT_LIMIT = 500
+
+
+def _client_from_filename(file_name: str) -> str:
+    """ファイル名からクライアント名を抽出（JSON_processor.js の extractClientFromFilename と同じ）"""
+    for pattern in (r'【([^】]+)様?】', r'\[([^\]]+)様?\]'):
+        match = re.search(pattern, file_name)
+        if match:
+            return match.group(1)
+    return ''
+
+
+def _first(values: List[Any]) -> Any:
+    return values[0] if values else ''
+
+
+def extract_info(data: Dict[str, Any]) -> Dict[str, Any]:
+    """出力JSONから登録する項目を取り出す（JSON_processor.js の extractInfoFromJSON と同じ）"""
+    file_info = data.get('file_info') or {}
+    client_from_filename = _client_from_filename(file_info.get('file_name') or '')
+
+    # Gemini API版
+    if data.get('gemini_analysis'):
+        g = data['gemini_analysis']
+        companies = [c for c in g.get('partner_companies') or [] if c]
+        return {
+            'event_type': g.get('event_type') or '',
+            'event_date': g.get('event_date') or '',
+            'main_client': g.get('client_name') or client_from_filename,
+            'main_company': _first(companies),
+            'all_companies': ', '.join(companies),
+            'avg_price': g.get('unit_price') or None,
+            'total_quantity': g.get('order_quantity') or None,
+            'main_deadline': g.get('deadline') or '',
+            'main_novelty': _first([n for n in g.get('novelty_items') or [] if n]),
+            'tags': ', '.join(k for k in g.get('keywords') or [] if k),
+            'slide_texts': data.get('slide_texts_sample') or '',
+            'confidence_score': g.get('confidence_score') or 0,
+        }
+
+    # 正規表現版（summary）
+    summary = data.get('summary') or {}
+    prices = summary.get('all_prices') or []
+    quantities = summary.get('all_quantities') or []
+    companies = [c for c in summary.get('all_companies') or [] if c]
+    return {
+        'event_type': _first(summary.get('all_event_types') or []),
+        'event_date': _first(summary.get('all_dates') or []),
+        'main_client': _first([c for c in summary.get('all_clients') or [] if c]) or client_from_filename,
+        'main_company': _first(companies),
+        'all_companies': ', '.join(companies),
+        # JavaScript の Math.round と同じく .5 は切り上げ
+        'avg_price': int(sum(prices) / len(prices) + 0.5) if prices else None,
+        'total_quantity': sum(quantities) if quantities else None,
+        'main_deadline': _first(summary.get('all_deadlines') or []),
+        'main_novelty': _first(summary.get('all_novelties') or []),
+        'tags': ', '.join(summary.get('all_keywords') or []),
+        'slide_texts': '',
+        'confidence_score': 0,
+    }
+
+
+def format_row(info: Dict[str, Any], file_name: str, registered_at: str) -> List[Any]:
+    """スプレッドシートの1行（JSON_processor.js の formatDataForSpreadsheet と同じ列順、手動入力の列は空）"""
+    return [
+        registered_at,             # A: 登録日時
+        '',                        # B: 担当者名（手動入力）
+        info['main_client'],       # C: クライアント名
+        info['event_date'],        # D: 実施時期
+        info['event_type'],        # E: イベント種別
+        '',                        # F: 景品カテゴリ（後で分類）
+        info['main_novelty'],      # G: 具体的な景品名
+        info['avg_price'],         # H: 単価
+        info['total_quantity'],    # I: 発注数量
+        '',                        # J: MOQ（後で入力）
+        info['main_deadline'],     # K: 納期
+        info['main_company'],      # L: 協力会社名
+        '', '', '', '', '', '',    # M-R: 協力会社評価・会場名・会場費用・成功要因・失敗・反省点・企画書URL
+        info['tags'],              # S: タグ
+        info['confidence_score'],  # T: 信頼度スコア
+        file_name,                 # U: 元ファイル名
+        info['slide_texts'][:TEXT_LIMIT],  # V: 抽出テキスト
+        info['all_companies'],     # W: 全会社名
+    ]
+
+
+def row_hash(row: List[Any]) -> str:
+    """行の内容のハッシュ（登録日時を除く）"""
+    return hashlib.sha1(json.dumps(row[1:], ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def _load_state(state_path: Path) -> Dict[str, Dict[str, Any]]:
+    state = {}
+    try:
+        with open(state_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    state[record['path']] = record
+                except (json.JSONDecodeError, KeyError, TypeError):
+                    continue
+    except OSError:
+        pass
+    return state
+
+
+def _load_pending(export_path: Path) -> Dict[str, List[str]]:
+    """GASがまだ取り込んでいないCSVの行（元ファイル名 → 行）"""
+    try:
+        with open(export_path, 'r', encoding='utf-8', newline='') as f:
+            rows = list(csv.reader(f))
+    except OSError:
+        return {}
+    return {row[KEY_COLUMN]: row for row in rows[1:] if len(row) == len(SHEET_COLUMNS)}
+
+
+def export_folder(folder_path: str, export_path: Optional[str] = None, full: bool = False) -> Dict[str, Any]:
+    """
+    新規・変更のあった行をCSVにエクスポート
+
+    Args:
+        folder_path: 出力JSONのフォルダ
+        export_path: CSVのパス（省略時はフォルダ直下の _sheet_export.csv）
+        full: 記録を無視して全ての行を書き出す
+
+    Returns:
+        {'path', 'rows': 今回追加・更新した行数, 'pending': CSVの行数, 'skipped': エラー結果等}
+    """
+    folder = Path(folder_path)
+    export = Path(export_path) if export_path else folder / EXPORT_NAME
+    state_path = folder / STATE_NAME
+    state = {} if full else _load_state(state_path)
+    pending = {} if full else _load_pending(export)
+
+    registered_at = datetime.now().strftime('%Y/%m/%d %H:%M:%S')
+    records, rows, skipped = [], 0, 0
+    for json_path in output_json_files(folder):
+        rel_path = json_path.relative_to(folder).as_posix()
+        stat = json_path.stat()
+        previous = state.get(rel_path)
+        # サイズ・更新日時が前回と同じなら読み込まない
+        if previous and previous.get('size') == stat.st_size and previous.get('mtime_ns') == stat.st_mtime_ns:
+            continue
+
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception:
+            skipped += 1
+            continue
+        if not isinstance(data, dict) or 'error' in data or not (data.get('gemini_analysis') or data.get('summary')):
+            skipped += 1
+            continue
+
+        row = format_row(extract_info(data), json_path.name, registered_at)
+        digest = row_hash(row)
+        records.append({'path': rel_path, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'row_hash': digest})
+        if previous and previous.get('row_hash') == digest:
+            continue
+        pending[json_path.name] = ['' if value is None else value for value in row]
+        rows += 1
+
+    # CSVを書いてから記録する（途中で止まっても行は失われず、次回また書き出される）
+    if rows:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator='\n')
+        writer.writerow(SHEET_COLUMNS)
+        writer.writerows(pending.values())
+        export.parent.mkdir(parents=True, exist_ok=True)
+        write_text_if_changed(export, buffer.getvalue())
+
+    if records:
+        if full:
+            # 全件書き出し時は記録を作り直す
+            temp_path = state_path.with_name(f".{state_path.name}.{os.getpid()}.tmp")
+            temp_path.write_text(''.join(json.dumps(r, ensure_ascii=False) + "\n" for r in records),
+                                 encoding='utf-8')
+            os.replace(temp_path, state_path)
+        else:
+            with open(state_path, 'a', encoding='utf-8') as f:
+                for record in records:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    return {'path': str(export), 'rows': rows, 'pending': len(pending), 'skipped': skipped}
+
+
+def main():
+    """メイン処理"""
+    parser = argparse.ArgumentParser(description="スプレッドシート取り込み用の一括エクスポート")
+    parser.add_argument('folder', help="出力JSONのフォルダ")
+    parser.add_argument('--output', help=f"CSVのパス（既定: フォルダ直下の {EXPORT_NAME}）")
+    parser.add_argument('--full', action='store_true', help="前回のエクスポートに関係なく全ての行を書き出す")
+    args = parser.parse_args()
+
+    if not Path(args.folder).exists():
+        print(f"ERROR: Folder not found: {args.folder}")
+        sys.exit(1)
+
+    stats = export_folder(args.folder, args.output, args.full)
+    print(f"Sheet export: {stats['rows']} new/changed rows ({stats['pending']} rows waiting for import)")
+    if stats['skipped']:
+        print(f"  skipped (error results / unreadable): {stats['skipped']}")
+    print(f"  -> {stats['path']}")
+
+
+if __name__ == "__main__":
+    main()
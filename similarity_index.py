@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+類似案件検索用のローカルインデックス
+バッチ処理で生成されたJSON（raw_texts / gemini_analysis）から、日本語向けの
+文字n-gram TF-IDFを疎行列として作成し、「このデッキ／この文章に似た過去案件」の
+上位k件をオフラインで返す。インデックスは1つの .npz に保存し、追加・削除は差分で行う
+"""
+
+import argparse
+import json
+import sys
+import unicodedata
+import zlib
+from pathlib import Path
+from typing import Dict, List, Any, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    print("ERROR: numpy is not installed")
+    print("Please install it with: pip install numpy")
+    exit(1)
+
+import pptx_extraction
+from output_writer import output_json_files
+
+
+INDEX_FILE_NAME = "_similarity_index.npz"
+
+
+def document_text(data: Dict[str, Any]) -> str:
+    """結果JSONから検索対象のテキストを組み立てる（正規表現版・Gemini版の両対応）"""
+    parts = [data.get('file_info', {}).get('file_name', '')]
+
+    for slide in data.get('slides', []):
+        parts.extend(slide.get('raw_texts', []))
+
+    analysis = data.get('gemini_analysis') or {}
+    for field in ('client_name', 'event_type', 'event_description', 'venue', 'deadline'):
+        if analysis.get(field):
+            parts.append(str(analysis[field]))
+    for field in ('partner_companies', 'novelty_items', 'keywords'):
+        parts.extend(str(v) for v in analysis.get(field) or [])
+
+    parts.append(data.get('slide_texts_sample', ''))
+    return "\n".join(p for p in parts if p)
+
+
+class SimilarityIndex:
+    """文字n-gram TF-IDFによる類似デッキ検索クラス"""
+
+    # 特徴量ハッシュの次元数（2^20）
+    N_FEATURES = 1 << 20
+
+    # 文字n-gramの長さ（空白の無い日本語向けに2-gramと3-gram）
+    NGRAM_SIZES = (2, 3)
+
+    # クエリで使う特徴量の最大数（重みの大きい順）
+    MAX_QUERY_TERMS = 2000
+
+    def __init__(self, index_path: str):
+        """
+        初期化（既存のインデックスがあれば読み込む）
+
+        Args:
+            index_path: インデックスファイル（.npz）のパス
+        """
+        self.index_path = Path(index_path)
+        self.keys = []          # ドキュメントのキー（フォルダからの相対パス）
+        self.mtimes = []        # 登録時のJSON更新日時
+        self._terms = []        # ドキュメントごとの特徴量ID（uint32）
+        self._counts = []       # ドキュメントごとの出現回数（uint16）
+        self._positions = {}    # キー → 位置
+        self._compiled = None
+
+        if self.index_path.exists():
+            self._load()
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def vectorize(self, text: str) -> Tuple[np.ndarray, np.ndarray]:
+        """テキストを (特徴量ID, 出現回数) に変換"""
+        compact = ''.join(unicodedata.normalize('NFKC', text).lower().split())
+        features = []
+        for n in self.NGRAM_SIZES:
+            features.extend(
+                zlib.crc32(compact[i:i + n].encode('utf-8')) & (self.N_FEATURES - 1)
+                for i in range(len(compact) - n + 1)
+            )
+        if not features:
+            return np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.uint16)
+
+        terms, counts = np.unique(np.array(features, dtype=np.uint32), return_counts=True)
+        return terms, np.minimum(counts, 65535).astype(np.uint16)
+
+    def add(self, key: str, text: str, mtime: float = 0.0):
+        """ドキュメントを追加（同じキーがあれば置き換え）"""
+        self.remove(key)
+        terms, counts = self.vectorize(text)
+        self._positions[key] = len(self.keys)
+        self.keys.append(key)
+        self.mtimes.append(mtime)
+        self._terms.append(terms)
+        self._counts.append(counts)
+        self._compiled = None
+
+    def remove(self, key: str) -> bool:
+        """ドキュメントを削除（保存時に詰める）"""
+        position = self._positions.pop(key, None)
+        if position is None:
+            return False
+        self._terms[position] = None
+        self._counts[position] = None
+        self._compiled = None
+        return True
+
+    def mtime_of(self, key: str) -> Optional[float]:
+        """登録済みドキュメントの更新日時（未登録ならNone）"""
+        position = self._positions.get(key)
+        return None if position is None else self.mtimes[position]
+
+    def compile(self):
+        """転置インデックス（特徴量ごとのドキュメントと重み）を構築"""
+        alive = sorted(self._positions.values())
+        n_docs = len(alive)
+
+        if not n_docs:
+            self._compiled = {
+                'docs': np.zeros(0, dtype=np.int32), 'weights': np.zeros(0, dtype=np.float32),
+                'pointers': np.zeros(self.N_FEATURES + 1, dtype=np.int64),
+                'idf': np.zeros(self.N_FEATURES, dtype=np.float32), 'positions': np.zeros(0, dtype=np.int64),
+            }
+            return
+
+        lengths = np.array([len(self._terms[p]) for p in alive], dtype=np.int64)
+        terms = np.concatenate([self._terms[p] for p in alive]).astype(np.int64)
+        counts = np.concatenate([self._counts[p] for p in alive]).astype(np.float32)
+        docs = np.repeat(np.arange(n_docs, dtype=np.int32), lengths)
+
+        # TF（対数）× IDF（平滑化）をドキュメントごとにL2正規化
+        df = np.bincount(terms, minlength=self.N_FEATURES)
+        idf = (np.log((n_docs + 1) / (df + 1)) + 1).astype(np.float32)
+        weights = (1 + np.log(counts)) * idf[terms]
+        norms = np.sqrt(np.bincount(docs, weights=weights ** 2, minlength=n_docs)).astype(np.float32)
+        weights = weights / np.maximum(norms[docs], 1e-12)
+
+        # 特徴量順に並べ替え（CSC形式）
+        order = np.argsort(terms, kind='stable')
+        pointers = np.zeros(self.N_FEATURES + 1, dtype=np.int64)
+        pointers[1:] = np.cumsum(df)
+
+        self._compiled = {
+            'docs': docs[order],
+            'weights': weights[order].astype(np.float32),
+            'pointers': pointers,
+            'idf': idf,
+            'positions': np.array(alive, dtype=np.int64),
+        }
+
+    def query(self, text: str, k: int = 10, exclude: Optional[str] = None) -> List[Tuple[str, float]]:
+        """
+        類似ドキュメントの上位k件
+
+        Returns:
+            (キー, コサイン類似度) のリスト
+        """
+        if self._compiled is None:
+            self.compile()
+        index = self._compiled
+
+        terms, counts = self.vectorize(text)
+        if not len(terms) or not len(index['positions']):
+            return []
+
+        weights = (1 + np.log(counts.astype(np.float32))) * index['idf'][terms]
+        if len(terms) > self.MAX_QUERY_TERMS:
+            top = np.argpartition(weights, -self.MAX_QUERY_TERMS)[-self.MAX_QUERY_TERMS:]
+            terms, weights = terms[top], weights[top]
+        weights = weights / max(float(np.sqrt((weights ** 2).sum())), 1e-12)
+
+        # 各特徴量のポスティングをまとめて取り出してスコアを加算
+        starts = index['pointers'][terms]
+        ends = index['pointers'][terms.astype(np.int64) + 1]
+        sizes = ends - starts
+        if not sizes.sum():
+            return []
+        offsets = np.repeat(starts - np.cumsum(sizes) + sizes, sizes) + np.arange(sizes.sum())
+        scores = np.bincount(
+            index['docs'][offsets],
+            weights=index['weights'][offsets] * np.repeat(weights, sizes),
+            minlength=len(index['positions'])
+        )
+
+        if exclude is not None and exclude in self._positions:
+            excluded = np.searchsorted(index['positions'], self._positions[exclude])
+            scores[excluded] = -1
+
+        k = min(k, len(scores))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [
+            (self.keys[index['positions'][i]], round(float(scores[i]), 4))
+            for i in best if scores[i] > 0
+        ]
+
+    def save(self):
+        """削除済みドキュメントを詰め、転置インデックスと合わせて1つの .npz に保存"""
+        self._compact()
+        if self._compiled is None:
+            self.compile()
+        index = self._compiled
+
+        np.savez_compressed(
+            self.index_path,
+            keys=np.array(self.keys, dtype=str),
+            mtimes=np.array(self.mtimes, dtype=np.float64),
+            lengths=np.array([len(t) for t in self._terms], dtype=np.int64),
+            terms=np.concatenate(self._terms) if self._terms else np.zeros(0, dtype=np.uint32),
+            counts=np.concatenate(self._counts) if self._counts else np.zeros(0, dtype=np.uint16),
+            postings_docs=index['docs'],
+            postings_weights=index['weights'],
+            postings_df=np.diff(index['pointers']).astype(np.int32),
+            idf=index['idf'],
+        )
+
+    def _compact(self):
+        """削除済みドキュメントを詰める（構築済みの転置インデックスは並び順が同じため維持）"""
+        alive = sorted(self._positions.values())
+        if len(alive) == len(self.keys):
+            return
+
+        self.keys = [self.keys[p] for p in alive]
+        self.mtimes = [self.mtimes[p] for p in alive]
+        self._terms = [self._terms[p] for p in alive]
+        self._counts = [self._counts[p] for p in alive]
+        self._positions = {key: i for i, key in enumerate(self.keys)}
+        if self._compiled is not None:
+            self._compiled['positions'] = np.arange(len(self.keys), dtype=np.int64)
+
+    def _load(self):
+        """インデックスを読み込み（転置インデックスも復元するため再構築は不要）"""
+        with np.load(self.index_path, allow_pickle=False) as data:
+            self.keys = data['keys'].tolist()
+            self.mtimes = data['mtimes'].tolist()
+            bounds = np.concatenate([[0], np.cumsum(data['lengths'])])
+            terms, counts = data['terms'], data['counts']
+            pointers = np.zeros(self.N_FEATURES + 1, dtype=np.int64)
+            pointers[1:] = np.cumsum(data['postings_df'])
+            self._compiled = {
+                'docs': data['postings_docs'],
+                'weights': data['postings_weights'],
+                'pointers': pointers,
+                'idf': data['idf'],
+                'positions': np.arange(len(self.keys), dtype=np.int64),
+            }
+
+        self._terms = [terms[bounds[i]:bounds[i + 1]] for i in range(len(self.keys))]
+        self._counts = [counts[bounds[i]:bounds[i + 1]] for i in range(len(self.keys))]
+        self._positions = {key: i for i, key in enumerate(self.keys)}
+
+
+def sync_folder(index: SimilarityIndex, folder_path: str) -> Dict[str, int]:
+    """フォルダ内の結果JSONとインデックスを同期（新規・更新は追加、消えたものは削除）"""
+    folder = Path(folder_path)
+    stats = {'added': 0, 'updated': 0, 'removed': 0, 'unchanged': 0}
+    seen = set()
+
+    for json_file in output_json_files(folder):
+        key = json_file.relative_to(folder).as_posix()
+        seen.add(key)
+        mtime = json_file.stat().st_mtime
+        previous = index.mtime_of(key)
+        if previous == mtime:
+            stats['unchanged'] += 1
+            continue
+
+        try:
+            with open(json_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"  WARNING: Failed to read {json_file.name}: {e}")
+            continue
+        if not isinstance(data, dict) or 'error' in data:
+            continue
+
+        index.add(key, document_text(data), mtime)
+        stats['updated' if previous is not None else 'added'] += 1
+
+    for key in [k for k in index.keys if k not in seen]:
+        if index.remove(key):
+            stats['removed'] += 1
+
+    return stats
+
+
+def update_folder_index(folder_path: str) -> Dict[str, int]:
+    """フォルダのインデックスを差分更新して保存（バッチ処理の後に呼ぶ）"""
+    index = SimilarityIndex(Path(folder_path) / INDEX_FILE_NAME)
+    stats = sync_folder(index, folder_path)
+    index.save()
+    stats['documents'] = len(index)
+    return stats
+
+
+def _query_text(target: str, folder: Path) -> Tuple[str, Optional[str]]:
+    """クエリ引数（JSON / .pptx / 文章）を検索テキストに変換"""
+    path = Path(target)
+    if path.suffix.lower() == '.json' and path.exists():
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        try:
+            key = path.resolve().relative_to(folder.resolve()).as_posix()
+        except ValueError:
+            key = None
+        return document_text(data), key
+    if path.suffix.lower() == '.pptx' and path.exists():
+        slides = pptx_extraction.read_slide_texts(str(path))
+        return "\n".join(text for texts in slides for text in texts), None
+    return target, None
+
+
+def main():
+    """メイン処理"""
+    parser = argparse.ArgumentParser(description="類似案件検索インデックス")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build = subparsers.add_parser('build', help="フォルダ内のJSONでインデックスを作成・差分更新")
+    build.add_argument('folder')
+
+    query = subparsers.add_parser('query', help="類似案件を検索")
+    query.add_argument('folder')
+    query.add_argument('target', help="JSON / .pptx ファイル、または検索文章")
+    query.add_argument('-k', type=int, default=10, help="表示件数（既定: 10）")
+
+    args = parser.parse_args()
+
+    folder = Path(args.folder)
+    if not folder.exists():
+        print(f"ERROR: Folder not found: {folder}")
+        sys.exit(1)
+
+    if args.command == 'build':
+        stats = update_folder_index(str(folder))
+        print(f"Index: {folder / INDEX_FILE_NAME}")
+        print(f"Documents: {stats['documents']}")
+        print(f"Added: {stats['added']}, Updated: {stats['updated']}, "
+              f"Removed: {stats['removed']}, Unchanged: {stats['unchanged']}")
+        return
+
+    index = SimilarityIndex(folder / INDEX_FILE_NAME)
+    text, key = _query_text(args.target, folder)
+    results = index.query(text, k=args.k, exclude=key)
+    if not results:
+        print("No similar decks found")
+        return
+    for rank, (doc_key, score) in enumerate(results, 1):
+        print(f"{rank:>3}. {score:.3f}  {doc_key}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+スライド画像のOCR（ローカルのTesseractを使用、任意）
+貼り付けられた見積書・価格表のスクリーンショット等からテキストを抽出し、
+スライドのテキストに追加する。
+
+- 画像は.pptx（zip）から1枚ずつ読み出す（python-pptx・ガードのメディア除去とは独立）
+- OCR結果は画像内容のハッシュでキャッシュ（ロゴ・テンプレート画像の再OCRを防ぐ）
+- キャッシュに無い画像だけをプロセスプールで並列にOCR
+"""
+
+import hashlib
+import os
+import posixpath
+import sys
+import zipfile
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Any, Optional
+
+
+REL_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+PML_NS = '{http://schemas.openxmlformats.org/presentationml/2006/main}'
+R_ID = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id'
+
+# Tesseractで読める画像形式（EMF/WMF/SVG等のベクター画像は対象外）
+OCR_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tif', '.tiff')
+
+
+def _read_rels(package: zipfile.ZipFile, rels_path: str) -> Dict[str, Dict[str, str]]:
+    """関連付けファイル（.rels）を {rId: {type, target}} で読み込み"""
+    try:
+        root = ET.fromstring(package.read(rels_path))
+    except KeyError:
+        return {}
+    return {
+        rel.get('Id'): {'type': rel.get('Type', ''), 'target': rel.get('Target', ''),
+                        'external': rel.get('TargetMode') == 'External'}
+        for rel in root.iter(f'{REL_NS}Relationship')
+    }
+
+
+def slide_image_parts(package: zipfile.ZipFile) -> List[List[str]]:
+    """スライド順に、各スライドが参照する画像部品のパスを列挙"""
+    presentation = ET.fromstring(package.read('ppt/presentation.xml'))
+    presentation_rels = _read_rels(package, 'ppt/_rels/presentation.xml.rels')
+
+    slides = []
+    for slide_id in presentation.iter(f'{PML_NS}sldId'):
+        rel = presentation_rels.get(slide_id.get(R_ID))
+        if not rel:
+            slides.append([])
+            continue
+
+        slide_path = posixpath.normpath(posixpath.join('ppt', rel['target']))
+        slide_dir, slide_name = posixpath.split(slide_path)
+        slide_rels = _read_rels(package, f"{slide_dir}/_rels/{slide_name}.rels")
+
+        images = []
+        for image_rel in slide_rels.values():
+            if image_rel['external'] or not image_rel['type'].endswith('/image'):
+                continue
+            part = posixpath.normpath(posixpath.join(slide_dir, image_rel['target']))
+            if part.lower().endswith(OCR_EXTENSIONS) and part not in images:
+                images.append(part)
+        slides.append(images)
+
+    return slides
+
+
+def _ocr_image(blob: bytes, lang: str) -> str:
+    """画像1枚をOCR（プロセスプールのワーカーで実行）"""
+    import io
+
+    import pytesseract
+    from PIL import Image
+
+    with Image.open(io.BytesIO(blob)) as image:
+        return pytesseract.image_to_string(image, lang=lang).strip()
+
+
+class SlideOCR:
+    """画像ハッシュキャッシュ付きのスライド画像OCRクラス"""
+
+    def __init__(self, lang: str = 'jpn+eng', cache_dir: Optional[str] = None,
+                 workers: Optional[int] = None, min_image_kb: int = 8, max_image_mb: int = 20):
+        """
+        初期化
+
+        Args:
+            lang: Tesseractの言語（日本語 + 英語）
+            cache_dir: OCR結果のキャッシュフォルダ（省略時は ~/.pptx_ocr_cache）
+            workers: OCRのプロセス数（省略時はCPU数）
+            min_image_kb: これより小さい画像（アイコン等）はOCRしない
+            max_image_mb: これより大きい画像はOCRしない
+        """
+        # pytesseract / Pillow はここで初めてimport
+        try:
+            import pytesseract
+            from PIL import Image  # noqa: F401
+        except ImportError:
+            raise ImportError(
+                "pytesseract / Pillow is not installed. "
+                "Please install it with: pip install pytesseract pillow "
+                "(Tesseract OCR itself must also be installed)"
+            )
+        try:
+            pytesseract.get_tesseract_version()
+        except Exception as e:
+            raise RuntimeError(f"Tesseract OCR is not available: {e}")
+
+        self.lang = lang
+        self.cache_dir = Path(cache_dir or Path.home() / '.pptx_ocr_cache') / lang.replace('+', '_')
+        self.workers = workers or os.cpu_count() or 1
+        self.min_image_bytes = min_image_kb * 1024
+        self.max_image_bytes = max_image_mb * 1024 * 1024
+
+        self.stats = {'images': 0, 'hits': 0, 'misses': 0, 'skipped': 0, 'errors': 0}
+        self._executor = None
+
+    def _cache_path(self, image_hash: str) -> Path:
+        """画像ハッシュに対応するキャッシュファイル"""
+        return self.cache_dir / image_hash[:2] / f"{image_hash}.txt"
+
+    def _read_cache(self, image_hash: str) -> Optional[str]:
+        """キャッシュからOCR結果を読み込み（無ければNone）"""
+        try:
+            return self._cache_path(image_hash).read_text(encoding='utf-8')
+        except OSError:
+            return None
+
+    def _write_cache(self, image_hash: str, text: str):
+        """OCR結果をキャッシュに保存（一時ファイル経由で置き換え）"""
+        path = self._cache_path(image_hash)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        temp_path.write_text(text, encoding='utf-8')
+        os.replace(temp_path, path)
+
+    def slide_texts(self, file_path: str) -> List[List[str]]:
+        """
+        スライドごとの画像OCRテキスト
+
+        Returns:
+            スライドごとのOCRテキストのリスト（画像が無いスライドは空リスト）
+        """
+        texts_by_hash = {}
+        pending = {}
+
+        with zipfile.ZipFile(file_path) as package:
+            slides = slide_image_parts(package)
+            hashes_by_part = {}
+
+            for part in {part for images in slides for part in images}:
+                try:
+                    info = package.getinfo(part)
+                except KeyError:
+                    continue
+                if not self.min_image_bytes <= info.file_size <= self.max_image_bytes:
+                    self.stats['skipped'] += 1
+                    continue
+
+                blob = package.read(part)
+                image_hash = hashlib.sha1(blob).hexdigest()
+                hashes_by_part[part] = image_hash
+                self.stats['images'] += 1
+
+                if image_hash in texts_by_hash or image_hash in pending:
+                    self.stats['hits'] += 1
+                    continue
+                cached = self._read_cache(image_hash)
+                if cached is not None:
+                    self.stats['hits'] += 1
+                    texts_by_hash[image_hash] = cached
+                else:
+                    self.stats['misses'] += 1
+                    pending[image_hash] = blob
+
+        # キャッシュに無い画像だけをプロセスプールでOCR
+        if pending:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            futures = {
+                image_hash: self._executor.submit(_ocr_image, blob, self.lang)
+                for image_hash, blob in pending.items()
+            }
+            for image_hash, future in futures.items():
+                try:
+                    text = future.result()
+                except Exception as e:
+                    print(f"  WARNING: OCR failed for image {image_hash[:8]}: {e}")
+                    self.stats['errors'] += 1
+                    continue
+                texts_by_hash[image_hash] = text
+                self._write_cache(image_hash, text)
+
+        return [
+            [texts_by_hash[hashes_by_part[part]] for part in images
+             if texts_by_hash.get(hashes_by_part.get(part))]
+            for images in slides
+        ]
+
+    def hit_rate(self) -> float:
+        """キャッシュヒット率（%）"""
+        looked_up = self.stats['hits'] + self.stats['misses']
+        return self.stats['hits'] / looked_up * 100 if looked_up else 0.0
+
+    def report(self) -> Dict[str, Any]:
+        """統計（サマリー記録用）"""
+        return dict(self.stats, hit_rate=round(self.hit_rate(), 1))
+
+    def print_report(self):
+        """統計を表示"""
+        print(f"OCR images: {self.stats['images']} "
+              f"(cache hits {self.stats['hits']} / OCR {self.stats['misses']}, "
+              f"hit rate {self.hit_rate():.1f}%, skipped {self.stats['skipped']}, "
+              f"errors {self.stats['errors']})")
+
+    def close(self):
+        """プロセスプールを終了"""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+def merge_slide_texts(slides: List[List[str]], ocr_slides: List[List[str]]) -> List[List[str]]:
+    """スライドのテキストにOCRテキストを追加（スライド数が異なる場合は共通部分のみ）"""
+    return [
+        texts + (ocr_slides[i] if i < len(ocr_slides) else [])
+        for i, texts in enumerate(slides)
+    ]
+
+
+def main():
+    """メイン処理（1ファイルのOCR結果を表示）"""
+    if len(sys.argv) > 1:
+        file_path = sys.argv[1]
+    else:
+        file_path = input("PowerPoint file path: ").strip()
+
+    if not Path(file_path).exists():
+        print(f"ERROR: File not found: {file_path}")
+        sys.exit(1)
+
+    ocr = SlideOCR()
+    try:
+        for number, texts in enumerate(ocr.slide_texts(file_path), 1):
+            for text in texts:
+                print(f"--- Slide {number} ---")
+                print(text)
+    finally:
+        ocr.close()
+    ocr.print_report()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+表の列名による項目解決（LLMを使わないローカル処理）
+見積書・発注表の「単価」「数量」「金額」「納期」等の列を
+unit_price / order_quantity / total_cost / deadline に直接対応付ける。
+
+表は pptx_extraction.table_record の形式（ヘッダー行 + 型付きセルの行）で受け取り、
+ヘッダー行のある表と「項目 | 値」の2列の表の両方に対応する
+"""
+
+import re
+from typing import Dict, List, Any, Optional
+
+from pptx_extraction import parse_cell
+
+
+# 列名（部分一致）→ 項目名。上から順に判定する（「合計数量」は数量、「商品単価」は単価）
+HEADER_ALIASES = [
+    ('unit_price', ('単価',)),
+    ('order_quantity', ('数量', '発注数', '納品数', '個数', '枚数', '部数', 'ロット')),
+    ('total_cost', ('金額', '合計', '総額', '小計', '総計', '費用')),
+    ('deadline', ('納期', '納品日', '納品', 'お届け')),
+    ('novelty_items', ('品名', '商品名', '品目', 'アイテム', '景品', 'ノベルティ')),
+]
+
+# LLMを使わずに確定できたとみなす項目
+REQUIRED_FIELDS = ('unit_price', 'order_quantity', 'total_cost', 'deadline')
+
+# 合計行の見出し
+TOTAL_LABELS = ('合計', '総額', '総計', '小計')
+
+# 項目名として扱う最大文字数（長い文章のセルは列名・見出しとみなさない）
+MAX_LABEL_LENGTH = 20
+
+
+def field_for_label(label) -> Optional[str]:
+    """列名・見出しに対応する項目名（対応しなければNone）"""
+    if not isinstance(label, str):
+        return None
+    label = re.sub(r'\s+', '', label)
+    if not label or len(label) > MAX_LABEL_LENGTH:
+        return None
+    for field, aliases in HEADER_ALIASES:
+        if any(alias in label for alias in aliases):
+            return field
+    return None
+
+
+def _is_total_row(row: List[Any]) -> bool:
+    """合計行か（先頭の文字列セルが合計の見出し）"""
+    for cell in row:
+        if cell is None:
+            continue
+        return isinstance(cell, str) and re.sub(r'\s+', '', cell) in TOTAL_LABELS + ('計',)
+    return False
+
+
+def _amount(value) -> Optional[float]:
+    """金額・数量として使える数値（文字列・0以下はNone）"""
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+        return None
+    return value
+
+
+def _line(cells: List[Any]) -> str:
+    """セルを「 | 」区切りの1行に（抽出テキストの表の形式と同じ）"""
+    return " | ".join('' if cell is None else str(cell) for cell in cells)
+
+
+def resolve_table(table: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    1つの表を項目に対応付け
+
+    Returns:
+        {'items': 明細行ごとの {項目名: 値},
+         'total': 合計行の金額（無ければNone）,
+         'residual': 項目に対応しなかったセルの行（正規表現の解析対象）}
+    """
+    header, rows = table.get('header', []), table.get('rows', [])
+    resolved = {'items': [], 'total': None, 'residual': []}
+    if not header:
+        return resolved
+
+    columns = {}
+    for i, label in enumerate(header):
+        field = field_for_label(label)
+        if field:
+            columns[i] = field
+
+    # 「項目 | 値」の2列の表（見出しが1列目に並ぶ。1行目が列名に見えない場合は見出し1つでも可）
+    if len(header) == 2 and len(columns) < 2:
+        pairs = [(header[0], parse_cell(header[1]))] + [tuple(row[:2]) for row in rows if len(row) >= 2]
+        fields = [(field_for_label(label), value) for label, value in pairs]
+        if sum(1 for field, _ in fields if field) >= (1 if not columns else 2):
+            item = {}
+            for (field, value), pair in zip(fields, pairs):
+                if field and value is not None:
+                    if field == 'total_cost' and _is_total_row([pair[0]]):
+                        resolved['total'] = _amount(value)
+                    else:
+                        item.setdefault(field, value)
+                else:
+                    resolved['residual'].append(_line(pair))
+            resolved['items'].append(item)
+            return resolved
+
+    if not columns:
+        resolved['residual'] = [_line(header)] + [_line(row) for row in rows]
+        return resolved
+
+    # ヘッダー行のある表
+    unmapped = [i for i in range(len(header)) if i not in columns]
+    if unmapped:
+        resolved['residual'].append(_line([header[i] for i in unmapped]))
+
+    for row in rows:
+        if _is_total_row(row):
+            amounts = [_amount(row[i]) for i, field in columns.items()
+                       if field == 'total_cost' and i < len(row)]
+            amounts = [a for a in amounts if a] or [a for a in map(_amount, row) if a]
+            if amounts and resolved['total'] is None:
+                resolved['total'] = amounts[-1]
+            continue
+
+        item = {field: row[i] for i, field in columns.items() if i < len(row) and row[i] is not None}
+        if item:
+            resolved['items'].append(item)
+        residual = [row[i] for i in unmapped if i < len(row) and row[i] is not None]
+        if residual:
+            resolved['residual'].append(_line(residual))
+
+    return resolved
+
+
+def resolve_tables(tables: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    デッキ内の全ての表から項目を解決
+
+    Returns:
+        {'unit_price', 'order_quantity', 'total_cost', 'deadline'（解決できなければNone）,
+         'novelty_items': 品名のリスト（最大5個）, 'tables': 項目に対応付けられた表の数}
+    """
+    fields = {field: None for field in REQUIRED_FIELDS}
+    fields['novelty_items'] = []
+    fields['tables'] = 0
+
+    for table in tables:
+        resolved = resolve_table(table)
+        if not resolved['items'] and resolved['total'] is None:
+            continue
+        fields['tables'] += 1
+
+        for item in resolved['items']:
+            for field in ('unit_price', 'order_quantity'):
+                if fields[field] is None:
+                    fields[field] = _amount(item.get(field))
+            if fields['deadline'] is None and item.get('deadline') is not None:
+                fields['deadline'] = str(item['deadline'])
+            name = item.get('novelty_items')
+            if isinstance(name, str) and name not in fields['novelty_items'] and len(fields['novelty_items']) < 5:
+                fields['novelty_items'].append(name)
+
+        # 総費用は合計行を優先し、無ければ明細の金額の合計
+        if fields['total_cost'] is None:
+            if resolved['total'] is not None:
+                fields['total_cost'] = resolved['total']
+            else:
+                amounts = [a for a in (_amount(item.get('total_cost')) for item in resolved['items']) if a]
+                if amounts:
+                    fields['total_cost'] = sum(amounts)
+
+    return fields
+
+
+def fully_resolved(fields: Dict[str, Any]) -> bool:
+    """単価・数量・総費用・納期が全て表から解決できたか（LLMの呼び出しを省略できる）"""
+    return all(fields.get(field) is not None for field in REQUIRED_FIELDS)
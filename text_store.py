@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+抽出結果のコンテンツアドレス型ストア
+python-pptxでの読み込み（最も重い処理）の結果 = スライドごとのテキストブロックと表を、
+デッキの内容ハッシュと抽出処理のバージョンをキーに一度だけ保存する。
+解析ルール（PowerPointProcessor.patterns）やプロンプトを変えて再実行するときは
+.pptxを開き直さずにここから読むため、再解析が数秒で終わる。
+
+- デッキ単位で gzip 圧縮したJSONを <ハッシュ先頭2文字>/<ハッシュ>.json.gz に保存
+- 抽出処理を変えたら pptx_extraction.EXTRACTOR_VERSION を上げる（古い版は別フォルダに残る）
+- OCRあり/なしは別々に保存（OCRは言語ごと）
+- パス・サイズ・更新日時 → ハッシュの対応を記録し、変わっていないファイルは読み直さない
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, List, Any, Callable, Optional
+
+from pptx_extraction import EXTRACTOR_VERSION
+
+
+# ハッシュ計算時の読み込み単位
+_CHUNK_SIZE = 1024 * 1024
+
+# パス → ハッシュの対応を記録するファイル（ストア直下）
+PATHS_FILE = '_paths.jsonl'
+
+
+def file_hash(file_path: str) -> str:
+    """ファイル内容のハッシュ"""
+    digest = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class TextStore:
+    """抽出結果のストア"""
+
+    def __init__(self, root: Optional[str] = None):
+        """
+        初期化
+
+        Args:
+            root: ストアのフォルダ（省略時は ~/.pptx_text_store）
+        """
+        self.root = Path(root or Path.home() / '.pptx_text_store')
+        self.version_dir = self.root / f"v{EXTRACTOR_VERSION}"
+        self.paths_file = self.root / PATHS_FILE
+
+        self.stats = {'hits': 0, 'misses': 0}
+        self._lock = threading.Lock()
+        self._hashes = self._load_paths()
+
+    def _load_paths(self) -> Dict[str, Dict[str, Any]]:
+        """パス → {size, mtime_ns, hash} の対応を読み込み（後の記録が優先）"""
+        hashes = {}
+        try:
+            with open(self.paths_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                        hashes[record['path']] = record
+                    except (json.JSONDecodeError, KeyError, TypeError):
+                        continue
+        except OSError:
+            pass
+        return hashes
+
+    def deck_hash(self, file_path: str) -> str:
+        """デッキの内容ハッシュ（サイズ・更新日時が前回と同じなら記録済みの値）"""
+        path = str(Path(file_path).resolve())
+        stat = os.stat(path)
+        record = self._hashes.get(path)
+        if record and record.get('size') == stat.st_size and record.get('mtime_ns') == stat.st_mtime_ns:
+            return record['hash']
+
+        record = {'path': path, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'hash': file_hash(path)}
+        # 一時フォルダのファイル（サービスへのアップロード等）は毎回パスが変わるので記録しない
+        if path.startswith(str(Path(tempfile.gettempdir()).resolve())):
+            return record['hash']
+        with self._lock:
+            self._hashes[path] = record
+            self.root.mkdir(parents=True, exist_ok=True)
+            with open(self.paths_file, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        return record['hash']
+
+    @staticmethod
+    def variant(ocr=None) -> str:
+        """抽出条件ごとの保存先（OCRありは言語ごと）"""
+        return f"ocr_{ocr.lang.replace('+', '_')}" if ocr else 'plain'
+
+    def _entry_path(self, deck_hash: str, variant: str) -> Path:
+        return self.version_dir / variant / deck_hash[:2] / f"{deck_hash}.json.gz"
+
+    def get(self, deck_hash: str, variant: str = 'plain') -> Optional[List[Dict[str, Any]]]:
+        """保存済みの抽出結果（無ければNone）"""
+        try:
+            with gzip.open(self._entry_path(deck_hash, variant), 'rt', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, EOFError, json.JSONDecodeError):
+            return None
+
+    def put(self, deck_hash: str, slides: List[Dict[str, Any]], variant: str = 'plain'):
+        """抽出結果を保存（一時ファイル経由で置き換え）"""
+        path = self._entry_path(deck_hash, variant)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        data = json.dumps(slides, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        # 同じ内容なら同じバイト列になるよう gzip ヘッダーの日時は固定
+        temp_path.write_bytes(gzip.compress(data, compresslevel=6, mtime=0))
+        os.replace(temp_path, path)
+
+    def read(self, file_path: str, extract: Callable[[], List[Dict[str, Any]]],
+             variant: str = 'plain') -> List[Dict[str, Any]]:
+        """
+        抽出結果を読み込み（ストアに無ければ extract() で抽出して保存）
+
+        Args:
+            extract: .pptxから抽出する関数（ガード・OCR込み、失敗時は例外）
+        """
+        deck_hash = self.deck_hash(file_path)
+        slides = self.get(deck_hash, variant)
+        if slides is not None:
+            with self._lock:
+                self.stats['hits'] += 1
+            return slides
+
+        slides = extract()
+        self.put(deck_hash, slides, variant)
+        with self._lock:
+            self.stats['misses'] += 1
+        return slides
+
+    def print_report(self):
+        """ストアの利用状況を表示"""
+        print(f"Text store: {self.stats['hits']} hits / {self.stats['misses']} extracted ({self.root})")
+
+
+def add_store_arguments(parser):
+    """バッチ処理のCLIに抽出結果ストアのオプションを追加"""
+    parser.add_argument('--text-store', nargs='?', const='', metavar='DIR',
+                        help="抽出結果をストアに保存・再利用し、解析ルールやプロンプトの変更後に.pptxを開き直さない"
+                             "（既定: ~/.pptx_text_store）")
+
+
+def store_from_args(args) -> Optional[TextStore]:
+    """CLI引数からストアを作成（指定が無ければNone）"""
+    if args.text_store is None:
+        return None
+    return TextStore(args.text_store or None)
+
+
+def store_statistics(root: Path) -> Dict[str, Dict[str, int]]:
+    """抽出処理のバージョンごとの件数・サイズ"""
+    statistics = {}
+    for version_dir in sorted(root.glob('v*')):
+        entries = list(version_dir.rglob('*.json.gz'))
+        statistics[version_dir.name] = {
+            'decks': len(entries),
+            'bytes': sum(entry.stat().st_size for entry in entries),
+        }
+    return statistics
+
+
+def main():
+    """メイン処理（stats: 件数とサイズ / prune: 現在の版以外を削除）"""
+    if len(sys.argv) < 2 or sys.argv[1] not in ('stats', 'prune'):
+        print("Usage: python text_store.py stats [store_dir]")
+        print("       python text_store.py prune [store_dir]")
+        sys.exit(1)
+
+    store = TextStore(sys.argv[2] if len(sys.argv) > 2 else None)
+    if not store.root.exists():
+        print(f"ERROR: Store not found: {store.root}")
+        sys.exit(1)
+
+    if sys.argv[1] == 'prune':
+        for version_dir in store.root.glob('v*'):
+            if version_dir != store.version_dir:
+                shutil.rmtree(version_dir)
+                print(f"Removed: {version_dir}")
+
+    print(f"Store: {store.root} (current extractor version: v{EXTRACTOR_VERSION})")
+    for version, stats in store_statistics(store.root).items():
+        print(f"  {version}: {stats['decks']} decks, {stats['bytes'] / 1024 / 1024:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
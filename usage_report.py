@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LLM使用量レポート
+リクエストごとの記録（.gemini_usage.calls.jsonl）から、フォルダ別・クライアント別・日別の
+リクエスト数・トークン数・レイテンシ・参考費用を集計し、未処理の.pptxを
+現在の無料枠で処理し終えるまでの日数を見積もる
+"""
+
+import argparse
+import json
+import math
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Any, Optional
+
+from powerpoint_processor_gemini import GeminiPowerPointProcessor
+
+
+# 有料枠に換算した参考単価（USD / 100万トークン、gemini-2.0-flash-lite）
+GEMINI_PRICE_PER_M_TOKENS = {
+    'input': 0.075,
+    'output': 0.30,
+}
+
+DIMENSIONS = {
+    'folder': 'フォルダ別',
+    'client': 'クライアント別',
+    'day': '日別',
+}
+
+
+def load_calls(calls_log_path: Path, days: Optional[int] = None) -> List[Dict[str, Any]]:
+    """リクエストの記録を読み込み（days指定時は直近N日分）"""
+    if not calls_log_path.exists():
+        return []
+
+    since = (datetime.now() - timedelta(days=days)).isoformat() if days else ''
+    calls = []
+    with open(calls_log_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                call = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if call.get('at', '') >= since:
+                calls.append(call)
+    return calls
+
+
+def _prompt_tokens(call: Dict[str, Any]) -> int:
+    """実トークン数（レスポンスに無い場合は概算）"""
+    return call.get('prompt_tokens') or call.get('estimated_prompt_tokens') or 0
+
+
+def _cost_usd(call: Dict[str, Any]) -> float:
+    """有料枠に換算した参考費用（Gemini以外は0）"""
+    if call.get('backend', 'gemini') != 'gemini':
+        return 0.0
+    return (_prompt_tokens(call) * GEMINI_PRICE_PER_M_TOKENS['input']
+            + (call.get('output_tokens') or 0) * GEMINI_PRICE_PER_M_TOKENS['output']) / 1000000
+
+
+def aggregate(calls: List[Dict[str, Any]], dimension: str) -> Dict[str, Dict[str, Any]]:
+    """1つの軸でリクエスト数・トークン数・費用を集計（リクエスト数の多い順）"""
+    groups = {}
+    for call in calls:
+        if dimension == 'day':
+            key = call.get('at', '')[:10]
+        else:
+            key = call.get(dimension) or '(不明)'
+
+        group = groups.setdefault(key, {
+            'requests': 0, 'errors': 0, 'prompt_tokens': 0, 'output_tokens': 0,
+            'latency_ms': 0, 'cost_usd': 0.0,
+        })
+        group['requests'] += 1
+        group['errors'] += call.get('outcome') in ('error', 'failed')
+        group['prompt_tokens'] += _prompt_tokens(call)
+        group['output_tokens'] += call.get('output_tokens') or 0
+        group['latency_ms'] += call.get('latency_ms') or 0
+        group['cost_usd'] += _cost_usd(call)
+
+    for group in groups.values():
+        group['avg_latency_ms'] = round(group.pop('latency_ms') / group['requests'])
+        group['cost_usd'] = round(group['cost_usd'], 4)
+
+    return dict(sorted(groups.items(), key=lambda item: item[1]['requests'], reverse=True))
+
+
+def truncation_stats(calls: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """プロンプトの文字数上限（PROMPT_CHAR_LIMIT）で切り捨てられた割合と元テキストの長さ"""
+    sizes = sorted(c['source_chars'] for c in calls if c.get('source_chars') is not None)
+    if not sizes:
+        return {}
+
+    def percentile(p):
+        return sizes[min(len(sizes) - 1, int(len(sizes) * p))]
+
+    truncated = sum(1 for c in calls if c.get('truncated'))
+    return {
+        'limit': GeminiPowerPointProcessor.PROMPT_CHAR_LIMIT,
+        'truncated_rate': round(truncated / len(sizes) * 100, 1),
+        'source_chars_p50': percentile(0.5),
+        'source_chars_p90': percentile(0.9),
+        'source_chars_max': sizes[-1],
+    }
+
+
+def pending_decks(folder: str) -> int:
+    """未処理（JSONが無い・エラー結果）の.pptx数"""
+    count = 0
+    for pptx_file in Path(folder).rglob("*.pptx"):
+        json_path = pptx_file.with_suffix('.json')
+        if not json_path.exists():
+            count += 1
+            continue
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                if 'error' in json.load(f):
+                    count += 1
+        except Exception:
+            count += 1
+    return count
+
+
+def requests_per_deck(calls: List[Dict[str, Any]]) -> float:
+    """過去の記録から1デッキあたりのGeminiリクエスト数（再リクエスト込み、記録が無ければ1）"""
+    gemini_calls = [c for c in calls if c.get('backend', 'gemini') == 'gemini']
+    decks = {(c.get('folder'), c.get('file')) for c in gemini_calls if c.get('section') != 'repair'}
+    return len(gemini_calls) / len(decks) if decks else 1.0
+
+
+def forecast_quota(needed: int, usage_data: Dict[str, Any]) -> Dict[str, Any]:
+    """リクエスト数を現在の無料枠の残りで処理し終えるまでの日数とRPM上限での処理時間"""
+    limits = GeminiPowerPointProcessor.FREE_TIER_LIMITS
+    today = datetime.now().strftime('%Y-%m-%d')
+    this_month = datetime.now().strftime('%Y-%m')
+    today_remaining = max(0, limits['daily_requests'] - usage_data.get('daily', {}).get(today, 0))
+    month_remaining = max(0, limits['monthly_requests'] - usage_data.get('monthly', {}).get(this_month, 0))
+
+    if needed <= today_remaining:
+        days = 1 if needed else 0
+    else:
+        days = 1 + math.ceil((needed - today_remaining) / limits['daily_requests'])
+
+    return {
+        'today_remaining': today_remaining,
+        'month_remaining': month_remaining,
+        'days_needed': days,
+        'exceeds_month': needed > month_remaining,
+        'hours_at_rpm': round(needed / limits['rpm'] / 60, 1),
+    }
+
+
+def project_backlog(calls: List[Dict[str, Any]], usage_data: Dict[str, Any], pending: int) -> Dict[str, Any]:
+    """未処理のデッキを現在の無料枠で処理し終えるまでの見積もり"""
+    per_deck = requests_per_deck(calls)
+    needed = math.ceil(pending * per_deck)
+    return {
+        'pending_decks': pending,
+        'requests_per_deck': round(per_deck, 2),
+        'requests_needed': needed,
+        **forecast_quota(needed, usage_data),
+    }
+
+
+def build_report(usage_log_path: Path, days: Optional[int] = None,
+                 backlog_folder: Optional[str] = None) -> Dict[str, Any]:
+    """レポートを作成"""
+    calls = load_calls(usage_log_path.with_suffix('.calls.jsonl'), days)
+
+    usage_data = {}
+    if usage_log_path.exists():
+        with open(usage_log_path, 'r', encoding='utf-8') as f:
+            usage_data = json.load(f)
+
+    report = {
+        'requests': len(calls),
+        'sections': {},
+        'dimensions': {dimension: aggregate(calls, dimension) for dimension in DIMENSIONS},
+        'truncation': truncation_stats([c for c in calls if c.get('section') != 'repair']),
+    }
+    for call in calls:
+        section = call.get('section', 'analysis')
+        report['sections'][section] = report['sections'].get(section, 0) + 1
+
+    if backlog_folder:
+        report['backlog'] = project_backlog(calls, usage_data, pending_decks(backlog_folder))
+
+    return report
+
+
+def main():
+    """メイン処理"""
+    parser = argparse.ArgumentParser(description="LLM使用量レポート")
+    parser.add_argument('--days', type=int, help="直近N日分だけを集計する")
+    parser.add_argument('--backlog', metavar='FOLDER',
+                        help="未処理の.pptxを処理し終えるまでの日数を見積もる対象フォルダ")
+    parser.add_argument('--usage-log', default=str(Path.home() / '.gemini_usage.json'),
+                        help="使用状況ログのパス（既定: ~/.gemini_usage.json）")
+    parser.add_argument('--top', type=int, default=10, help="各軸で表示する件数（既定: 10）")
+    args = parser.parse_args()
+
+    report = build_report(Path(args.usage_log), args.days, args.backlog)
+
+    print("=" * 60)
+    print("LLM USAGE REPORT")
+    print("=" * 60)
+    print(f"Requests: {report['requests']} "
+          f"({', '.join(f'{k} {v}' for k, v in report['sections'].items())})")
+
+    for dimension, label in DIMENSIONS.items():
+        groups = report['dimensions'][dimension]
+        print(f"\n【{label}】 {len(groups)} groups")
+        for name, group in list(groups.items())[:args.top]:
+            print(f"  {name}: {group['requests']} req, "
+                  f"in {group['prompt_tokens']:,} / out {group['output_tokens']:,} tokens, "
+                  f"avg {group['avg_latency_ms']}ms, errors {group['errors']}, "
+                  f"参考 ${group['cost_usd']:.4f}")
+
+    truncation = report['truncation']
+    if truncation:
+        print(f"\n【プロンプト上限 {truncation['limit']}文字】")
+        print(f"  切り捨て率: {truncation['truncated_rate']}% "
+              f"(元テキスト p50 {truncation['source_chars_p50']:,} / p90 {truncation['source_chars_p90']:,} "
+              f"/ max {truncation['source_chars_max']:,} 文字)")
+
+    backlog = report.get('backlog')
+    if backlog:
+        print(f"\n【バックログ見積もり】")
+        print(f"  未処理: {backlog['pending_decks']} decks × {backlog['requests_per_deck']} req/deck "
+              f"= {backlog['requests_needed']} requests")
+        print(f"  今日の残り: {backlog['today_remaining']} / 今月の残り: {backlog['month_remaining']}")
+        print(f"  所要日数: {backlog['days_needed']}日（RPM上限での処理時間 {backlog['hours_at_rpm']}時間）")
+        if backlog['exceeds_month']:
+            print(f"  ⚠️  今月の無料枠を超えます（--overflow local の利用を検討してください）")
+
+
+if __name__ == "__main__":
+    main()